@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark dos decodificadores numéricos da NFe contra o _parse_float original.
+
+Uso: python -m benchmarks.bench_decimais [repeticoes]
+"""
+import sys
+import timeit
+from decimal import Decimal, ROUND_HALF_UP
+
+from core.decimais import decodificar_centavos, decodificar_decimal
+from core.parser import _parse_float
+
+# Amostra com a distribuição típica de campos TDec_1302 de uma NFC-e
+AMOSTRA = ["38.06", "0.00", "170.91", "6.90", "1234567.89", "0.10", "46.64", "3.90"] * 1250
+
+def _decimal_generico(s) -> Decimal:
+    """Conversão exata ingênua, no mesmo estilo de _parse_float."""
+    return Decimal(str(s).replace(",", "."))
+
+def _centavos_generico(s) -> int:
+    """Centavos exatos pela via genérica de Decimal + quantize."""
+    return int((_decimal_generico(s) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def medir(funcao, repeticoes: int) -> float:
+    """Tempo médio por valor, em nanossegundos."""
+    tempo = min(timeit.repeat(lambda: [funcao(v) for v in AMOSTRA], number=1, repeat=repeticoes))
+    return tempo / len(AMOSTRA) * 1e9
+
+def main(repeticoes: int = 20):
+    resultados = {
+        "_parse_float (float)": medir(_parse_float, repeticoes),
+        "Decimal genérico": medir(_decimal_generico, repeticoes),
+        "decodificar_decimal (Decimal)": medir(decodificar_decimal, repeticoes),
+        "centavos genérico": medir(_centavos_generico, repeticoes),
+        "decodificar_centavos (int)": medir(decodificar_centavos, repeticoes),
+    }
+    base = resultados["_parse_float (float)"]
+    for nome, ns in resultados.items():
+        print(f"{nome:32s} {ns:8.1f} ns/valor  ({base / ns:.2f}x)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
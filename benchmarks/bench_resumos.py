@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark da classificação de CFOP e da auditoria de alíquotas por NCM: versões
+vetorizadas de core.resumos contra o apply linha a linha original, em 1M de itens.
+
+Uso: python -m benchmarks.bench_resumos [linhas] [repeticoes]
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from core.resumos import aliquotas_esperadas, classificar_cfops
+
+CFOPS = ["5102", "5405", "6102", "1102", "2102", "5929", "6108", "1411", "7101", "3102", "9999"]
+NCMS = [f"{ncm:08d}" for ncm in range(22021000, 22021000 + 400)]
+REGRAS_NCM = {ncm: 17.0 + (i % 3) for i, ncm in enumerate(NCMS[::2])}
+PADRAO = 18.0
+
+def gerar_itens(linhas: int) -> pd.DataFrame:
+    """Itens sintéticos com a cardinalidade típica de CFOP e NCM (uma parte sem valor)"""
+    rng = np.random.default_rng(42)
+    cfops = np.array(CFOPS + [None], dtype=object)[rng.integers(0, len(CFOPS) + 1, linhas)]
+    ncms = np.array(NCMS + [None], dtype=object)[rng.integers(0, len(NCMS) + 1, linhas)]
+    return pd.DataFrame({"item_cfop": cfops, "item_ncm": ncms})
+
+def _classificar_apply(cfops: pd.Series) -> pd.Series:
+    """Classificação original: apply linha a linha sobre o texto do CFOP."""
+    def classificar_cfop(cfop):
+        cfop = str(cfop)
+        if cfop.startswith(('1', '2', '3')): return 'Entrada'
+        if cfop.startswith(('5', '6', '7')): return 'Saída'
+        return 'Indefinido'
+    return cfops.apply(classificar_cfop)
+
+def _aliquotas_apply(ncms: pd.Series) -> pd.Series:
+    """Consulta original: apply linha a linha no dicionário de regras."""
+    return ncms.apply(lambda ncm: REGRAS_NCM.get(str(ncm), PADRAO))
+
+def medir(funcao, argumento, repeticoes: int) -> float:
+    """Menor tempo entre as repetições, em milissegundos."""
+    return min(timeit.repeat(lambda: funcao(argumento), number=1, repeat=repeticoes)) * 1000
+
+def main(linhas: int = 1_000_000, repeticoes: int = 3):
+    itens = gerar_itens(linhas)
+    categoricos = itens.astype("category")
+
+    # As versões vetorizadas devem dar exatamente o mesmo resultado
+    assert (classificar_cfops(categoricos["item_cfop"]).astype(object) == _classificar_apply(itens["item_cfop"])).all()
+    assert (aliquotas_esperadas(categoricos["item_ncm"], REGRAS_NCM, PADRAO)
+            == _aliquotas_apply(itens["item_ncm"]).astype(float)).all()
+
+    casos = [
+        ("CFOP: apply linha a linha", _classificar_apply, itens["item_cfop"]),
+        ("CFOP: classificar_cfops", classificar_cfops, categoricos["item_cfop"]),
+        ("NCM: apply linha a linha", _aliquotas_apply, itens["item_ncm"]),
+        ("NCM: aliquotas_esperadas", lambda ncms: aliquotas_esperadas(ncms, REGRAS_NCM, PADRAO), categoricos["item_ncm"]),
+    ]
+    print(f"{linhas:,} itens".replace(",", "."))
+    base = None
+    for nome, funcao, argumento in casos:
+        ms = medir(funcao, argumento, repeticoes)
+        base = ms if "apply" in nome else base
+        print(f"{nome:28s} {ms:9.1f} ms  ({base / ms:.1f}x)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 3)
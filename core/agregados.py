@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Agregados incrementais dos resumos, por empresa (CNPJ do emitente) e mês de emissão.
+
+Cada nota ingerida atualiza somas e contagens do seu período, os totais por forma de
+pagamento e um esboço top-k dos produtos (algoritmo Space-Saving, com memória fixa por
+período). Os totais do painel saem da combinação dos períodos, sem reler o histórico:
+ingerir mil notas novas custa o mesmo que atualizar mil entradas de dicionário.
+As somas guardam os valores como extraídos (float, Decimal ou centavos inteiros) e só
+são levadas a reais, em float, ao montar o resumo.
+"""
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.decimais import DIVISOR_REAIS_POR_MODO
+
+STATUS_AUTORIZADA = "Autorizada"
+
+# Produtos monitorados por período no esboço top-k
+CAPACIDADE_TOP_PRODUTOS = 256
+
+class EsbocoTopK:
+    """
+    Esboço Space-Saving ponderado: guarda no máximo capacidade itens. Um item novo com o
+    esboço cheio substitui o de menor peso e herda esse peso como erro máximo. Enquanto
+    houver até capacidade itens distintos, os pesos são exatos (exato=True).
+    """
+    __slots__ = ("capacidade", "pesos", "erros", "exato")
+
+    def __init__(self, capacidade: int = CAPACIDADE_TOP_PRODUTOS):
+        self.capacidade = capacidade
+        self.pesos: Dict[Any, float] = {}
+        self.erros: Dict[Any, float] = {}
+        # Passa a False quando algum item é descartado: daí em diante os pesos são estimativas
+        self.exato = True
+
+    def adicionar(self, item: Any, peso: float = 1):
+        if item in self.pesos:
+            self.pesos[item] += peso
+            return
+        if len(self.pesos) < self.capacidade:
+            self.pesos[item] = peso
+            self.erros[item] = 0
+            return
+        self.exato = False
+        menor = min(self.pesos, key=self.pesos.get)
+        minimo = self.pesos.pop(menor)
+        del self.erros[menor]
+        self.pesos[item] = minimo + peso
+        self.erros[item] = minimo
+
+    def combinar(self, outro: "EsbocoTopK"):
+        """Soma outro esboço a este, mantendo os capacidade itens de maior peso"""
+        self.exato = self.exato and outro.exato
+        for item, peso in outro.pesos.items():
+            self.pesos[item] = self.pesos.get(item, 0) + peso
+            self.erros[item] = self.erros.get(item, 0) + outro.erros[item]
+        if len(self.pesos) > self.capacidade:
+            self.exato = False
+            for item in sorted(self.pesos, key=self.pesos.get)[:len(self.pesos) - self.capacidade]:
+                del self.pesos[item]
+                del self.erros[item]
+
+    def maiores(self, k: int) -> List[Tuple[Any, float]]:
+        """Os k itens de maior peso (estimado), em ordem decrescente"""
+        return sorted(self.pesos.items(), key=lambda par: par[1], reverse=True)[:k]
+
+class _AgregadoPeriodo:
+    """Somas, contagens, pagamentos e top-k de produtos de uma empresa num mês."""
+    __slots__ = ("total_vendas", "notas", "notas_canceladas", "itens", "pagamentos", "produtos")
+
+    def __init__(self, capacidade_top: int):
+        self.total_vendas = 0
+        self.notas = 0
+        self.notas_canceladas = 0
+        self.itens = 0
+        self.pagamentos: Counter = Counter()
+        self.produtos = EsbocoTopK(capacidade_top)
+
+def _somar_pagamentos(pagamentos: Counter, texto: Optional[str]):
+    """Soma os pares "Tipo=valor; Tipo=valor" do campo pagamentos da nota"""
+    for pagamento in (texto or "").split("; "):
+        if "=" in pagamento:
+            tipo, valor = pagamento.split("=", 1)
+            try:
+                pagamentos[tipo] += float(valor)
+            except (ValueError, TypeError):
+                continue
+
+def agrupar_por_nota(linhas: Iterable[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Separa as linhas de um documento (ex.: um lote enviNFe) em uma lista por chave de acesso"""
+    notas: Dict[Any, List[Dict[str, Any]]] = {}
+    for linha in linhas:
+        notas.setdefault(linha.get("chave_acesso"), []).append(linha)
+    return list(notas.values())
+
+class AgregadosIncrementais:
+    """
+    Agregados por (CNPJ do emitente, "AAAA-MM"), atualizados nota a nota.
+    Como nas visões do QuadroResumos, uma nota repetida (mesma chave de acesso) entra
+    uma única vez nos totais de notas, vendas e pagamentos, mas seus itens são somados
+    de novo em total_itens_vendidos e top_produtos.
+    """
+
+    def __init__(self, capacidade_top: int = CAPACIDADE_TOP_PRODUTOS, modo_numerico: str = "float"):
+        self.capacidade_top = capacidade_top
+        # Modo em que as linhas foram extraídas (ver core.decimais); o resumo sai em reais
+        self._divisor = DIVISOR_REAIS_POR_MODO[modo_numerico]
+        self.periodos: Dict[Tuple[str, str], _AgregadoPeriodo] = {}
+        self._chaves: set = set()
+        self._ingeridas = 0
+
+    def adicionar_nota(self, linhas: Sequence[Dict[str, Any]]):
+        """Incorpora as linhas (uma por item, com os campos da nota repetidos) de uma nota"""
+        if not linhas:
+            return
+        nota = linhas[0]
+        chave = nota.get("chave_acesso")
+        repetida = chave in self._chaves
+        self._chaves.add(chave)
+        self._ingeridas += 1
+
+        periodo_chave = (nota.get("emit_cnpj") or "", str(nota.get("data_emissao") or "")[:7])
+        periodo = self.periodos.get(periodo_chave)
+        if periodo is None:
+            periodo = self.periodos[periodo_chave] = _AgregadoPeriodo(self.capacidade_top)
+
+        if nota.get("status") != STATUS_AUTORIZADA:
+            if not repetida:
+                periodo.notas_canceladas += 1
+            return
+        periodo.itens += len(linhas)
+        for linha in linhas:
+            descricao = linha.get("item_descricao")
+            if descricao is not None:
+                periodo.produtos.adicionar(descricao, linha.get("item_valor_total") or 0)
+        if repetida:
+            return
+        periodo.notas += 1
+        periodo.total_vendas += nota.get("valor_total_nf") or 0
+        _somar_pagamentos(periodo.pagamentos, nota.get("pagamentos"))
+
+    def adicionar_notas(self, notas: Iterable[Sequence[Dict[str, Any]]]):
+        for linhas in notas:
+            self.adicionar_nota(linhas)
+
+    @property
+    def notas_ingeridas(self) -> int:
+        """Notas incorporadas até agora, repetidas incluídas (permite saber se há algo novo a resumir)"""
+        return self._ingeridas
+
+    def resumo(self, empresa: Optional[str] = None, meses: Optional[Iterable[str]] = None,
+               top: int = 10) -> Dict[str, Any]:
+        """
+        Totais combinados dos períodos (opcionalmente de uma empresa e/ou de alguns meses),
+        com as mesmas chaves de NFeProcessor.resumos e valores em reais. top_produtos_exato indica se os
+        valores de top_produtos são exatos ou estimativas do esboço.
+        """
+        meses = set(meses) if meses is not None else None
+        total_vendas, itens, notas, canceladas = 0, 0, 0, 0
+        pagamentos: Counter = Counter()
+        produtos = EsbocoTopK(self.capacidade_top)
+        vendas_por_mes: Dict[str, Any] = {}
+        for (cnpj, mes), periodo in self.periodos.items():
+            if (empresa is not None and cnpj != empresa) or (meses is not None and mes not in meses):
+                continue
+            total_vendas += periodo.total_vendas
+            itens += periodo.itens
+            notas += periodo.notas
+            canceladas += periodo.notas_canceladas
+            pagamentos.update(periodo.pagamentos)
+            produtos.combinar(periodo.produtos)
+            if mes and periodo.notas:
+                vendas_por_mes[mes] = vendas_por_mes.get(mes, 0) + periodo.total_vendas
+        return {
+            "total_vendas": self._em_reais(total_vendas),
+            "total_itens_vendidos": itens,
+            "total_notas_autorizadas": notas,
+            "total_notas_canceladas": canceladas,
+            # O campo pagamentos já vem em reais em todos os modos
+            "formas_pagamento": dict(pagamentos),
+            "top_produtos": {item: self._em_reais(peso) for item, peso in produtos.maiores(top)},
+            "top_produtos_exato": produtos.exato,
+            "vendas_por_mes": {mes: self._em_reais(valor) for mes, valor in sorted(vendas_por_mes.items())},
+        }
+
+    def _em_reais(self, valor: Any) -> float:
+        return float(valor) / self._divisor
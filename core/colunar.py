@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Armazenamento colunar das linhas extraídas das notas.
+
+Em vez de uma lista de dicionários (cada linha repetindo as mesmas ~40 chaves), os
+valores ficam numa lista por coluna, entregue sem cópia ao quadro tipado dos
+resumos (core.resumos.QuadroResumos), que converte cada coluna uma única vez.
+A classe também se comporta como uma sequência de linhas (len, iteração, índice e
+fatias devolvem dicionários) para os relatórios e o dashboard.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+class AcumuladorColunar:
+    """Linhas guardadas por coluna; chaves ausentes numa linha ficam como None."""
+
+    def __init__(self, linhas: Iterable[Dict[str, Any]] = ()):
+        self._colunas: Dict[str, List[Any]] = {}
+        self._total = 0
+        self.extend(linhas)
+
+    @property
+    def colunas(self) -> List[str]:
+        return list(self._colunas)
+
+    def append(self, linha: Dict[str, Any]):
+        for chave in linha:
+            if chave not in self._colunas:
+                # Coluna nova: as linhas anteriores não tinham o campo
+                self._colunas[chave] = [None] * self._total
+        for chave, coluna in self._colunas.items():
+            coluna.append(linha.get(chave))
+        self._total += 1
+
+    def extend(self, linhas: Iterable[Dict[str, Any]]):
+        for linha in linhas:
+            self.append(linha)
+
+    def clear(self):
+        self._colunas = {}
+        self._total = 0
+
+    def coluna(self, nome: str) -> List[Any]:
+        """Valores de uma coluna (lista interna: não deve ser alterada)"""
+        return self._colunas.get(nome, [None] * self._total)
+
+    def por_coluna(self) -> Dict[str, List[Any]]:
+        """{coluna: valores} sem copiar as listas (ex.: para core.resumos.QuadroResumos)"""
+        return dict(self._colunas)
+
+    def _linha(self, indice: int) -> Dict[str, Any]:
+        return {chave: coluna[indice] for chave, coluna in self._colunas.items()}
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for indice in range(self._total):
+            yield self._linha(indice)
+
+    def __getitem__(self, indice: Union[int, slice]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        if isinstance(indice, slice):
+            return [self._linha(i) for i in range(*indice.indices(self._total))]
+        if indice < 0:
+            indice += self._total
+        if not 0 <= indice < self._total:
+            raise IndexError("Índice de linha fora do intervalo")
+        return self._linha(indice)
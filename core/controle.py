@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Controle cooperativo de um processamento em andamento.
+
+A interface (ou um agendador) pausa, retoma, cancela ou reduz o ritmo do trabalho
+por este objeto; o pipeline consulta o controle entre um arquivo e outro, de modo que
+nenhuma nota fica pela metade. O controle também distribui os instantâneos de
+progresso aos interessados.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+
+class ControleProcessamento:
+    """Pausa, retomada, cancelamento, limitação de ritmo e callbacks de progresso."""
+
+    def __init__(self, segundos_entre_itens: float = 0.0):
+        # Espera antes de cada arquivo (0 = sem limitação); pode ser alterada durante a execução
+        self.segundos_entre_itens = segundos_entre_itens
+        self._liberado = threading.Event()
+        self._liberado.set()
+        self._cancelado = threading.Event()
+        self._callbacks: List[Callable[[Dict[str, Dict[str, Any]]], None]] = []
+
+    @property
+    def pausado(self) -> bool:
+        return not self._liberado.is_set()
+
+    @property
+    def cancelado(self) -> bool:
+        return self._cancelado.is_set()
+
+    def pausar(self):
+        self._liberado.clear()
+
+    def retomar(self):
+        self._liberado.set()
+
+    def cancelar(self):
+        self._cancelado.set()
+        # Libera quem estiver esperando na pausa, para que perceba o cancelamento
+        self._liberado.set()
+
+    def limitar(self, segundos_entre_itens: float):
+        """Reduz (ou, com 0, deixa de reduzir) o ritmo do processamento"""
+        self.segundos_entre_itens = max(0.0, segundos_entre_itens)
+
+    def aguardar(self) -> bool:
+        """
+        Ponto de controle entre arquivos: aplica a limitação de ritmo e espera enquanto
+        estiver pausado. Retorna False se o processamento foi cancelado.
+        """
+        if self.segundos_entre_itens > 0:
+            self._cancelado.wait(self.segundos_entre_itens)
+        self._liberado.wait()
+        return not self.cancelado
+
+    def adicionar_callback(self, callback: Callable[[Dict[str, Dict[str, Any]]], None]):
+        """Registra uma função que recebe os instantâneos de progresso do pipeline"""
+        self._callbacks.append(callback)
+
+    def notificar(self, situacao: Dict[str, Dict[str, Any]]):
+        for callback in list(self._callbacks):
+            try:
+                callback(situacao)
+            except Exception as e:
+                logging.warning(f"Falha no callback de progresso: {e}")
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Decodificadores dos campos numéricos TDec_* da NFe.
+
+Os valores da NFe usam sempre ponto como separador e não têm sinal nem espaços,
+por isso o caminho rápido converte o texto diretamente, sem o replace/str
+genérico de _parse_float. Textos fora do padrão caem no caminho lento, que
+aceita vírgula e arredonda (ROUND_HALF_UP) quando há mais de duas casas.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Optional
+
+# Modos de decodificação numérica selecionáveis por execução
+MODOS_NUMERICOS = ("float", "decimal", "centavos")
+
+# Divisor que leva os campos "valor" decodificados em cada modo de volta a reais
+DIVISOR_REAIS_POR_MODO = {"float": 1, "decimal": 1, "centavos": 100}
+
+_ZERO = Decimal(0)
+
+def _decimal_lento(texto: str) -> Optional[Decimal]:
+    """Caminho lento: aceita vírgula decimal e espaços; None se não for número."""
+    try:
+        return Decimal(str(texto).strip().replace(",", "."))
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+
+def decodificar_decimal(texto: Optional[str]) -> Decimal:
+    """Converte um campo TDec_* em Decimal exato (Decimal(0) quando vazio ou inválido)."""
+    if not texto:
+        return _ZERO
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        valor = _decimal_lento(texto)
+        return valor if valor is not None else _ZERO
+
+def decodificar_centavos(texto: Optional[str]) -> int:
+    """Converte um valor monetário TDec_1302 em centavos inteiros (0 quando vazio ou inválido)."""
+    if not texto:
+        return 0
+    if texto[-3:-2] == ".":
+        # Com exatamente duas casas e até 15 dígitos significativos (o limite do
+        # TDec_1302), o erro de float(texto) * 100 fica muito abaixo de 0,5 e o
+        # arredondamento devolve os centavos exatos.
+        try:
+            return round(float(texto) * 100)
+        except ValueError:
+            pass
+    elif texto.isdecimal():
+        return int(texto) * 100
+    valor = _decimal_lento(texto)
+    if valor is None or not valor.is_finite():
+        return 0
+    return int((valor * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Escalonamento adaptativo dos workers de parse e análise.
+
+A máquina de processamento é compartilhada com outros serviços: em vez de ocupar
+sempre todos os processos de trabalho, o escalonador limita quantas tarefas rodam
+ao mesmo tempo e reajusta esse limite periodicamente. Ele mede o tempo de cada
+tarefa por etapa (custo por arquivo), a vazão de arquivos concluídos e a carga da
+máquina, e escolhe o número de workers que atinge a meta de vazão (arquivos/s) sem
+passar do teto de CPU. Cada mudança fica registrada com o motivo.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Carga da máquina via psutil, se disponível (senão, load average do sistema)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Fração da CPU da máquina que o processamento pode ocupar, por padrão
+TETO_CPU_PADRAO = 0.75
+
+# Segundos entre reavaliações do número de workers
+INTERVALO_DECISAO = 2.0
+
+def carga_do_sistema() -> Optional[float]:
+    """Uso de CPU da máquina como fração (0 a 1); None se não houver como medir."""
+    if psutil is not None:
+        return psutil.cpu_percent(interval=None) / 100
+    if hasattr(os, "getloadavg"):
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    return None
+
+class EscalonadorAdaptativo:
+    """
+    Limita as tarefas simultâneas entre minimo e maximo workers e reavalia o limite a
+    cada intervalo segundos. Sem meta de vazão, cresce enquanto houver folga abaixo do
+    teto de CPU; com meta, usa o custo médio por arquivo para estimar os workers necessários.
+    """
+
+    def __init__(self, meta_vazao: Optional[float] = None, teto_cpu: float = TETO_CPU_PADRAO,
+                 minimo: int = 1, maximo: Optional[int] = None, intervalo: float = INTERVALO_DECISAO,
+                 etapa_vazao: str = "analise", medir_carga: Callable[[], Optional[float]] = carga_do_sistema):
+        if not 0 < teto_cpu <= 1:
+            raise ValueError("O teto de CPU deve estar entre 0 e 1")
+        self.meta_vazao = meta_vazao
+        self.teto_cpu = teto_cpu
+        self.minimo = max(1, minimo)
+        self.maximo = maximo
+        self.intervalo = intervalo
+        # Etapa cujas tarefas concluídas contam como arquivos para a vazão
+        self.etapa_vazao = etapa_vazao
+        self.medir_carga = medir_carga
+
+        self.atual: Optional[int] = None
+        self.decisoes: List[Dict[str, Any]] = []
+        self._em_uso = 0
+        self._condicao = threading.Condition()
+        # Tempo acumulado e tarefas por etapa: total (médias) e na janela atual
+        self._tempos: Dict[str, List[float]] = {}
+        self._janela: Dict[str, List[float]] = {}
+        self._inicio_janela = 0.0
+        self._inicio = 0.0
+
+    def iniciar(self, maximo: int):
+        """
+        Prepara uma execução com até maximo workers. O número de workers aprendido numa
+        execução é mantido na seguinte (ex.: lotes sucessivos do monitor de pasta).
+        """
+        with self._condicao:
+            self.maximo = max(self.minimo, min(self.maximo or maximo, maximo))
+            if self.atual is None:
+                self.atual = max(self.minimo, self.maximo // 2)
+            self.atual = min(self.atual, self.maximo)
+            self._janela = {}
+            self._inicio = self._inicio or time.monotonic()
+            self._inicio_janela = time.monotonic()
+        if self.medir_carga is carga_do_sistema and psutil is not None:
+            # A primeira leitura do psutil serve só de referência para as seguintes
+            psutil.cpu_percent(interval=None)
+
+    @contextmanager
+    def vaga(self, etapa: str) -> Iterator[None]:
+        """Espera uma vaga entre os workers ativos e mede a duração da tarefa da etapa"""
+        with self._condicao:
+            while self._em_uso >= (self.atual or 1):
+                self._condicao.wait()
+            self._em_uso += 1
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._condicao:
+                self._em_uso -= 1
+                for tempos in (self._tempos, self._janela):
+                    acumulado = tempos.setdefault(etapa, [0.0, 0])
+                    acumulado[0] += duracao
+                    acumulado[1] += 1
+                if time.monotonic() - self._inicio_janela >= self.intervalo:
+                    self._reavaliar()
+                self._condicao.notify_all()
+
+    def custo_por_arquivo(self) -> float:
+        """Soma dos tempos médios por tarefa de cada etapa (segundos de worker por arquivo)"""
+        return sum(total / tarefas for total, tarefas in self._tempos.values() if tarefas)
+
+    def _reavaliar(self):
+        """Decide o novo número de workers (chamado sob a trava, ao fim de uma tarefa)"""
+        agora = time.monotonic()
+        concluidos = self._janela.get(self.etapa_vazao, [0.0, 0])[1]
+        vazao = concluidos / max(agora - self._inicio_janela, 1e-9)
+        self._janela = {}
+        self._inicio_janela = agora
+        carga = self.medir_carga()
+        custo = self.custo_por_arquivo()
+
+        # Workers que ainda cabem abaixo do teto (cada um ocupa cerca de uma CPU)
+        cpus = os.cpu_count() or 1
+        folga = math.floor((self.teto_cpu - carga) * cpus) if carga is not None else None
+
+        novo, motivo = self.atual, None
+        if folga is not None and folga < 0:
+            novo, motivo = self.atual - 1, "carga acima do teto de CPU"
+        elif self.meta_vazao:
+            necessarios = math.ceil(self.meta_vazao * custo) if custo else self.atual
+            if necessarios > self.atual:
+                novo = self.atual + (necessarios - self.atual if folga is None else min(folga, necessarios - self.atual))
+                motivo = "vazão abaixo da meta"
+            elif necessarios < self.atual and vazao > self.meta_vazao:
+                novo, motivo = necessarios, "vazão acima da meta"
+        elif folga:
+            novo, motivo = self.atual + 1, "folga abaixo do teto de CPU"
+
+        novo = max(self.minimo, min(self.maximo, novo))
+        if novo != self.atual:
+            self.decisoes.append({
+                "instante": round(agora - self._inicio, 1),
+                "de": self.atual,
+                "para": novo,
+                "motivo": motivo,
+                "vazao": round(vazao, 2),
+                "carga": round(carga, 2) if carga is not None else None,
+                "custo_por_arquivo_ms": round(custo * 1000, 1),
+            })
+            logging.info(f"⚖️ Workers: {self.atual} → {novo} ({motivo}; {vazao:.1f} arq/s)")
+            self.atual = novo
+
+    def resumo(self) -> Dict[str, Any]:
+        """Situação do escalonamento para as estatísticas da execução"""
+        with self._condicao:
+            return {
+                "workers": self.atual,
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "meta_vazao": self.meta_vazao,
+                "teto_cpu": self.teto_cpu,
+                "tempo_medio_ms": {etapa: round(total / tarefas * 1000, 2)
+                                   for etapa, (total, tarefas) in self._tempos.items() if tarefas},
+                "decisoes": list(self.decisoes),
+            }
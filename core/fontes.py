@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Fontes de documentos XML: arquivos soltos, membros de .zip/.tar.gz, arquivos .gz
+e os docZip (base64 + gzip) devolvidos pela distribuição de DF-e da SEFAZ.
+
+Os membros são lidos diretamente do contêiner, em memória, sem extração para o disco.
+A identidade de cada documento (nome, tamanho e data de modificação) segue o mesmo
+formato usado para arquivos soltos, de modo que o CacheManager trata todas as origens
+da mesma forma.
+"""
+import base64
+import gzip
+import logging
+import os
+import tarfile
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import Callable, Iterator, Optional, Tuple
+
+from core.parser import ERROS_XML, NS, carregar_xml
+
+# Separa o caminho do contêiner do nome do membro (ex.: "lote.zip!2025/nota.xml")
+SEPARADOR_MEMBRO = "!"
+
+EXTENSOES_TAR = (".tar", ".tar.gz", ".tgz")
+
+_TAG_DOCZIP = f"{{{NS['nfe']}}}docZip"
+
+# Bytes iniciais examinados para reconhecer uma resposta de distribuição de DF-e
+_INICIO_DISTRIBUICAO = 512
+_RAIZ_DISTRIBUICAO = b"retDistDFeInt"
+
+class DocumentoXML:
+    """
+    Documento XML a processar, independente da origem.
+    Os leitores são funções de módulo (ou objetos) serializáveis, de modo que o
+    documento pode ser enviado a um processo de trabalho.
+    O digest do conteúdo, quando calculado (core.hashing), fica guardado no próprio
+    documento e serve de chave para o CacheManager.
+    """
+    __slots__ = ("nome", "tamanho", "mtime", "digest", "_leitor", "_conteudo")
+
+    def __init__(self, nome: str, tamanho: int, mtime: float,
+                 leitor: Optional[Callable[[], bytes]] = None, conteudo: Optional[bytes] = None):
+        self.nome = nome
+        self.tamanho = tamanho
+        self.mtime = mtime
+        self.digest: Optional[str] = None
+        self._leitor = leitor
+        self._conteudo = conteudo
+
+    @property
+    def identidade(self) -> str:
+        """Identificação usada pelo cache; igual à de um arquivo solto com o mesmo nome."""
+        return f"{self.nome}-{self.tamanho}-{self.mtime}"
+
+    def ler(self) -> bytes:
+        """Retorna os bytes do documento (lidos do disco ou descompactados em memória)."""
+        if self._conteudo is not None:
+            return self._conteudo
+        return self._leitor()
+
+    def ler_inicio(self, tamanho: int) -> bytes:
+        """Retorna só os primeiros bytes do documento, sem ler (ou descompactar) o restante."""
+        if self._conteudo is not None:
+            return self._conteudo[:tamanho]
+        inicio = getattr(self._leitor, "inicio", None)
+        if inicio is not None:
+            return inicio(tamanho)
+        return self._leitor()[:tamanho]
+
+    def __repr__(self) -> str:
+        return f"DocumentoXML({self.nome!r})"
+
+class _LeitorArquivo:
+    """Lê um arquivo do disco (inteiro ou só o início)."""
+    __slots__ = ("caminho",)
+    _abrir = staticmethod(open)
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+
+    def __getstate__(self):
+        return self.caminho
+
+    def __setstate__(self, estado):
+        self.caminho = estado
+
+    def __call__(self) -> bytes:
+        with self._abrir(self.caminho, 'rb') as f:
+            return f.read()
+
+    def inicio(self, tamanho: int) -> bytes:
+        with self._abrir(self.caminho, 'rb') as f:
+            return f.read(tamanho)
+
+class _LeitorGzip(_LeitorArquivo):
+    """Lê um .gz descompactando sob demanda (o início não exige descompactar tudo)."""
+    __slots__ = ()
+    _abrir = staticmethod(gzip.open)
+
+def documento_de_arquivo(caminho: str) -> DocumentoXML:
+    """Cria o documento de um XML solto no disco; o conteúdo só é lido em ler()."""
+    stats = os.stat(caminho)
+    return DocumentoXML(caminho, stats.st_size, stats.st_mtime, leitor=_LeitorArquivo(caminho))
+
+def _documento_gzip(caminho: str) -> DocumentoXML:
+    """XML compactado em um arquivo .gz."""
+    stats = os.stat(caminho)
+    return DocumentoXML(caminho, stats.st_size, stats.st_mtime, leitor=_LeitorGzip(caminho))
+
+# ZipFiles abertos por processo, reaproveitados entre membros (chave: caminho, tamanho, mtime).
+# Um ZipFile descartado do cache é fechado pelo coletor quando a última leitura termina.
+_MAX_ZIPS_ABERTOS = 8
+_zips_abertos: "OrderedDict[Tuple[str, int, float], Tuple[zipfile.ZipFile, threading.Lock]]" = OrderedDict()
+_trava_zips = threading.Lock()
+
+def _zip_aberto(caminho: str, tamanho: int, mtime: float) -> Tuple[zipfile.ZipFile, threading.Lock]:
+    """Retorna o ZipFile (e sua trava) do processo atual, abrindo-o na primeira leitura."""
+    chave = (caminho, tamanho, mtime)
+    with _trava_zips:
+        aberto = _zips_abertos.get(chave)
+        if aberto is None:
+            aberto = _zips_abertos[chave] = (zipfile.ZipFile(caminho), threading.Lock())
+            if len(_zips_abertos) > _MAX_ZIPS_ABERTOS:
+                _zips_abertos.popitem(last=False)
+        else:
+            _zips_abertos.move_to_end(chave)
+    return aberto
+
+class _LeitorMembroZip:
+    """Lê um membro de um .zip a partir do ZipFile aberto do processo atual."""
+    __slots__ = ("caminho", "tamanho", "mtime", "membro")
+
+    def __init__(self, caminho: str, tamanho: int, mtime: float, membro: str):
+        self.caminho, self.tamanho, self.mtime, self.membro = caminho, tamanho, mtime, membro
+
+    def __getstate__(self):
+        return self.caminho, self.tamanho, self.mtime, self.membro
+
+    def __setstate__(self, estado):
+        self.caminho, self.tamanho, self.mtime, self.membro = estado
+
+    def __call__(self) -> bytes:
+        arquivo_zip, trava = _zip_aberto(self.caminho, self.tamanho, self.mtime)
+        with trava:
+            return arquivo_zip.read(self.membro)
+
+    def inicio(self, tamanho: int) -> bytes:
+        arquivo_zip, trava = _zip_aberto(self.caminho, self.tamanho, self.mtime)
+        with trava, arquivo_zip.open(self.membro) as membro:
+            return membro.read(tamanho)
+
+def _documentos_zip(caminho: str, filtro: Callable[[str], bool]) -> Iterator[DocumentoXML]:
+    """Membros XML de um .zip; cada membro é descompactado apenas quando lido."""
+    stats = os.stat(caminho)
+    arquivo_zip, _ = _zip_aberto(caminho, stats.st_size, stats.st_mtime)
+    for info in arquivo_zip.infolist():
+        if info.is_dir() or not filtro(info.filename):
+            continue
+        leitor = _LeitorMembroZip(caminho, stats.st_size, stats.st_mtime, info.filename)
+        yield DocumentoXML(f"{caminho}{SEPARADOR_MEMBRO}{info.filename}", info.file_size,
+                           stats.st_mtime, leitor=leitor)
+
+def _documentos_tar(caminho: str, filtro: Callable[[str], bool]) -> Iterator[DocumentoXML]:
+    """
+    Membros XML de um .tar/.tar.gz, lidos em modo stream (sem seek no arquivo).
+    Como o stream não permite voltar, o conteúdo é lido junto com o membro.
+    """
+    stats = os.stat(caminho)
+    with tarfile.open(caminho, "r|*") as tar:
+        for membro in tar:
+            if not membro.isfile() or not filtro(membro.name):
+                continue
+            conteudo = tar.extractfile(membro).read()
+            yield DocumentoXML(f"{caminho}{SEPARADOR_MEMBRO}{membro.name}", membro.size,
+                               stats.st_mtime, conteudo=conteudo)
+
+def decodificar_doczip(texto: str) -> bytes:
+    """Decodifica o conteúdo de um <docZip> (base64 de um XML compactado com gzip)."""
+    return gzip.decompress(base64.b64decode(texto))
+
+def iterar_doczip(conteudo: bytes, nome: str = "distribuicao", mtime: float = 0.0,
+                  resumos: bool = True) -> Iterator[DocumentoXML]:
+    """
+    Documentos de uma resposta de distribuição de DF-e (retDistDFeInt).
+    Cada <docZip> vira um documento identificado pelo NSU e pelo tipo do schema
+    (ex.: "resp.xml!NSU000000000000042-procNFe.xml"). Com resumos=False, os resumos
+    (resNFe, resEvento), que não trazem o documento completo, são omitidos.
+    """
+    for doc_zip in carregar_xml(conteudo).iter(_TAG_DOCZIP):
+        if not doc_zip.text:
+            continue
+        tipo = doc_zip.get("schema", "").split("_", 1)[0] or "doc"
+        if not resumos and tipo.startswith("res"):
+            continue
+        xml = decodificar_doczip(doc_zip.text)
+        nsu = doc_zip.get("NSU", "")
+        yield DocumentoXML(f"{nome}{SEPARADOR_MEMBRO}NSU{nsu}-{tipo}.xml", len(xml), mtime, conteudo=xml)
+
+def e_distribuicao(documento: DocumentoXML) -> bool:
+    """Indica, pelo início do conteúdo, se o documento é uma resposta de distribuição de DF-e."""
+    return _RAIZ_DISTRIBUICAO in documento.ler_inicio(_INICIO_DISTRIBUICAO)
+
+def _expandir_distribuicao(documentos: Iterator[DocumentoXML],
+                           filtro: Callable[[str], bool]) -> Iterator[DocumentoXML]:
+    """Troca cada resposta de distribuição pelos documentos dos seus docZip."""
+    for documento in documentos:
+        if not e_distribuicao(documento):
+            yield documento
+            continue
+        for interno in iterar_doczip(documento.ler(), documento.nome, documento.mtime, resumos=False):
+            if filtro(interno.nome):
+                yield interno
+
+def _e_xml(nome: str) -> bool:
+    return nome.lower().endswith(".xml")
+
+def documentos_do_arquivo(caminho: str, filtro: Callable[[str], bool] = _e_xml) -> Iterator[DocumentoXML]:
+    """
+    Documentos contidos em um arquivo: o próprio XML, os membros de um contêiner
+    (.zip, .tar, .tar.gz, .tgz) ou o XML de um .gz. Outros arquivos não geram documentos.
+    Uma resposta de distribuição de DF-e (retDistDFeInt) é substituída pelos
+    documentos completos dos seus docZip.
+    O filtro recebe o nome de cada XML (do arquivo, do membro ou do docZip).
+    """
+    nome = caminho.lower()
+    try:
+        if nome.endswith(".zip"):
+            documentos = _documentos_zip(caminho, filtro)
+        elif nome.endswith(EXTENSOES_TAR):
+            documentos = _documentos_tar(caminho, filtro)
+        elif nome.endswith(".gz"):
+            documentos = iter([_documento_gzip(caminho)] if filtro(caminho[:-3]) else [])
+        else:
+            documentos = iter([documento_de_arquivo(caminho)] if filtro(caminho) else [])
+        yield from _expandir_distribuicao(documentos, filtro)
+    except (zipfile.BadZipFile, tarfile.TarError, OSError, ValueError) + ERROS_XML as e:
+        logging.warning(f"Contêiner ilegível ignorado: {os.path.basename(caminho)} ({e})")
+
+def iterar_documentos(pasta: str, recursivo: bool = True,
+                      filtro: Callable[[str], bool] = _e_xml) -> Iterator[DocumentoXML]:
+    """Percorre a pasta e gera os documentos XML de arquivos soltos e contêineres."""
+    if recursivo:
+        caminhos = (os.path.join(raiz, f) for raiz, _, arquivos in os.walk(pasta) for f in sorted(arquivos))
+    else:
+        caminhos = (os.path.join(pasta, f) for f in sorted(os.listdir(pasta))
+                    if os.path.isfile(os.path.join(pasta, f)))
+    for caminho in caminhos:
+        yield from documentos_do_arquivo(caminho, filtro)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Hash de conteúdo para deduplicação e chave de cache.
+
+Arquivos pequenos são lidos de uma só vez (uma chamada de read, importante em
+compartilhamentos de rede com milhões de XMLs); arquivos grandes são mapeados em
+memória com mmap. O algoritmo é configurável: md5 (padrão, compatível com os hashes
+já gravados), blake2b (biblioteca padrão) ou xxhash (mais rápido, opcional).
+"""
+import hashlib
+import mmap
+import os
+from typing import Any
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+ALGORITMOS_HASH = ("md5", "blake2b", "xxhash")
+
+ALGORITMO_HASH_PADRAO = "md5"
+
+# A partir deste tamanho o arquivo é mapeado em memória em vez de lido
+LIMITE_MMAP = 8 * 1024 * 1024
+
+def criar_hasher(algoritmo: str = ALGORITMO_HASH_PADRAO) -> Any:
+    """Objeto de hash (com update/hexdigest) do algoritmo escolhido."""
+    if algoritmo == "md5":
+        return hashlib.md5()
+    if algoritmo == "blake2b":
+        # 16 bytes: mesmo tamanho de digest do md5
+        return hashlib.blake2b(digest_size=16)
+    if algoritmo == "xxhash":
+        if xxhash is None:
+            raise ValueError("Algoritmo xxhash indisponível (instale o pacote xxhash)")
+        return xxhash.xxh3_128()
+    raise ValueError(f"Algoritmo de hash desconhecido: {algoritmo}")
+
+def hash_de_bytes(conteudo: bytes, algoritmo: str = ALGORITMO_HASH_PADRAO) -> str:
+    """Digest hexadecimal de bytes já lidos."""
+    hasher = criar_hasher(algoritmo)
+    hasher.update(conteudo)
+    return hasher.hexdigest()
+
+def hash_de_arquivo(caminho: str, algoritmo: str = ALGORITMO_HASH_PADRAO, limite_mmap: int = LIMITE_MMAP) -> str:
+    """Digest hexadecimal de um arquivo: leitura única até limite_mmap, mmap acima disso."""
+    hasher = criar_hasher(algoritmo)
+    with open(caminho, 'rb') as f:
+        tamanho = os.fstat(f.fileno()).st_size
+        if tamanho < limite_mmap or tamanho == 0:
+            hasher.update(f.read())
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                hasher.update(mapa)
+    return hasher.hexdigest()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Camada de execução paralela usada pelos processadores de NFe.
+
+O executor pode ser de threads (leve, mas limitado pelo GIL no parse) ou de
+processos (paralelismo real; a função e os itens precisam ser serializáveis).
+A submissão é sempre limitada, para que pastas enormes não criem milhões de
+futures de uma vez, e os contadores de cada tarefa voltam junto com o resultado
+para serem somados por quem consome, sem estado compartilhado entre workers.
+"""
+import os
+from collections import Counter
+from concurrent.futures import Executor, Future, FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+TIPOS_EXECUTOR = ("thread", "processo")
+
+# Tarefas em andamento por worker na submissão limitada
+PENDENTES_POR_WORKER = 4
+
+def numero_workers(tipo: str, max_workers: Optional[int] = None) -> int:
+    """Número de workers efetivo, com os mesmos padrões dos executores da biblioteca padrão."""
+    if max_workers:
+        return max_workers
+    cpus = os.cpu_count() or 1
+    return min(32, cpus + 4) if tipo == "thread" else cpus
+
+def criar_executor(tipo: str, max_workers: Optional[int] = None,
+                   initializer: Optional[Callable] = None, initargs: Tuple = ()) -> Executor:
+    """Cria um executor de threads ("thread") ou de processos ("processo")."""
+    if tipo not in TIPOS_EXECUTOR:
+        raise ValueError(f"Tipo de executor desconhecido: {tipo}")
+    classe = ThreadPoolExecutor if tipo == "thread" else ProcessPoolExecutor
+    return classe(max_workers=numero_workers(tipo, max_workers), initializer=initializer, initargs=initargs)
+
+def executar_limitado(executor: Executor, funcao: Callable[[Any], Any], itens: Iterable[Any],
+                      max_pendentes: int) -> Iterator[Tuple[Any, Future]]:
+    """
+    Submete funcao(item) para cada item mantendo no máximo max_pendentes tarefas em
+    andamento, e gera (item, futuro) à medida que as tarefas terminam.
+    Os itens são consumidos sob demanda, então um gerador nunca é materializado inteiro.
+    """
+    pendentes: Dict[Future, Any] = {}
+    for item in itens:
+        if len(pendentes) >= max_pendentes:
+            concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                yield pendentes.pop(futuro), futuro
+        pendentes[executor.submit(funcao, item)] = item
+    while pendentes:
+        concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+        for futuro in concluidos:
+            yield pendentes.pop(futuro), futuro
+
+def mapear_com_contadores(tipo: str, funcao: Callable[[Any], Tuple[Any, Counter]], itens: Iterable[Any],
+                          max_workers: Optional[int] = None, initializer: Optional[Callable] = None,
+                          initargs: Tuple = ()) -> Iterator[Tuple[Any, Any, Counter]]:
+    """
+    Executa funcao(item) -> (resultado, contadores) em paralelo e gera
+    (item, resultado, contadores) conforme as tarefas terminam.
+    Cada tarefa conta localmente; cabe ao consumidor (uma única thread) somar os contadores.
+    """
+    workers = numero_workers(tipo, max_workers)
+    with criar_executor(tipo, workers, initializer, initargs) as executor:
+        for item, futuro in executar_limitado(executor, funcao, itens, workers * PENDENTES_POR_WORKER):
+            resultado, contadores = futuro.result()
+            yield item, resultado, contadores
@@ -1,20 +1,96 @@
 # -*- coding: utf-8 -*-
+import logging
 import os
+import threading
+from functools import lru_cache
 import xml.etree.ElementTree as ET
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple, Union, IO
+
+try:
+    from lxml import etree as LET
+    LXML_OK = True
+except ImportError:
+    LET = None
+    LXML_OK = False
+
+from core.decimais import MODOS_NUMERICOS, decodificar_centavos, decodificar_decimal
 
 # Namespace único para NFe/NFC-e
 NS = {"nfe": "http://www.portalfiscal.inf.br/nfe"}
 
+# --- Backend de parsing ---
+# "lxml" é usado quando disponível; "etree" (biblioteca padrão) é o fallback.
+# Pode ser escolhido pela variável de ambiente NFE_XML_BACKEND ou por definir_backend().
+BACKENDS = ("lxml", "etree")
+_backend = os.environ.get("NFE_XML_BACKEND", "lxml" if LXML_OK else "etree")
+if _backend not in BACKENDS or (_backend == "lxml" and not LXML_OK):
+    _backend = "etree"
+
+# Erros de sintaxe XML de ambos os backends
+ERROS_XML = (ET.ParseError, LET.XMLSyntaxError) if LXML_OK else (ET.ParseError,)
+
+_local = threading.local()
+
+def definir_backend(nome: str) -> None:
+    """Seleciona o backend de parsing ("lxml" ou "etree") para as próximas leituras."""
+    global _backend
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend XML desconhecido: {nome}")
+    if nome == "lxml" and not LXML_OK:
+        raise ValueError("Backend 'lxml' indisponível: biblioteca lxml não instalada")
+    _backend = nome
+
+def backend_atual() -> str:
+    """Retorna o nome do backend de parsing em uso."""
+    return _backend
+
+def obter_parser_lxml() -> "LET.XMLParser":
+    """Retorna o XMLParser do lxml da thread atual, criando-o na primeira chamada."""
+    parser = getattr(_local, "parser_lxml", None)
+    if parser is None:
+        parser = LET.XMLParser(remove_blank_text=True, remove_comments=True, remove_pis=True)
+        _local.parser_lxml = parser
+    return parser
+
+def carregar_xml(fonte: Union[str, bytes, IO[bytes]]) -> ET.Element:
+    """Faz o parse de um caminho, bytes ou arquivo aberto e retorna o elemento raiz."""
+    if _backend == "lxml":
+        if isinstance(fonte, bytes):
+            return LET.fromstring(fonte, obter_parser_lxml())
+        return LET.parse(fonte, obter_parser_lxml()).getroot()
+    if isinstance(fonte, bytes):
+        return ET.fromstring(fonte)
+    return ET.parse(fonte).getroot()
+
+def _iterparse(fonte: Union[str, IO[bytes]], eventos: Tuple[str, ...]):
+    """iterparse do backend atual."""
+    if _backend == "lxml":
+        return LET.iterparse(fonte, events=eventos, remove_blank_text=True,
+                             remove_comments=True, remove_pis=True)
+    return ET.iterparse(fonte, events=eventos)
+
+# Caracteres de controlo ASCII removidos pela sanitização (nova linha, retorno e tabulação ficam
+# para o split, que os trata como espaço)
+_CONTROLE_ASCII = {c: None for c in (*range(32), 127) if chr(c) not in "\n\r\t"}
+
 def _sanitizar(texto: str) -> str:
     """Limpa uma string, removendo caracteres de controlo e espaços excessivos."""
     if not isinstance(texto, str):
         return ""
+    if texto.isascii():
+        # Caminho rápido: texto imprimível já normalizado volta sem cópia
+        if texto.isprintable() and "  " not in texto and texto[:1] != " " and texto[-1:] != " ":
+            return texto
+        return " ".join(texto.translate(_CONTROLE_ASCII).split())
     # Remove caracteres não imprimíveis, exceto nova linha e tabulação
     texto_limpo = "".join(char for char in texto if char.isprintable() or char in '\n\r\t')
     # Substitui múltiplos espaços/quebras de linha por um único espaço
     return " ".join(texto_limpo.split()).strip()
 
+def _codigo(texto: Optional[str]) -> str:
+    """Campos de código (CFOP, NCM, CST, CNPJ...): sem sanitização, apenas sem espaços nas pontas."""
+    return texto.strip() if texto else ""
+
 def _text(node: Optional[ET.Element]) -> str:
     """Extrai e sanitiza o texto de um elemento XML de forma segura."""
     return _sanitizar(node.text) if (node is not None and node.text) else ""
@@ -36,118 +112,267 @@ def _parse_float(s: Any) -> float:
     except (ValueError, TypeError):
         return 0.0
 
-def parse_nfe_nfce_xml(fp: str, chaves_canceladas: set) -> Optional[List[Dict[str, Any]]]:
-    """Lê um XML de NFe/NFCe e extrai todas as informações de forma robusta."""
-    try:
-        tree = ET.parse(fp)
-        r = tree.getroot()
-    except ET.ParseError:
-        return None
+# Tags em notação Clark usadas fora do plano de extração
+_NS_NFE = NS["nfe"]
+_TAG_INFNFE = f"{{{_NS_NFE}}}infNFe"
+_TAG_IDE = f"{{{_NS_NFE}}}ide"
+_TAG_EMIT = f"{{{_NS_NFE}}}emit"
+_TAG_DET = f"{{{_NS_NFE}}}det"
+_TAG_PAG = f"{{{_NS_NFE}}}pag"
+_TAG_DETPAG = f"{{{_NS_NFE}}}detPag"
 
-    infNFe = _find(r, ".//nfe:infNFe")
-    if infNFe is None:
-        return None # Não é uma NFe/NFCe válida
+MAPA_PAGAMENTO = {
+    "01": "Dinheiro", "02": "Cheque", "03": "Cartão de Crédito", "04": "Cartão de Débito",
+    "05": "Crédito Loja", "10": "Vale Alimentação", "11": "Vale Refeição", "12": "Vale Presente",
+    "13": "Vale Combustível", "14": "Duplicata Mercantil", "15": "Boleto Bancário", "16": "Depósito Bancário",
+    "17": "PIX", "18": "Transferência Bancária", "19": "Carteira Digital", "90": "Sem Pagamento", "99": "Outros"
+}
 
-    ide = _find(infNFe, "nfe:ide")
-    emit = _find(infNFe, "nfe:emit")
-    det_list = _findall(infNFe, "nfe:det")
+# --- Plano de extração declarativo ---
+# Cada mapa associa o caminho de um grupo a uma lista de (coluna, subcaminho, tipo).
+# Tipos: "texto" (texto livre, sanitizado), "codigo" (códigos e datas, sem sanitização),
+# "numero" (quantidades, alíquotas, preços unitários) e
+# "valor" (monetários TDec_1302, que podem ser decodificados em centavos).
+# Quando o grupo existe no XML, todas as suas colunas recebem primeiro o valor padrão
+# do tipo (ex.: "" ou 0.0), reproduzindo o esquema de COLUNAS_TRADUZIDAS.
+# O segmento "*" casa com qualquer tag (ex.: ICMS00, ICMSSN102, PISAliq...).
+CAMPOS_NOTA = {
+    "": [
+        ("modelo_doc", "ide/mod", "codigo"),
+        ("serie", "ide/serie", "codigo"),
+        ("numero_nf", "ide/nNF", "codigo"),
+        ("data_emissao", "ide/dhEmi", "codigo"),
+        ("valor_total_nf", "total/ICMSTot/vNF", "valor"),
+        ("valor_total_produtos", "total/ICMSTot/vProd", "valor"),
+        ("emit_cnpj", "emit/CNPJ", "codigo"),
+        ("emit_nome", "emit/xNome", "texto"),
+        ("dest_cnpj_cpf", "dest/CNPJ", "codigo"),
+        ("dest_cnpj_cpf", "dest/CPF", "codigo"),
+        ("dest_nome", "dest/xNome", "texto"),
+    ],
+}
 
-    if not all([ide, emit, det_list]):
-        return None # Estrutura mínima não encontrada
+CAMPOS_ITEM = {
+    "": [
+        ("item_codigo", "prod/cProd", "codigo"),
+        ("item_descricao", "prod/xProd", "texto"),
+        ("item_cfop", "prod/CFOP", "codigo"),
+        ("item_ncm", "prod/NCM", "codigo"),
+        ("item_quantidade", "prod/qCom", "numero"),
+        ("item_valor_unitario", "prod/vUnCom", "numero"),
+        ("item_valor_total", "prod/vProd", "valor"),
+    ],
+    "imposto/ICMS/*": [
+        ("icms_cst", "CST", "codigo"),
+        ("icms_cst", "CSOSN", "codigo"),
+        ("icms_vbc", "vBC", "valor"),
+        ("icms_picms", "pICMS", "numero"),
+        ("icms_vicms", "vICMS", "valor"),
+        ("icms_vbcst", "vBCST", "valor"),
+        ("icms_vicmsst", "vICMSST", "valor"),
+    ],
+    "imposto/IPI/IPITrib": [
+        ("ipi_vipi", "vIPI", "valor"),
+    ],
+    "imposto/PIS/*": [
+        ("pis_cst", "CST", "codigo"),
+        ("pis_vbc", "vBC", "valor"),
+        ("pis_ppis", "pPIS", "numero"),
+        ("pis_vpis", "vPIS", "valor"),
+    ],
+    "imposto/COFINS/*": [
+        ("cofins_cst", "CST", "codigo"),
+        ("cofins_vbc", "vBC", "valor"),
+        ("cofins_pcofins", "pCOFINS", "numero"),
+        ("cofins_vcofins", "vCOFINS", "valor"),
+    ],
+}
 
-    # --- Dados Gerais da Nota ---
-    chave = infNFe.attrib.get("Id", "").replace("NFe", "")
-    enderEmit = _find(emit, "nfe:enderEmit") or ET.Element("enderEmit")
-    dest = _find(infNFe, "nfe:dest") or ET.Element("dest")
-    total = _find(infNFe, "nfe:total/nfe:ICMSTot") or ET.Element("ICMSTot")
-    pag = _find(infNFe, "nfe:pag") or ET.Element("pag")
-    
-    mapa_pagamento = {
-        "01": "Dinheiro", "02": "Cheque", "03": "Cartão de Crédito", "04": "Cartão de Débito",
-        "05": "Crédito Loja", "10": "Vale Alimentação", "11": "Vale Refeição", "12": "Vale Presente",
-        "13": "Vale Combustível", "14": "Duplicata Mercantil", "15": "Boleto Bancário", "16": "Depósito Bancário",
-        "17": "PIX", "18": "Transferência Bancária", "19": "Carteira Digital", "90": "Sem Pagamento", "99": "Outros"
-    }
-    pagamentos_list = [
-        f"{mapa_pagamento.get(_text(_find(detPag, 'nfe:tPag')), 'Outros')}={_text(_find(detPag, 'nfe:vPag'))}"
-        for detPag in _findall(pag, "nfe:detPag")
-    ]
+CAMPOS_PAGAMENTO = {
+    "": [
+        ("tipo", "tPag", "codigo"),
+        ("valor", "vPag", "codigo"),
+    ],
+}
+
+# Conversores por modo numérico (ver core.decimais.MODOS_NUMERICOS)
+CONVERSORES_POR_MODO: Dict[str, Dict[str, Callable[[Optional[str]], Any]]] = {
+    "float": {"texto": _sanitizar, "codigo": _codigo, "numero": _parse_float, "valor": _parse_float},
+    "decimal": {"texto": _sanitizar, "codigo": _codigo, "numero": decodificar_decimal, "valor": decodificar_decimal},
+    "centavos": {"texto": _sanitizar, "codigo": _codigo, "numero": decodificar_decimal, "valor": decodificar_centavos},
+}
+
+class _NoPlano:
+    """Nó do plano compilado: despacho por tag para campos-folha e subgrupos."""
+    __slots__ = ("campos", "filhos", "curinga", "padroes")
+
+    def __init__(self):
+        self.campos: Dict[str, Tuple[str, Callable]] = {}
+        self.filhos: Dict[str, "_NoPlano"] = {}
+        self.curinga: Optional["_NoPlano"] = None
+        self.padroes: Dict[str, Any] = {}
 
+    def filho(self, segmento: str) -> "_NoPlano":
+        if segmento == "*":
+            if self.curinga is None:
+                self.curinga = _NoPlano()
+            return self.curinga
+        tag = f"{{{_NS_NFE}}}{segmento}"
+        if tag not in self.filhos:
+            self.filhos[tag] = _NoPlano()
+        return self.filhos[tag]
+
+def compilar_plano(campos: Dict[str, List[Tuple[str, str, str]]], modo_numerico: str = "float") -> _NoPlano:
+    """Compila um mapa declarativo de campos numa tabela de despacho por tag (notação Clark)."""
+    if modo_numerico not in MODOS_NUMERICOS:
+        raise ValueError(f"Modo numérico desconhecido: {modo_numerico}")
+    conversores = CONVERSORES_POR_MODO[modo_numerico]
+    raiz = _NoPlano()
+    for caminho_grupo, lista_campos in campos.items():
+        grupo = raiz
+        for segmento in filter(None, caminho_grupo.split("/")):
+            grupo = grupo.filho(segmento)
+        for coluna, subcaminho, tipo in lista_campos:
+            conversor = conversores[tipo]
+            *intermediarios, folha = subcaminho.split("/")
+            no = grupo
+            for segmento in intermediarios:
+                no = no.filho(segmento)
+            no.campos[f"{{{_NS_NFE}}}{folha}"] = (coluna, conversor)
+            grupo.padroes.setdefault(coluna, conversor(None))
+    return raiz
+
+def _aplicar_plano(elem: ET.Element, no: _NoPlano, linha: Dict[str, Any]) -> None:
+    """Preenche a linha numa única passagem pelos filhos do elemento."""
+    if no.padroes:
+        linha.update(no.padroes)
+    campos, filhos, curinga = no.campos, no.filhos, no.curinga
+    for filho in elem:
+        campo = campos.get(filho.tag)
+        if campo is not None:
+            coluna, conversor = campo
+            linha[coluna] = conversor(filho.text)
+            continue
+        sub = filhos.get(filho.tag, curinga)
+        if sub is not None:
+            _aplicar_plano(filho, sub, linha)
+
+PLANO_PAGAMENTO = compilar_plano(CAMPOS_PAGAMENTO)
+
+@lru_cache(maxsize=None)
+def _planos(modo_numerico: str) -> Tuple[_NoPlano, _NoPlano]:
+    """Planos (nota, item) compilados uma única vez por modo numérico."""
+    return compilar_plano(CAMPOS_NOTA, modo_numerico), compilar_plano(CAMPOS_ITEM, modo_numerico)
+
+def _extrair_dados_comuns(fp: str, infNFe: ET.Element, chaves_canceladas: set,
+                          plano_nota: _NoPlano) -> Dict[str, Any]:
+    """Monta os campos da nota que se repetem em todas as linhas de item."""
+    chave = infNFe.attrib.get("Id", "").replace("NFe", "")
     dados_comuns = {
         "status": "Cancelada" if chave in chaves_canceladas else "Autorizada",
         "arquivo": os.path.basename(fp),
         "chave_acesso": chave,
-        "modelo_doc": _text(_find(ide, "nfe:mod")),
-        "serie": _text(_find(ide, "nfe:serie")),
-        "numero_nf": _text(_find(ide, "nfe:nNF")),
-        "data_emissao": _text(_find(ide, "nfe:dhEmi")),
-        "valor_total_nf": _parse_float(_text(_find(total, "nfe:vNF"))),
-        "valor_total_produtos": _parse_float(_text(_find(total, "nfe:vProd"))),
-        "emit_cnpj": _text(_find(emit, "nfe:CNPJ")),
-        "emit_nome": _text(_find(emit, "nfe:xNome")),
-        "dest_cnpj_cpf": _text(_find(dest, "nfe:CPF")) or _text(_find(dest, "nfe:CNPJ")),
-        "dest_nome": _text(_find(dest, "nfe:xNome")),
-        "pagamentos": "; ".join(pagamentos_list),
     }
+    _aplicar_plano(infNFe, plano_nota, dados_comuns)
+
+    pagamentos_list = []
+    pag = infNFe.find(_TAG_PAG)
+    if pag is not None:
+        for detPag in pag:
+            if detPag.tag != _TAG_DETPAG:
+                continue
+            pagamento: Dict[str, Any] = {}
+            _aplicar_plano(detPag, PLANO_PAGAMENTO, pagamento)
+            pagamentos_list.append(f"{MAPA_PAGAMENTO.get(pagamento['tipo'], 'Outros')}={pagamento['valor']}")
+    dados_comuns["pagamentos"] = "; ".join(pagamentos_list)
+    return dados_comuns
+
+def _extrair_item(det: ET.Element, plano_item: _NoPlano) -> Dict[str, Any]:
+    """Extrai os dados de produto e impostos de um elemento <det> com o plano compilado."""
+    item = {"item_numero": det.attrib.get("nItem", "")}
+    _aplicar_plano(det, plano_item, item)
+    return item
+
+def parse_nfe_nfce_xml(fp: str, chaves_canceladas: set, streaming: bool = False,
+                       modo_numerico: str = "float") -> Optional[List[Dict[str, Any]]]:
+    """
+    Lê um XML de NFe/NFCe e extrai todas as informações de forma robusta.
+    Com streaming=True usa iterar_nfe_nfce_xml, que não mantém a árvore completa em memória.
+    modo_numerico escolhe a representação dos números: "float", "decimal" (Decimal exato)
+    ou "centavos" (valores monetários em centavos inteiros, demais campos em Decimal).
+    """
+    try:
+        if streaming:
+            return list(iterar_nfe_nfce_xml(fp, chaves_canceladas, modo_numerico)) or None
+        r = carregar_xml(fp)
+    except ERROS_XML:
+        return None
+
+    return extrair_linhas(r, fp, chaves_canceladas, modo_numerico)
 
-    # --- Processamento por Item ---
-    linhas_finais = []
-    for det in det_list:
-        prod = _find(det, "nfe:prod")
-        imposto = _find(det, "nfe:imposto")
-
-        item_dados = {
-            "item_numero": det.attrib.get("nItem", ""),
-            "item_codigo": _text(_find(prod, "nfe:cProd")),
-            "item_descricao": _text(_find(prod, "nfe:xProd")),
-            "item_cfop": _text(_find(prod, "nfe:CFOP")),
-            "item_ncm": _text(_find(prod, "nfe:NCM")),
-            "item_quantidade": _parse_float(_text(_find(prod, "nfe:qCom"))),
-            "item_valor_unitario": _parse_float(_text(_find(prod, "nfe:vUnCom"))),
-            "item_valor_total": _parse_float(_text(_find(prod, "nfe:vProd"))),
-        }
-
-        # --- EXTRAÇÃO DE IMPOSTOS ROBUSTA E COMPLETA ---
-        impostos_item = {}
-        if imposto is not None:
-            # Itera sobre todos os filhos diretos da tag <imposto>
-            for imposto_detalhe in imposto:
-                # ICMS
-                if 'ICMS' in imposto_detalhe.tag:
-                    # A tag de detalhe (ICMS00, ICMS10, etc.) é o primeiro e único filho de <ICMS>
-                    icms_grupo = imposto_detalhe[0] if len(imposto_detalhe) > 0 else None
-                    if icms_grupo is not None:
-                        impostos_item["icms_cst"] = _text(_find(icms_grupo, "nfe:CST")) or _text(_find(icms_grupo, "nfe:CSOSN"))
-                        impostos_item["icms_vbc"] = _parse_float(_text(_find(icms_grupo, "nfe:vBC")))
-                        impostos_item["icms_picms"] = _parse_float(_text(_find(icms_grupo, "nfe:pICMS")))
-                        impostos_item["icms_vicms"] = _parse_float(_text(_find(icms_grupo, "nfe:vICMS")))
-                        impostos_item["icms_vbcst"] = _parse_float(_text(_find(icms_grupo, "nfe:vBCST")))
-                        impostos_item["icms_vicmsst"] = _parse_float(_text(_find(icms_grupo, "nfe:vICMSST")))
-                # IPI
-                if 'IPI' in imposto_detalhe.tag:
-                    ipi_grupo = _find(imposto_detalhe, "nfe:IPITrib")
-                    if ipi_grupo is not None:
-                        impostos_item["ipi_vipi"] = _parse_float(_text(_find(ipi_grupo, "nfe:vIPI")))
-                # PIS
-                if 'PIS' in imposto_detalhe.tag:
-                    pis_grupo = imposto_detalhe[0] if len(imposto_detalhe) > 0 else None # PISAliq, PISOutr, etc.
-                    if pis_grupo is not None:
-                        impostos_item["pis_cst"] = _text(_find(pis_grupo, "nfe:CST"))
-                        impostos_item["pis_vbc"] = _parse_float(_text(_find(pis_grupo, "nfe:vBC")))
-                        impostos_item["pis_ppis"] = _parse_float(_text(_find(pis_grupo, "nfe:pPIS")))
-                        impostos_item["pis_vpis"] = _parse_float(_text(_find(pis_grupo, "nfe:vPIS")))
-                # COFINS
-                if 'COFINS' in imposto_detalhe.tag:
-                    cofins_grupo = imposto_detalhe[0] if len(imposto_detalhe) > 0 else None # COFINSAliq, etc.
-                    if cofins_grupo is not None:
-                        impostos_item["cofins_cst"] = _text(_find(cofins_grupo, "nfe:CST"))
-                        impostos_item["cofins_vbc"] = _parse_float(_text(_find(cofins_grupo, "nfe:vBC")))
-                        impostos_item["cofins_pcofins"] = _parse_float(_text(_find(cofins_grupo, "nfe:pCOFINS")))
-                        impostos_item["cofins_vcofins"] = _parse_float(_text(_find(cofins_grupo, "nfe:vCOFINS")))
+def extrair_linhas(r: ET.Element, fp: str, chaves_canceladas: set,
+                   modo_numerico: str = "float") -> Optional[List[Dict[str, Any]]]:
+    """
+    Extrai as linhas de uma árvore já carregada (de qualquer backend).
+    Um lote com vários <NFe>/<nfeProc> no mesmo XML gera as linhas de todas as notas.
+    """
+    plano_nota, plano_item = _planos(modo_numerico)
+    linhas: List[Dict[str, Any]] = []
+    for infNFe in r.iter(_TAG_INFNFE):
+        det_list = [filho for filho in infNFe if filho.tag == _TAG_DET]
+        if infNFe.find(_TAG_IDE) is None or infNFe.find(_TAG_EMIT) is None or not det_list:
+            continue # Estrutura mínima não encontrada
 
+        # --- Dados Gerais da Nota ---
+        dados_comuns = _extrair_dados_comuns(fp, infNFe, chaves_canceladas, plano_nota)
+
+        # --- Processamento por Item ---
         # Combina todos os dados para a linha final
-        linha_final = {**dados_comuns, **item_dados, **impostos_item}
-        linhas_finais.append(linha_final)
-        
-    return linhas_finais
+        linhas.extend({**dados_comuns, **_extrair_item(det, plano_item)} for det in det_list)
+    return linhas or None # None quando não há NFe/NFCe válida
+
+def iterar_nfe_nfce_xml(fp: str, chaves_canceladas: set, modo_numerico: str = "float") -> Iterator[Dict[str, Any]]:
+    """
+    Versão streaming de parse_nfe_nfce_xml baseada em iterparse.
+
+    Cada <det> é convertido em dicionário assim que termina de ser lido e removido
+    da árvore: a árvore XML de uma nota nunca fica inteira em memória. Como <total> e
+    <pag> vêm depois dos itens no leiaute, os dicionários dos itens de uma nota ficam
+    retidos até o <infNFe> fechar, quando as linhas são emitidas; a memória de pico
+    ainda cresce com o número de itens da maior nota (um dicionário por item). Um XML mal formado é registado no log e o erro de sintaxe
+    é propagado, para que uma leitura parcial não pareça completa.
+    """
+    plano_nota, plano_item = _planos(modo_numerico)
+    infNFe = None
+    profundidade = 0
+    nivel_infNFe = -1
+    itens: List[Dict[str, Any]] = []
+
+    try:
+        for evento, elem in _iterparse(fp, ("start", "end")):
+            if evento == "start":
+                profundidade += 1
+                if elem.tag == _TAG_INFNFE and infNFe is None:
+                    infNFe, nivel_infNFe = elem, profundidade
+                    itens = []
+                continue
+
+            nivel = profundidade
+            profundidade -= 1
+            if infNFe is None:
+                continue
 
+            if nivel == nivel_infNFe + 1 and elem.tag == _TAG_DET:
+                itens.append(_extrair_item(elem, plano_item))
+                infNFe.remove(elem)
+            elif elem is infNFe:
+                if itens and infNFe.find(_TAG_IDE) is not None and infNFe.find(_TAG_EMIT) is not None:
+                    dados_comuns = _extrair_dados_comuns(fp, infNFe, chaves_canceladas, plano_nota)
+                    for item in itens:
+                        yield {**dados_comuns, **item}
+                infNFe.clear()
+                infNFe, nivel_infNFe = None, -1
+                itens = []
+    except ERROS_XML as e:
+        logging.error(f"XML mal formado durante a leitura em streaming de {fp}: {e}")
+        raise
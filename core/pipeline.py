@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline em etapas com filas limitadas (produtor/consumidor com contrapressão).
+
+A origem (descoberta) e cada etapa rodam em threads próprias, ligadas por filas de
+tamanho fixo: quando uma etapa atrasa, a fila anterior enche e as etapas de cima
+esperam. A memória fica limitada pela capacidade das filas, qualquer que seja o
+tamanho da pasta. Cada etapa registra quantos itens tratou, e a profundidade de
+cada fila pode ser consultada a qualquer momento para exibir o progresso.
+
+Um core.controle.ControleProcessamento opcional é consultado antes de cada item
+da origem (pausa, limitação de ritmo, cancelamento); após um cancelamento, os itens
+que já estavam nas filas são descartados sem passar pelas etapas.
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Etapa: (nome, função item -> item ou None, número de threads)
+Etapa = Tuple[str, Callable[[Any], Any], int]
+
+NOME_ORIGEM = "descoberta"
+
+CAPACIDADE_FILA_PADRAO = 64
+
+_FIM = object()
+
+class _ContagemEtapa:
+    """Contadores de uma etapa; alterados apenas pelas threads da própria etapa, sob trava."""
+    __slots__ = ("nome", "fila", "processados", "descartados", "erros", "cancelados", "ativos", "trava")
+
+    def __init__(self, nome: str, fila: Optional[queue.Queue], ativos: int):
+        self.nome = nome
+        self.fila = fila
+        self.processados = 0
+        self.descartados = 0
+        self.erros = 0
+        self.cancelados = 0
+        self.ativos = ativos
+        self.trava = threading.Lock()
+
+class PipelineLimitado:
+    """
+    Executa itens por uma sequência de etapas ligadas por filas limitadas.
+    Uma etapa que devolve None descarta o item; uma exceção é registrada como erro
+    da etapa e também descarta o item. O resultado da última etapa não é guardado.
+    """
+
+    def __init__(self, etapas: Sequence[Etapa], capacidade_fila: int = CAPACIDADE_FILA_PADRAO,
+                 callback_progresso: Optional[Callable[[Dict[str, Dict[str, Any]]], None]] = None,
+                 intervalo_progresso: float = 0.5, controle: Optional[Any] = None):
+        if not etapas:
+            raise ValueError("O pipeline precisa de ao menos uma etapa")
+        self.etapas = list(etapas)
+        self.capacidade_fila = capacidade_fila
+        self.callback_progresso = callback_progresso
+        self.intervalo_progresso = intervalo_progresso
+        self.controle = controle
+        self._contagens: List[_ContagemEtapa] = []
+        self._inicio = 0.0
+
+    def instantaneo(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Situação atual de cada etapa: itens processados, descartados, com erro,
+        cancelados, aguardando na fila de entrada e vazão (itens/s) desde o início.
+        """
+        decorrido = max(time.perf_counter() - self._inicio, 1e-9)
+        situacao = {}
+        for contagem in self._contagens:
+            situacao[contagem.nome] = {
+                "processados": contagem.processados,
+                "descartados": contagem.descartados,
+                "erros": contagem.erros,
+                "cancelados": contagem.cancelados,
+                "fila": contagem.fila.qsize() if contagem.fila is not None else 0,
+                "por_segundo": round(contagem.processados / decorrido, 1),
+            }
+        return situacao
+
+    def executar(self, itens: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """Processa todos os itens e retorna o instantâneo final das etapas."""
+        filas = [queue.Queue(maxsize=self.capacidade_fila) for _ in self.etapas]
+        self._contagens = [_ContagemEtapa(NOME_ORIGEM, None, 1)]
+        self._contagens += [_ContagemEtapa(nome, fila, workers)
+                            for (nome, _, workers), fila in zip(self.etapas, filas)]
+        self._inicio = time.perf_counter()
+
+        # Cada etapa avisa o fim com um marcador por thread da etapa seguinte
+        threads = [threading.Thread(target=self._origem, args=(itens, filas[0], self.etapas[0][2]), daemon=True)]
+        for indice, (_, funcao, workers) in enumerate(self.etapas):
+            if indice + 1 < len(filas):
+                saida, finais = filas[indice + 1], self.etapas[indice + 1][2]
+            else:
+                saida, finais = None, 0
+            for _ in range(workers):
+                threads.append(threading.Thread(
+                    target=self._etapa, args=(self._contagens[indice + 1], funcao, filas[indice], saida, finais),
+                    daemon=True))
+
+        concluido = threading.Event()
+        monitor = None
+        if self.callback_progresso:
+            monitor = threading.Thread(target=self._monitorar, args=(concluido,), daemon=True)
+            monitor.start()
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        concluido.set()
+        if monitor is not None:
+            monitor.join()
+        final = self.instantaneo()
+        self._notificar(final)
+        return final
+
+    def _origem(self, itens: Iterable[Any], saida: queue.Queue, finais: int):
+        contagem = self._contagens[0]
+        try:
+            for item in itens:
+                if self.controle is not None and not self.controle.aguardar():
+                    logging.info("🛑 Processamento cancelado: nenhum novo item será iniciado")
+                    break
+                saida.put(item)
+                contagem.processados += 1
+        except Exception as e:
+            contagem.erros += 1
+            logging.error(f"❌ Erro na etapa {NOME_ORIGEM}: {e}")
+        finally:
+            for _ in range(finais):
+                saida.put(_FIM)
+
+    def _etapa(self, contagem: _ContagemEtapa, funcao: Callable[[Any], Any],
+               entrada: queue.Queue, saida: Optional[queue.Queue], finais: int):
+        while True:
+            item = entrada.get()
+            if item is _FIM:
+                # A última thread da etapa a terminar avisa a etapa seguinte
+                with contagem.trava:
+                    contagem.ativos -= 1
+                    ultima = contagem.ativos == 0
+                if ultima:
+                    for _ in range(finais):
+                        saida.put(_FIM)
+                return
+            if self.controle is not None and self.controle.cancelado:
+                with contagem.trava:
+                    contagem.cancelados += 1
+                continue
+            try:
+                resultado = funcao(item)
+            except Exception as e:
+                with contagem.trava:
+                    contagem.erros += 1
+                logging.error(f"❌ Erro na etapa {contagem.nome}: {e}")
+                continue
+            with contagem.trava:
+                if resultado is None:
+                    contagem.descartados += 1
+                else:
+                    contagem.processados += 1
+            if resultado is not None and saida is not None:
+                saida.put(resultado)
+
+    def _monitorar(self, concluido: threading.Event):
+        while not concluido.wait(self.intervalo_progresso):
+            self._notificar(self.instantaneo())
+
+    def _notificar(self, situacao: Dict[str, Dict[str, Any]]):
+        if not self.callback_progresso:
+            return
+        try:
+            self.callback_progresso(situacao)
+        except Exception as e:
+            logging.warning(f"Falha no callback de progresso: {e}")
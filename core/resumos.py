@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Quadro tipado usado por todos os resumos do NFeProcessor.
+
+As colunas extraídas das notas são convertidas uma única vez: valores e alíquotas
+viram float64 (ausentes = 0; os monetários sempre em reais, mesmo no modo centavos), a data de emissão vira datetime64 e os textos e
+códigos, que se repetem em todas as linhas de item da mesma nota, viram colunas
+categóricas. Do mesmo quadro saem duas visões: a de itens (uma linha por item) e a
+de notas (uma linha por chave de acesso), cada uma com o recorte das autorizadas.
+"""
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.decimais import DIVISOR_REAIS_POR_MODO
+
+STATUS_AUTORIZADA = "Autorizada"
+
+# Campos do cabeçalho da nota, repetidos em cada linha de item (ver core.parser.CAMPOS_NOTA)
+COLUNAS_NOTA = (
+    "chave_acesso", "status", "arquivo", "modelo_doc", "serie", "numero_nf", "data_emissao",
+    "valor_total_nf", "valor_total_produtos", "emit_cnpj", "emit_nome",
+    "dest_cnpj_cpf", "dest_nome", "pagamentos",
+)
+
+# Campos "numero" e "valor" do plano de extração
+COLUNAS_NUMERICAS = (
+    "valor_total_nf", "valor_total_produtos",
+    "item_quantidade", "item_valor_unitario", "item_valor_total",
+    "icms_vbc", "icms_picms", "icms_vicms", "icms_vbcst", "icms_vicmsst", "ipi_vipi",
+    "pis_vbc", "pis_ppis", "pis_vpis", "cofins_vbc", "cofins_pcofins", "cofins_vcofins",
+)
+
+# Campos "valor" do plano (monetários, em centavos inteiros no modo centavos)
+COLUNAS_VALOR = (
+    "valor_total_nf", "valor_total_produtos", "item_valor_total",
+    "icms_vbc", "icms_vicms", "icms_vbcst", "icms_vicmsst", "ipi_vipi",
+    "pis_vbc", "pis_vpis", "cofins_vbc", "cofins_vcofins",
+)
+
+def _converter_coluna(nome: str, valores: Sequence[Any], divisor: int = 1) -> Any:
+    """Converte uma coluna para o tipo usado nos resumos (divisor leva os valores a reais)"""
+    if nome in COLUNAS_NUMERICAS:
+        serie = pd.to_numeric(pd.Series(valores, dtype=object), errors="coerce").fillna(0).astype("float64")
+        return serie / divisor if divisor != 1 and nome in COLUNAS_VALOR else serie
+    if nome == "data_emissao":
+        # Data e hora locais da emissão (dhEmi sem o fuso; dEmi só com a data)
+        textos = pd.Series(valores, dtype=object).str.slice(0, 19)
+        return pd.to_datetime(textos, errors="coerce", format="ISO8601")
+    return pd.Categorical(valores)
+
+# Tipo de operação pelo primeiro dígito do CFOP (1-3 entradas, 5-7 saídas)
+TIPOS_OPERACAO = ("Entrada", "Saída", "Indefinido")
+TIPO_OPERACAO_POR_DIGITO = {"1": "Entrada", "2": "Entrada", "3": "Entrada",
+                            "5": "Saída", "6": "Saída", "7": "Saída"}
+
+def classificar_cfops(cfops: pd.Series) -> pd.Series:
+    """
+    Tipo de operação (categórico) de cada CFOP pelo primeiro dígito. A classificação é
+    feita sobre as categorias e expandida pelos códigos, sem percorrer as linhas em Python.
+    """
+    cfops = cfops.astype("category")
+    primeiro_digito = cfops.cat.categories.astype(str).str[:1]
+    tipos = pd.Index(TIPOS_OPERACAO).get_indexer(primeiro_digito.map(TIPO_OPERACAO_POR_DIGITO).fillna("Indefinido"))
+    # O código -1 (CFOP ausente) cai na última posição: "Indefinido"
+    codigos = np.append(tipos, TIPOS_OPERACAO.index("Indefinido"))[cfops.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=TIPOS_OPERACAO), index=cfops.index,
+                     name="tipo_operacao")
+
+def aliquotas_esperadas(ncms: pd.Series, regras_ncm: Mapping[str, float], padrao: float = 0.0) -> pd.Series:
+    """
+    Alíquota esperada de cada item pelo NCM: as regras viram uma Series indexada pelo NCM,
+    alinhada às categorias da coluna e expandida pelos códigos (NCM sem regra = padrao).
+    """
+    ncms = ncms.astype("category")
+    regras = pd.Series(regras_ncm, dtype="float64")
+    por_categoria = regras.reindex(ncms.cat.categories.astype(str)).fillna(padrao).to_numpy()
+    valores = np.append(por_categoria, padrao)[ncms.cat.codes.to_numpy()]
+    return pd.Series(valores, index=ncms.index, name="aliquota_esperada")
+
+def intervalos_faltantes(numeros: Sequence[int]) -> List[Tuple[int, int]]:
+    """
+    Intervalos (início, fim), inclusivos, ausentes entre o menor e o maior número.
+    Trabalha sobre o vetor ordenado com np.diff: a memória depende da quantidade de
+    números, não da distância entre eles (1 e 900000000 geram um único intervalo).
+    """
+    ordenados = np.unique(np.asarray(numeros, dtype=np.int64))
+    saltos = np.flatnonzero(np.diff(ordenados) > 1)
+    return list(zip((ordenados[saltos] + 1).tolist(), (ordenados[saltos + 1] - 1).tolist()))
+
+def lacunas_na_sequencia(df: pd.DataFrame, chaves: Sequence[str],
+                         coluna: str = "numero") -> Dict[Tuple[Any, ...], List[Tuple[int, int]]]:
+    """
+    Intervalos faltantes de coluna dentro de cada grupo de chaves (ex.: emitente e série),
+    numa única ordenação vetorizada de todos os grupos.
+    """
+    # Sem número ou sem chave de grupo, a nota fica fora da verificação
+    df = df.dropna(subset=[coluna, *chaves])
+    if df.empty:
+        return {}
+    grupos = df.groupby(list(chaves), observed=True, sort=True).ngroup().to_numpy()
+    numeros = df[coluna].to_numpy(dtype=np.int64)
+    ordem = np.lexsort((numeros, grupos))
+    grupos, numeros = grupos[ordem], numeros[ordem]
+
+    # Salto maior que 1 entre vizinhos do mesmo grupo (repetidos têm diferença 0)
+    saltos = np.flatnonzero((np.diff(numeros) > 1) & (grupos[1:] == grupos[:-1]))
+    valores_chave = df[list(chaves)].to_numpy()[ordem[saltos]]
+    lacunas: Dict[Tuple[Any, ...], List[Tuple[int, int]]] = {}
+    for chave, inicio, fim in zip(map(tuple, valores_chave), (numeros[saltos] + 1).tolist(),
+                                  (numeros[saltos + 1] - 1).tolist()):
+        lacunas.setdefault(chave, []).append((inicio, fim))
+    return lacunas
+
+class QuadroResumos:
+    """
+    Visões tipadas das linhas processadas: itens (todas as linhas) e notas (uma por chave
+    de acesso), com os recortes itens_autorizados e notas_autorizadas.
+    As visões são compartilhadas entre os resumos e não devem ser alteradas.
+    """
+
+    def __init__(self, colunas: Mapping[str, Sequence[Any]], modo_numerico: str = "float"):
+        # colunas: {nome: valores}, ex.: AcumuladorColunar.por_coluna() ou um DataFrame
+        # modo_numerico: modo em que as linhas foram extraídas (ver core.decimais)
+        divisor = DIVISOR_REAIS_POR_MODO[modo_numerico]
+        self.itens = pd.DataFrame({nome: _converter_coluna(nome, colunas[nome], divisor) for nome in colunas})
+        self.itens.reset_index(drop=True, inplace=True)
+
+        colunas_nota = [nome for nome in COLUNAS_NOTA if nome in self.itens.columns]
+        if "chave_acesso" in self.itens.columns:
+            self.notas = self.itens[colunas_nota].drop_duplicates(subset=["chave_acesso"])
+        else:
+            self.notas = self.itens[colunas_nota]
+        if "numero_nf" in self.notas.columns:
+            # Número da nota como float (NaN se não numérico), para a sequência por série
+            self.notas = self.notas.assign(numero=pd.to_numeric(self.notas["numero_nf"].astype(object), errors="coerce"))
+
+        if "status" in self.itens.columns:
+            self.itens_autorizados = self.itens[self.itens["status"] == STATUS_AUTORIZADA]
+            self.notas_autorizadas = self.notas[self.notas["status"] == STATUS_AUTORIZADA]
+        else:
+            self.itens_autorizados = self.itens.iloc[0:0]
+            self.notas_autorizadas = self.notas.iloc[0:0]
+
+    def __len__(self) -> int:
+        return len(self.itens)
@@ -6,7 +6,7 @@ import hashlib
 import pickle
 from pathlib import Path
 from contextlib import contextmanager
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 
 @contextmanager
 def error_handler(operation_name: str):
@@ -30,24 +30,34 @@ class CacheManager:
         self.cache_dir.mkdir(exist_ok=True)
         logging.info(f"Cache de arquivos será armazenado em: {self.cache_dir.resolve()}")
 
-    def _get_cache_key(self, filepath: str) -> str:
+    def _get_cache_key(self, filepath: Union[str, Any], variante: str = "") -> str:
         """
         Gera uma chave de cache única baseada no caminho, tamanho e data de modificação do arquivo.
+        Também aceita um core.fontes.DocumentoXML (ex.: membro de um .zip), cuja identidade
+        tem o mesmo formato; se o documento já tiver o digest do conteúdo, ele é a própria chave.
+        A variante distingue resultados do mesmo arquivo gerados com opções diferentes.
         """
         try:
-            stats = os.stat(filepath)
-            # Combina o caminho, o tamanho e o tempo de modificação para criar um hash
-            key_source = f"{filepath}-{stats.st_size}-{stats.st_mtime}"
+            digest = getattr(filepath, "digest", None)
+            if digest:
+                return f"{digest}-{variante}" if variante else digest
+            key_source = getattr(filepath, "identidade", None)
+            if key_source is None:
+                stats = os.stat(filepath)
+                # Combina o caminho, o tamanho e o tempo de modificação para criar um hash
+                key_source = f"{filepath}-{stats.st_size}-{stats.st_mtime}"
+            if variante:
+                key_source += f"-{variante}"
             return hashlib.md5(key_source.encode('utf-8')).hexdigest()
         except FileNotFoundError:
             return ""
 
-    def get(self, filepath: str) -> Optional[List[Dict[str, Any]]]:
+    def get(self, filepath: Union[str, Any], variante: str = "") -> Optional[List[Dict[str, Any]]]:
         """
         Tenta obter os dados processados de um arquivo a partir do cache.
         Retorna os dados se encontrados e válidos, caso contrário, None.
         """
-        cache_key = self._get_cache_key(filepath)
+        cache_key = self._get_cache_key(filepath, variante)
         if not cache_key:
             return None
             
@@ -56,21 +66,21 @@ class CacheManager:
         if cache_file.exists():
             try:
                 with open(cache_file, 'rb') as f:
-                    logging.debug(f"Cache HIT para o arquivo: {os.path.basename(filepath)}")
+                    logging.debug(f"Cache HIT para o arquivo: {os.path.basename(getattr(filepath, 'nome', filepath))}")
                     return pickle.load(f)
             except (pickle.UnpicklingError, EOFError) as e:
-                logging.warning(f"Cache corrompido para {os.path.basename(filepath)}. O arquivo será reprocessado. Erro: {e}")
+                logging.warning(f"Cache corrompido para {os.path.basename(getattr(filepath, 'nome', filepath))}. O arquivo será reprocessado. Erro: {e}")
                 # Remove o arquivo de cache corrompido
                 os.remove(cache_file)
         
-        logging.debug(f"Cache MISS para o arquivo: {os.path.basename(filepath)}")
+        logging.debug(f"Cache MISS para o arquivo: {os.path.basename(getattr(filepath, 'nome', filepath))}")
         return None
 
-    def set(self, filepath: str, data: List[Dict[str, Any]]):
+    def set(self, filepath: Union[str, Any], data: List[Dict[str, Any]], variante: str = ""):
         """
         Salva os dados processados de um arquivo no cache.
         """
-        cache_key = self._get_cache_key(filepath)
+        cache_key = self._get_cache_key(filepath, variante)
         if not cache_key:
             return
 
@@ -79,5 +89,5 @@ class CacheManager:
             with open(cache_file, 'wb') as f:
                 pickle.dump(data, f)
         except Exception as e:
-            logging.error(f"Não foi possível salvar o cache para {os.path.basename(filepath)}: {e}")
+            logging.error(f"Não foi possível salvar o cache para {os.path.basename(getattr(filepath, 'nome', filepath))}: {e}")
 
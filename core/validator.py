@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 import os
+import threading
 from lxml import etree
-from typing import Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
+
+from core.parser import obter_parser_lxml, extrair_linhas
 
 # --- CAMINHO PARA A PASTA DE SCHEMAS ---
 # O programa irá procurar por uma pasta chamada 'schemas' dentro do diretório do projeto.
@@ -23,6 +26,18 @@ def _encontrar_versao_e_schema(root: etree._Element) -> Optional[str]:
             return os.path.join(CAMINHO_PASTA_SCHEMAS, MAPA_XSD[versao])
     return None
 
+_schemas_thread = threading.local()
+
+def _obter_schema(caminho_xsd: str) -> etree.XMLSchema:
+    """Compila o XSD uma única vez por thread e reutiliza o objeto nas validações seguintes."""
+    cache: Dict[str, etree.XMLSchema] = getattr(_schemas_thread, "cache", None)
+    if cache is None:
+        cache = _schemas_thread.cache = {}
+    schema = cache.get(caminho_xsd)
+    if schema is None:
+        schema = cache[caminho_xsd] = etree.XMLSchema(etree.parse(caminho_xsd))
+    return schema
+
 def validar_com_xsd(caminho_xml: str) -> Tuple[bool, str]:
     """
     Valida um arquivo XML de NFe/NFCe contra o schema XSD oficial da SEFAZ.
@@ -32,27 +47,41 @@ def validar_com_xsd(caminho_xml: str) -> Tuple[bool, str]:
         return True, "AVISO: Pasta 'schemas' não encontrada. Validação XSD pulada."
 
     try:
-        xml_doc = etree.parse(caminho_xml)
-        raiz_xml = xml_doc.getroot()
+        raiz_xml = etree.parse(caminho_xml, obter_parser_lxml()).getroot()
+    except etree.XMLSyntaxError as e:
+        return False, f"Erro de sintaxe XML: {e}"
+    except Exception as e:
+        return False, f"Erro inesperado na validação: {e}"
+
+    return validar_arvore(raiz_xml)
+
+def validar_arvore(raiz_xml: etree._Element) -> Tuple[bool, str]:
+    """
+    Valida uma árvore lxml já carregada, permitindo que a extração reutilize o mesmo parse.
+    """
+    if not os.path.exists(CAMINHO_PASTA_SCHEMAS):
+        return True, "AVISO: Pasta 'schemas' não encontrada. Validação XSD pulada."
 
+    try:
         # A validação deve ser feita no elemento <NFe>, não no <nfeProc> que o envolve.
-        elemento_para_validar = raiz_xml.find(".//{http://www.portalfiscal.inf.br/nfe}NFe")
-        if elemento_para_validar is None:
+        # Em um lote, cada <NFe> é validada separadamente.
+        elementos_para_validar = list(raiz_xml.iter("{http://www.portalfiscal.inf.br/nfe}NFe"))
+        if not elementos_para_validar:
             # Se não encontrar <NFe>, tenta validar a raiz (caso seja um XML "puro")
-            elemento_para_validar = raiz_xml
-
-        caminho_xsd = _encontrar_versao_e_schema(elemento_para_validar)
-        if not caminho_xsd:
-            return False, "Não foi possível determinar a versão da NFe para validação."
-        
-        if not os.path.exists(caminho_xsd):
-            return False, f"Arquivo de Schema XSD não encontrado: {caminho_xsd}"
-
-        schema_doc = etree.parse(caminho_xsd)
-        schema = etree.XMLSchema(schema_doc)
-        
-        # Valida apenas o elemento <NFe> e seus filhos
-        schema.assertValid(etree.ElementTree(elemento_para_validar))
+            elementos_para_validar = [raiz_xml]
+
+        for elemento_para_validar in elementos_para_validar:
+            caminho_xsd = _encontrar_versao_e_schema(elemento_para_validar)
+            if not caminho_xsd:
+                return False, "Não foi possível determinar a versão da NFe para validação."
+
+            if not os.path.exists(caminho_xsd):
+                return False, f"Arquivo de Schema XSD não encontrado: {caminho_xsd}"
+
+            schema = _obter_schema(caminho_xsd)
+
+            # Valida apenas o elemento <NFe> e seus filhos
+            schema.assertValid(etree.ElementTree(elemento_para_validar))
         return True, "Válido"
 
     except etree.XMLSyntaxError as e:
@@ -62,3 +91,23 @@ def validar_com_xsd(caminho_xml: str) -> Tuple[bool, str]:
     except Exception as e:
         return False, f"Erro inesperado na validação: {e}"
 
+def validar_e_extrair(caminho_xml: str, chaves_canceladas: set, conteudo: Optional[bytes] = None,
+                      modo_numerico: str = "float") -> Tuple[bool, str, Optional[List[Dict[str, Any]]]]:
+    """
+    Lê o arquivo uma única vez, valida o <NFe> e extrai as linhas da mesma árvore.
+    Retorna (valido, mensagem, linhas); as linhas são None quando o XML é inválido.
+    """
+    try:
+        if conteudo is None:
+            with open(caminho_xml, 'rb') as f:
+                conteudo = f.read()
+        raiz_xml = etree.fromstring(conteudo, obter_parser_lxml())
+    except etree.XMLSyntaxError as e:
+        return False, f"Erro de sintaxe XML: {e}", None
+    except Exception as e:
+        return False, f"Erro inesperado na validação: {e}", None
+
+    valido, mensagem = validar_arvore(raiz_xml)
+    if not valido:
+        return False, mensagem, None
+    return True, mensagem, extrair_linhas(raiz_xml, caminho_xml, chaves_canceladas, modo_numerico)
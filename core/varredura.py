@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Varreduras rápidas em bytes, feitas antes do parse completo dos XMLs.
+
+Os eventos de cancelamento (procEventoNFe com tpEvento 110111/110112) são lidos
+por expressões regulares sobre o conteúdo bruto: não há árvore XML nem
+decodificação de texto, e o conjunto de chaves canceladas fica pronto numa única
+passagem pelos arquivos de evento.
+
+A chave de acesso de uma nota (infNFe/@Id) é lida do início do documento, o que
+permite descartar notas já cadastradas antes de ler e interpretar o XML inteiro.
+"""
+import logging
+import os
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+
+from core.fontes import DocumentoXML
+
+# 110111 = Cancelamento; 110112 = Cancelamento por substituição (NFC-e)
+TIPOS_EVENTO_CANCELAMENTO = (b"110111", b"110112")
+
+# cStat do retorno que confirmam o registro do evento
+CSTAT_EVENTO_REGISTRADO = (b"135", b"136", b"155")
+
+# Bytes iniciais lidos para encontrar o infNFe/@Id (cobre o cabeçalho do nfeProc/enviNFe)
+LIMITE_VARREDURA_CHAVE = 4096
+
+# Raízes de documentos com uma única NFe; nos demais (ex.: enviNFe) a chave do início
+# não representa o documento inteiro
+RAIZES_NOTA_UNICA = ("NFe", "nfeProc")
+
+# Elementos raiz de XMLs de evento; é o conteúdo que classifica o documento
+RAIZES_EVENTO = ("procEventoNFe", "evento", "envEvento", "retEnvEvento")
+
+# Bytes iniciais lidos para encontrar o elemento raiz (declaração e comentários inclusos)
+LIMITE_VARREDURA_RAIZ = 1024
+
+# Trechos de nome que sugerem arquivos de evento (só definem a ordem de verificação)
+PADROES_NOME_EVENTO = ("evt", "evento", "canc")
+
+_RE_INF_EVENTO = re.compile(rb"<(?:\w+:)?infEvento\b.*?</(?:\w+:)?infEvento>", re.S)
+_RE_TP_EVENTO = re.compile(rb"<(?:\w+:)?tpEvento>\s*(\d{6})\s*<")
+_RE_CH_NFE = re.compile(rb"<(?:\w+:)?chNFe>\s*(\d{44})\s*<")
+_RE_CSTAT = re.compile(rb"<(?:\w+:)?cStat>\s*(\d{3})\s*<")
+_RE_COMENTARIO = re.compile(rb"<!--.*?-->", re.S)
+_RE_RAIZ = re.compile(rb"<(?![?!])(?:[\w.-]+:)?([\w.-]+)")
+_RE_ID_INF_NFE = re.compile(rb"<(?:\w+:)?infNFe\b[^>]*?\bId\s*=\s*[\"']NFe(\d{44})[\"']")
+
+def e_xml_de_evento(nome: str) -> bool:
+    """Indica, pelo nome, se o arquivo (ou membro de contêiner) parece um XML de evento."""
+    nome = os.path.basename(nome).lower()
+    return nome.endswith(".xml") and any(padrao in nome for padrao in PADROES_NOME_EVENTO)
+
+def raiz_do_documento(inicio: bytes) -> Optional[str]:
+    """Nome local do elemento raiz, lido dos bytes iniciais (sem declaração, comentários ou prefixo)."""
+    encontrado = _RE_RAIZ.search(_RE_COMENTARIO.sub(b"", inicio))
+    return encontrado.group(1).decode("ascii", "replace") if encontrado else None
+
+def e_documento_de_evento(documento: DocumentoXML) -> bool:
+    """Indica, pelo elemento raiz lido do início do conteúdo, se o documento é um XML de evento."""
+    try:
+        inicio = documento.ler_inicio(LIMITE_VARREDURA_RAIZ)
+    except Exception as e:
+        logging.warning(f"Documento ilegível na classificação: {os.path.basename(documento.nome)} ({e})")
+        return False
+    return raiz_do_documento(inicio) in RAIZES_EVENTO
+
+def documentos_de_evento(documentos: Iterable[DocumentoXML]) -> List[DocumentoXML]:
+    """
+    Separa os documentos de evento pelo conteúdo. Os de nome sugestivo (e_xml_de_evento)
+    são examinados primeiro; um nome como "nfe_cancelada.xml" não basta para excluir uma nota.
+    """
+    candidatos = sorted(documentos, key=lambda documento: not e_xml_de_evento(documento.nome))
+    return [documento for documento in candidatos if e_documento_de_evento(documento)]
+
+def chave_de_acesso_em(inicio: bytes) -> Optional[str]:
+    """
+    Chave de acesso (44 dígitos) do primeiro infNFe encontrado nos bytes iniciais
+    de uma NFe, nfeProc ou lote; None se o Id não estiver no trecho.
+    """
+    encontrado = _RE_ID_INF_NFE.search(inicio)
+    return encontrado.group(1).decode("ascii") if encontrado else None
+
+def chaves_canceladas_em(conteudo: bytes) -> Set[str]:
+    """
+    Chaves de acesso canceladas em um XML de evento (evento, procEventoNFe ou lote).
+    Um retEvento com cStat de rejeição anula o evento da mesma chave.
+    """
+    canceladas: Set[str] = set()
+    rejeitadas: Set[str] = set()
+    for bloco in _RE_INF_EVENTO.finditer(conteudo):
+        trecho = bloco.group()
+        tipo = _RE_TP_EVENTO.search(trecho)
+        chave = _RE_CH_NFE.search(trecho)
+        if tipo is None or chave is None or tipo.group(1) not in TIPOS_EVENTO_CANCELAMENTO:
+            continue
+        cstat = _RE_CSTAT.search(trecho)
+        if cstat is not None and cstat.group(1) not in CSTAT_EVENTO_REGISTRADO:
+            rejeitadas.add(chave.group(1).decode("ascii"))
+        else:
+            canceladas.add(chave.group(1).decode("ascii"))
+    return canceladas - rejeitadas
+
+def coletar_chaves_canceladas(documentos: Iterable[DocumentoXML]) -> Tuple[Set[str], int]:
+    """Varre os documentos de evento e retorna (chaves canceladas, documentos lidos)."""
+    chaves: Set[str] = set()
+    lidos = 0
+    for documento in documentos:
+        try:
+            conteudo = documento.ler()
+        except Exception as e:
+            logging.warning(f"Evento ilegível ignorado: {os.path.basename(documento.nome)} ({e})")
+            continue
+        chaves |= chaves_canceladas_em(conteudo)
+        lidos += 1
+    return chaves, lidos
@@ -4,7 +4,7 @@
 import sqlite3
 import json
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 import logging
 import os
@@ -95,6 +95,27 @@ class ItemNotaFiscal:
     cst_cofins: str = ""
     aliquota_cofins: float = 0.0
     valor_cofins: float = 0.0
+    base_icms: float = 0.0
+    base_icms_st: float = 0.0
+    aliquota_icms_st: float = 0.0
+    valor_icms_st: float = 0.0
+    cst_ipi: str = ""
+    aliquota_ipi: float = 0.0
+    valor_ipi: float = 0.0
+    base_pis: float = 0.0
+    base_cofins: float = 0.0
+    
+    # Reforma Tributária (grupo IBSCBS - NT 2025.002)
+    cst_ibscbs: str = ""
+    cclass_trib: str = ""
+    base_ibscbs: float = 0.0
+    aliquota_ibs_uf: float = 0.0
+    valor_ibs_uf: float = 0.0
+    aliquota_ibs_mun: float = 0.0
+    valor_ibs_mun: float = 0.0
+    valor_ibs: float = 0.0
+    aliquota_cbs: float = 0.0
+    valor_cbs: float = 0.0
     
     # Sugestões IA
     ncm_sugerido: str = ""
@@ -102,6 +123,32 @@ class ItemNotaFiscal:
     cst_sugerido: str = ""
     confianca_ia: float = 0.0
 
+# Colunas criadas depois da versão original das tabelas.
+# init_database as acrescenta (ALTER TABLE) em bancos que ainda não as têm.
+COLUNAS_MIGRADAS = {
+    "itens_notas_fiscais": [
+        ("base_icms", "REAL DEFAULT 0"),
+        ("base_icms_st", "REAL DEFAULT 0"),
+        ("aliquota_icms_st", "REAL DEFAULT 0"),
+        ("valor_icms_st", "REAL DEFAULT 0"),
+        ("cst_ipi", "TEXT"),
+        ("aliquota_ipi", "REAL DEFAULT 0"),
+        ("valor_ipi", "REAL DEFAULT 0"),
+        ("base_pis", "REAL DEFAULT 0"),
+        ("base_cofins", "REAL DEFAULT 0"),
+        ("cst_ibscbs", "TEXT"),
+        ("cclass_trib", "TEXT"),
+        ("base_ibscbs", "REAL DEFAULT 0"),
+        ("aliquota_ibs_uf", "REAL DEFAULT 0"),
+        ("valor_ibs_uf", "REAL DEFAULT 0"),
+        ("aliquota_ibs_mun", "REAL DEFAULT 0"),
+        ("valor_ibs_mun", "REAL DEFAULT 0"),
+        ("valor_ibs", "REAL DEFAULT 0"),
+        ("aliquota_cbs", "REAL DEFAULT 0"),
+        ("valor_cbs", "REAL DEFAULT 0"),
+    ],
+}
+
 class DatabaseManager:
     """Gerenciador do banco de dados SQLite"""
     
@@ -226,8 +273,34 @@ class DatabaseManager:
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_nf_data ON notas_fiscais (data_emissao)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_nf_status ON notas_fiscais (status_sefaz)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_nf_empresa ON notas_fiscais (empresa_id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_nf_hash ON notas_fiscais (hash_arquivo)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_itens_nf ON itens_notas_fiscais (nota_fiscal_id)")
                 
+                # Manifesto de arquivos já ingeridos: um arquivo com o mesmo tamanho e mtime
+                # é pulado sem leitura; o hash só é recalculado quando os metadados mudam
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS manifesto_arquivos (
+                        caminho TEXT PRIMARY KEY,
+                        tamanho INTEGER NOT NULL,
+                        mtime REAL NOT NULL,
+                        hash_arquivo TEXT,
+                        registrado_em TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                
+                # Checkpoint da execução em andamento de cada pasta (estatisticas em JSON)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS checkpoints_processamento (
+                        pasta TEXT PRIMARY KEY,
+                        iniciado_em TEXT NOT NULL,
+                        atualizado_em TEXT NOT NULL,
+                        estatisticas TEXT,
+                        concluido INTEGER DEFAULT 0
+                    )
+                """)
+                
+                self._migrar_colunas(cursor)
+                
                 conn.commit()
                 logging.info("✅ Base de dados inicializada com sucesso")
                 
@@ -235,6 +308,105 @@ class DatabaseManager:
             logging.error(f"❌ Erro ao inicializar banco de dados: {e}")
             raise
     
+    def _migrar_colunas(self, cursor: sqlite3.Cursor):
+        """Acrescenta às tabelas as colunas de COLUNAS_MIGRADAS que ainda não existem"""
+        for tabela, colunas in COLUNAS_MIGRADAS.items():
+            cursor.execute(f"PRAGMA table_info({tabela})")
+            existentes = {col[1] for col in cursor.fetchall()}
+            for nome, tipo in colunas:
+                if nome not in existentes:
+                    cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}")
+                    logging.info(f"🔧 Coluna {tabela}.{nome} adicionada")
+    
+    def carregar_manifesto(self, prefixo: str = "") -> Dict[str, Tuple[int, float]]:
+        """Retorna {caminho: (tamanho, mtime)} dos arquivos do manifesto cujo caminho começa com o prefixo"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    "SELECT caminho, tamanho, mtime FROM manifesto_arquivos WHERE substr(caminho, 1, ?) = ?",
+                    (len(prefixo), prefixo)
+                )
+                return {caminho: (tamanho, mtime) for caminho, tamanho, mtime in cursor}
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao carregar manifesto: {e}")
+            return {}
+    
+    def registrar_manifesto(self, entradas: List[Tuple[str, int, float, str]]) -> bool:
+        """Registra (caminho, tamanho, mtime, hash) de arquivos ingeridos com sucesso"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO manifesto_arquivos (caminho, tamanho, mtime, hash_arquivo, registrado_em)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(*entrada, datetime.now().isoformat()) for entrada in entradas])
+                return True
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao registrar manifesto: {e}")
+            return False
+    
+    def caminhos_do_manifesto_entre(self, prefixo: str, inicio: str, fim: str) -> set:
+        """Caminhos (com o prefixo) registrados no manifesto entre os instantes inicio e fim (ISO)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute("""
+                    SELECT caminho FROM manifesto_arquivos
+                    WHERE substr(caminho, 1, ?) = ? AND registrado_em >= ? AND registrado_em <= ?
+                """, (len(prefixo), prefixo, inicio, fim))
+                return {caminho for (caminho,) in cursor}
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao consultar manifesto: {e}")
+            return set()
+    
+    def salvar_checkpoint(self, pasta: str, iniciado_em: str, estatisticas: Dict[str, Any],
+                          concluido: bool = False) -> bool:
+        """Grava (ou substitui) o checkpoint da execução da pasta"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO checkpoints_processamento
+                    (pasta, iniciado_em, atualizado_em, estatisticas, concluido)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (pasta, iniciado_em, datetime.now().isoformat(), json.dumps(estatisticas), int(concluido)))
+                return True
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao salvar checkpoint: {e}")
+            return False
+    
+    def carregar_checkpoint(self, pasta: str) -> Optional[Dict[str, Any]]:
+        """Retorna o checkpoint da pasta (com as estatisticas já decodificadas) ou None"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                linha = conn.execute("SELECT * FROM checkpoints_processamento WHERE pasta = ?", (pasta,)).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao carregar checkpoint: {e}")
+            return None
+        if linha is None:
+            return None
+        checkpoint = dict(linha)
+        checkpoint['estatisticas'] = json.loads(checkpoint['estatisticas'] or '{}')
+        checkpoint['concluido'] = bool(checkpoint['concluido'])
+        return checkpoint
+    
+    def carregar_chaves_acesso(self) -> set:
+        """Retorna o conjunto das chaves de acesso já cadastradas"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                return {chave for (chave,) in conn.execute("SELECT chave_acesso FROM notas_fiscais")}
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao carregar chaves de acesso: {e}")
+            return set()
+    
+    def hash_ja_processado(self, hash_arquivo: str) -> bool:
+        """Indica se já existe nota gravada a partir de um arquivo com este hash"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute("SELECT 1 FROM notas_fiscais WHERE hash_arquivo = ? LIMIT 1", (hash_arquivo,))
+                return cursor.fetchone() is not None
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao consultar hash: {e}")
+            return False
+    
     def inserir_empresa(self, empresa: Empresa) -> int:
         """Insere uma empresa e retorna o ID (nova ou existente)"""
         try:
@@ -368,6 +540,62 @@ class DatabaseManager:
             logging.error(f"❌ Erro ao inserir nota fiscal: {e}")
             return None
     
+    def inserir_nota_com_itens(self, nota: NotaFiscal, itens: List[ItemNotaFiscal],
+                               manifesto: Optional[Tuple[str, int, float, str]] = None) -> Optional[int]:
+        """
+        Insere a nota, os itens e (opcionalmente) a entrada do manifesto numa única transação.
+        Em caso de erro nada é gravado: não ficam notas sem itens nem itens órfãos.
+        """
+        notas_ids = self.inserir_notas_com_itens([(nota, itens)], manifesto)
+        return notas_ids[0] if notas_ids else None
+    
+    def inserir_notas_com_itens(self, notas: List[Tuple[NotaFiscal, List[ItemNotaFiscal]]],
+                                manifesto: Optional[Tuple[str, int, float, str]] = None) -> Optional[List[int]]:
+        """
+        Insere as notas de um documento (nfeProc ou lote), os itens de cada uma e (opcionalmente)
+        a entrada do manifesto numa única transação; retorna os IDs das notas.
+        Uma chave já cadastrada é substituída: os itens da nota anterior são apagados na
+        mesma transação, antes de a nota ser regravada.
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                notas_ids = []
+                for nota, itens in notas:
+                    conn.execute("""
+                        DELETE FROM itens_notas_fiscais
+                        WHERE nota_fiscal_id IN (SELECT id FROM notas_fiscais WHERE chave_acesso = ?)
+                    """, (nota.chave_acesso,))
+                    dados = asdict(nota)
+                    dados.pop('id', None)
+                    cursor = conn.execute(f"""
+                        INSERT OR REPLACE INTO notas_fiscais
+                        ({', '.join(dados)})
+                        VALUES ({', '.join(['?'] * len(dados))})
+                    """, list(dados.values()))
+                    nota_id = cursor.lastrowid
+                    notas_ids.append(nota_id)
+                    
+                    for item in itens:
+                        item.nota_fiscal_id = nota_id
+                        dados = asdict(item)
+                        dados.pop('id', None)
+                        conn.execute(f"""
+                            INSERT INTO itens_notas_fiscais
+                            ({', '.join(dados)})
+                            VALUES ({', '.join(['?'] * len(dados))})
+                        """, list(dados.values()))
+                
+                if manifesto:
+                    conn.execute("""
+                        INSERT OR REPLACE INTO manifesto_arquivos (caminho, tamanho, mtime, hash_arquivo, registrado_em)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (*manifesto, datetime.now().isoformat()))
+                return notas_ids
+                
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao inserir nota fiscal (transação desfeita): {e}")
+            return None
+    
     def inserir_item_nota_fiscal(self, item: ItemNotaFiscal) -> int:
         """Insere um item de nota fiscal"""
         try:
@@ -89,7 +89,7 @@ class ProcessamentoThread(QThread):
             
             # Resultado
             resultado = {
-                'total_processadas': len(processor.dados_processados),
+                'total_processadas': processor.estatisticas.get('nfes_inseridas', 0),
                 'com_erro': processor.estatisticas.get('arquivos_com_erro', 0),
                 'pasta_saida': self.pasta_saida,
                 'relatorios_gerados': True if ReportGenerator else False
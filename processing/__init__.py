@@ -2,5 +2,6 @@
 """Módulo de processamento de NFe"""
 
 from .processor import NFeProcessorBI
+from .monitor import MonitorPasta
 
-__all__ = ['NFeProcessorBI']
+__all__ = ['NFeProcessorBI', 'MonitorPasta']
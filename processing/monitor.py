@@ -0,0 +1,242 @@
+# processing/monitor.py - Ingestão contínua de uma pasta de entrada
+
+import argparse
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.escalonador import TETO_CPU_PADRAO, EscalonadorAdaptativo
+from core.fontes import EXTENSOES_TAR, documentos_do_arquivo
+
+# Detecção por eventos do sistema (inotify no Linux) via watchdog, se disponível
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# Arquivos que podem conter XMLs (soltos ou em contêineres — ver core.fontes)
+EXTENSOES_ENTRADA = (".xml", ".zip", ".gz") + EXTENSOES_TAR
+
+def _e_arquivo_de_entrada(caminho: str) -> bool:
+    return caminho.lower().endswith(EXTENSOES_ENTRADA)
+
+class _TratadorEventos(FileSystemEventHandler):
+    """Encaminha ao monitor os arquivos criados, alterados ou movidos para a pasta"""
+
+    def __init__(self, monitor: "MonitorPasta"):
+        super().__init__()
+        self.monitor = monitor
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.monitor.registrar(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.monitor.registrar(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.monitor.esquecer(event.src_path)
+            self.monitor.registrar(event.dest_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.monitor.esquecer(event.src_path)
+
+class MonitorPasta:
+    """
+    Serviço de ingestão contínua para o NFeProcessorBI.
+    Os arquivos novos chegam por eventos do sistema (watchdog) ou por varredura
+    periódica; cada arquivo só é processado depois de ficar estável (mesmo tamanho e
+    mtime por intervalo_estabilidade segundos), e os estáveis vão ao banco em lotes.
+    """
+
+    def __init__(self, processador, intervalo_estabilidade: float = 2.0,
+                 intervalo_varredura: float = 5.0, espera_lote: float = 1.0,
+                 tamanho_lote: int = 200, usar_eventos: Optional[bool] = None):
+        self.processador = processador
+        self.pasta = processador.pasta_xml
+        self.intervalo_estabilidade = intervalo_estabilidade
+        self.intervalo_varredura = intervalo_varredura
+        self.espera_lote = espera_lote
+        self.tamanho_lote = tamanho_lote
+
+        # None = usa eventos se o watchdog estiver instalado
+        self.usar_eventos = Observer is not None if usar_eventos is None else usar_eventos
+        if self.usar_eventos and Observer is None:
+            raise ValueError("Monitoramento por eventos indisponível (instale o pacote watchdog)")
+
+        # Candidatos aguardando estabilidade: {caminho: (tamanho, mtime, estável desde)}
+        self._candidatos: Dict[str, Tuple[int, float, float]] = {}
+        # Arquivos já enviados ao processador e ainda presentes na pasta: {caminho: (tamanho, mtime)}
+        self._enviados: Dict[str, Tuple[int, float]] = {}
+        self._trava = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.estatisticas = {
+            "lotes_processados": 0,
+            "arquivos_enviados": 0,
+            "varreduras": 0,
+        }
+
+    def registrar(self, caminho: str):
+        """Registra um arquivo novo ou alterado; ele espera ficar estável antes do processamento"""
+        if not _e_arquivo_de_entrada(caminho):
+            return
+        try:
+            stats = os.stat(caminho)
+        except OSError:
+            return
+        metadados = (stats.st_size, stats.st_mtime)
+        with self._trava:
+            if self._enviados.get(caminho) == metadados:
+                return
+            atual = self._candidatos.get(caminho)
+            if atual is None or atual[:2] != metadados:
+                self._candidatos[caminho] = (*metadados, time.monotonic())
+
+    def esquecer(self, caminho: str):
+        """Descarta um arquivo removido ou renomeado (se voltar, é tratado como novo)"""
+        with self._trava:
+            self._candidatos.pop(caminho, None)
+            self._enviados.pop(caminho, None)
+
+    def varrer(self):
+        """
+        Varredura da pasta (só metadados): registra os arquivos novos ou alterados e
+        esquece os enviados que saíram da pasta, para que _enviados não cresça sem limite.
+        """
+        self.estatisticas["varreduras"] += 1
+        presentes = set()
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                if entrada.is_file() and _e_arquivo_de_entrada(entrada.name):
+                    presentes.add(entrada.path)
+                    self.registrar(entrada.path)
+        with self._trava:
+            for caminho in self._enviados.keys() - presentes:
+                del self._enviados[caminho]
+
+    def arquivos_estaveis(self) -> List[str]:
+        """Retira dos candidatos os arquivos que não mudaram durante intervalo_estabilidade"""
+        agora = time.monotonic()
+        estaveis = []
+        with self._trava:
+            for caminho, (tamanho, mtime, desde) in list(self._candidatos.items()):
+                try:
+                    stats = os.stat(caminho)
+                except OSError:
+                    # Removido ou renomeado antes de estabilizar
+                    del self._candidatos[caminho]
+                    continue
+                if (stats.st_size, stats.st_mtime) != (tamanho, mtime):
+                    self._candidatos[caminho] = (stats.st_size, stats.st_mtime, agora)
+                elif agora - desde >= self.intervalo_estabilidade:
+                    del self._candidatos[caminho]
+                    self._enviados[caminho] = (tamanho, mtime)
+                    estaveis.append(caminho)
+        return sorted(estaveis)
+
+    def processar_lote(self, caminhos: List[str]) -> Dict[str, Any]:
+        """Envia um lote de arquivos estáveis ao processador (um único pipeline)"""
+        logging.info(f"📥 Lote com {len(caminhos)} arquivo(s) novo(s)")
+        documentos = (documento for caminho in caminhos for documento in documentos_do_arquivo(caminho))
+        estatisticas = self.processador.processar_documentos(documentos)
+        self.estatisticas["lotes_processados"] += 1
+        self.estatisticas["arquivos_enviados"] += len(caminhos)
+        return estatisticas
+
+    def executar_ciclo(self):
+        """Processa, em lotes de até tamanho_lote, os arquivos que já estão estáveis"""
+        estaveis = self.arquivos_estaveis()
+        for inicio in range(0, len(estaveis), self.tamanho_lote):
+            self.processar_lote(estaveis[inicio:inicio + self.tamanho_lote])
+
+    def executar(self):
+        """Laço principal (bloqueante) até parar() ser chamado"""
+        if not os.path.isdir(self.pasta):
+            raise FileNotFoundError(f"Pasta não encontrada: {self.pasta}")
+
+        observador = None
+        if self.usar_eventos:
+            observador = Observer()
+            observador.schedule(_TratadorEventos(self), self.pasta, recursive=False)
+            observador.start()
+            logging.info(f"👀 Monitorando {self.pasta} por eventos do sistema")
+        else:
+            logging.info(f"👀 Monitorando {self.pasta} por varredura a cada {self.intervalo_varredura:.0f}s")
+
+        # A primeira varredura pega o que já estava na pasta (o manifesto pula o já ingerido)
+        self.varrer()
+        ultima_varredura = time.monotonic()
+        try:
+            while not self._parar.wait(self.espera_lote):
+                if not self.usar_eventos and time.monotonic() - ultima_varredura >= self.intervalo_varredura:
+                    self.varrer()
+                    ultima_varredura = time.monotonic()
+                try:
+                    self.executar_ciclo()
+                except Exception as e:
+                    logging.error(f"❌ Erro no lote do monitor: {e}")
+        finally:
+            if observador is not None:
+                observador.stop()
+                observador.join()
+        logging.info("🛑 Monitor de pasta encerrado")
+
+    def iniciar(self) -> threading.Thread:
+        """Executa o monitor em uma thread de fundo"""
+        self._parar.clear()
+        self._thread = threading.Thread(target=self.executar, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def parar(self, timeout: Optional[float] = None):
+        """Sinaliza o encerramento e aguarda o lote em andamento"""
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+def main():
+    from processing.processor import NFeProcessorBI
+
+    parser = argparse.ArgumentParser(description="Ingestão contínua de XMLs de NFe de uma pasta de entrada")
+    parser.add_argument("pasta", help="pasta de entrada monitorada")
+    parser.add_argument("--saida", default="relatorios", help="pasta de saída")
+    parser.add_argument("--db", default="nfe_data.db", help="banco SQLite")
+    parser.add_argument("--processos", type=int,
+                        help="processos de trabalho (0 = um por CPU; padrão: 1, ou um por CPU com escalonamento)")
+    parser.add_argument("--meta-vazao", type=float, help="arquivos/s desejados (ativa o escalonamento adaptativo)")
+    parser.add_argument("--teto-cpu", type=float, help="fração máxima da CPU da máquina (ativa o escalonamento adaptativo)")
+    parser.add_argument("--polling", action="store_true", help="força a varredura periódica em vez de eventos")
+    parser.add_argument("--intervalo", type=float, default=5.0, help="segundos entre varreduras (polling)")
+    args = parser.parse_args()
+
+    # O escalonamento adaptativo só age entre processos de trabalho
+    escalonamento = bool(args.meta_vazao or args.teto_cpu)
+    if args.processos is None:
+        args.processos = 0 if escalonamento else 1
+    elif args.processos == 1 and escalonamento:
+        parser.error("--meta-vazao e --teto-cpu exigem mais de um processo (use --processos 0 ou maior que 1)")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    escalonador = None
+    if escalonamento:
+        escalonador = EscalonadorAdaptativo(meta_vazao=args.meta_vazao, teto_cpu=args.teto_cpu or TETO_CPU_PADRAO)
+    processador = NFeProcessorBI(args.pasta, args.saida, db_path=args.db, num_processos=args.processos or None,
+                                 escalonador=escalonador)
+    monitor = MonitorPasta(processador, intervalo_varredura=args.intervalo,
+                           usar_eventos=False if args.polling else None)
+    try:
+        monitor.executar()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
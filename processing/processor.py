@@ -1,13 +1,22 @@
 # processing/processor.py - VERSÃO INTEGRADA COM BI
 
 import os
-import xml.etree.ElementTree as ET
-import hashlib
+from concurrent.futures import Executor
+from contextlib import nullcontext
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Any, Optional, Union
 import logging
 import sqlite3
 from database.models import DatabaseManager, Empresa, NotaFiscal, ItemNotaFiscal
+from core.parser import carregar_xml, ERROS_XML
+from core.fontes import DocumentoXML, documento_de_arquivo, iterar_documentos
+from core.varredura import LIMITE_VARREDURA_CHAVE, RAIZES_NOTA_UNICA, chave_de_acesso_em, raiz_do_documento
+from core.hashing import ALGORITMO_HASH_PADRAO, criar_hasher, hash_de_arquivo, hash_de_bytes
+from core.controle import ControleProcessamento
+from core.escalonador import EscalonadorAdaptativo
+from core.paralelo import criar_executor
+from core.pipeline import CAPACIDADE_FILA_PADRAO, NOME_ORIGEM, PipelineLimitado
 
 # Importa módulos já existentes
 try:
@@ -27,290 +36,798 @@ except ImportError:
     logging.warning("Módulos de Reforma Tributária não disponíveis")
     CalculadoraReformaTributaria = None
 
+# Tags da NFe em notação Clark ({namespace}tag), calculadas uma única vez.
+# A extração compara tags diretamente, sem reescrever o namespace de cada nó.
+_NS_NFE = "{http://www.portalfiscal.inf.br/nfe}"
+TAG_INF_NFE = _NS_NFE + "infNFe"
+TAG_IDE = _NS_NFE + "ide"
+TAG_EMIT = _NS_NFE + "emit"
+TAG_DEST = _NS_NFE + "dest"
+TAG_DET = _NS_NFE + "det"
+TAG_TOTAL = _NS_NFE + "total"
+TAG_PAG = _NS_NFE + "pag"
+TAG_PGTOS = _NS_NFE + "pgtos"
+TAG_TPAG = _NS_NFE + "tPag"
+TAG_NNF = _NS_NFE + "nNF"
+TAG_SERIE = _NS_NFE + "serie"
+TAG_DHEMI = _NS_NFE + "dhEmi"
+TAG_CNPJ = _NS_NFE + "CNPJ"
+TAG_CPF = _NS_NFE + "CPF"
+TAG_XNOME = _NS_NFE + "xNome"
+TAG_XFANT = _NS_NFE + "xFant"
+TAG_ENDER_EMIT = _NS_NFE + "enderEmit"
+TAG_ENDER_DEST = _NS_NFE + "enderDest"
+TAG_UF = _NS_NFE + "UF"
+TAG_ICMS_TOT = _NS_NFE + "ICMSTot"
+TAG_VPROD = _NS_NFE + "vProd"
+TAG_VFRETE = _NS_NFE + "vFrete"
+TAG_VSEG = _NS_NFE + "vSeg"
+TAG_VDESC = _NS_NFE + "vDesc"
+TAG_VNF = _NS_NFE + "vNF"
+TAG_VICMS = _NS_NFE + "vICMS"
+TAG_VIPI = _NS_NFE + "vIPI"
+TAG_VPIS = _NS_NFE + "vPIS"
+TAG_VCOFINS = _NS_NFE + "vCOFINS"
+TAG_PROD = _NS_NFE + "prod"
+TAG_IMPOSTO = _NS_NFE + "imposto"
+TAG_CPROD = _NS_NFE + "cProd"
+TAG_XPROD = _NS_NFE + "xProd"
+TAG_NCM = _NS_NFE + "NCM"
+TAG_CEST = _NS_NFE + "CEST"
+TAG_UCOM = _NS_NFE + "uCom"
+TAG_QCOM = _NS_NFE + "qCom"
+TAG_VUNCOM = _NS_NFE + "vUnCom"
+TAG_CFOP = _NS_NFE + "CFOP"
+TAG_ICMS = _NS_NFE + "ICMS"
+TAG_CST = _NS_NFE + "CST"
+TAG_CSOSN = _NS_NFE + "CSOSN"
+TAG_PICMS = _NS_NFE + "pICMS"
+TAG_VBC = _NS_NFE + "vBC"
+TAG_VBCST = _NS_NFE + "vBCST"
+TAG_PICMSST = _NS_NFE + "pICMSST"
+TAG_VICMSST = _NS_NFE + "vICMSST"
+TAG_IPI = _NS_NFE + "IPI"
+TAG_IPI_TRIB = _NS_NFE + "IPITrib"
+TAG_IPI_NT = _NS_NFE + "IPINT"
+TAG_PIPI = _NS_NFE + "pIPI"
+TAG_PIS = _NS_NFE + "PIS"
+TAG_PPIS = _NS_NFE + "pPIS"
+TAG_COFINS = _NS_NFE + "COFINS"
+TAG_PCOFINS = _NS_NFE + "pCOFINS"
+TAG_IBSCBS = _NS_NFE + "IBSCBS"
+TAG_CCLASS_TRIB = _NS_NFE + "cClassTrib"
+TAG_G_IBSCBS = _NS_NFE + "gIBSCBS"
+TAG_G_IBS_UF = _NS_NFE + "gIBSUF"
+TAG_PIBS_UF = _NS_NFE + "pIBSUF"
+TAG_VIBS_UF = _NS_NFE + "vIBSUF"
+TAG_G_IBS_MUN = _NS_NFE + "gIBSMun"
+TAG_PIBS_MUN = _NS_NFE + "pIBSMun"
+TAG_VIBS_MUN = _NS_NFE + "vIBSMun"
+TAG_VIBS = _NS_NFE + "vIBS"
+TAG_G_CBS = _NS_NFE + "gCBS"
+TAG_PCBS = _NS_NFE + "pCBS"
+TAG_VCBS = _NS_NFE + "vCBS"
+
+def _textos_filhos(elem) -> Dict[str, str]:
+    """Mapeia tag → texto (sem espaços nas pontas) dos filhos diretos, numa única passagem."""
+    if elem is None:
+        return {}
+    return {filho.tag: (filho.text or '').strip() for filho in elem}
+
+def _valor(textos: Dict[str, str], tag: str) -> float:
+    """Converte o valor numérico de uma tag (0.0 quando ausente ou vazia)."""
+    texto = textos.get(tag)
+    return float(texto) if texto else 0.0
+
+# --- Grupos de <imposto> do item ---
+# Cada função recebe o elemento do grupo e preenche as colunas correspondentes do item.
+
+def _imposto_icms(icms, item: Dict[str, Any]) -> None:
+    """ICMS (ICMS00, ICMS10, ..., ICMSSN102...), incluindo a substituição tributária"""
+    if len(icms) == 0:
+        return
+    t = _textos_filhos(icms[0])
+    item.update({
+        'cst_icms': t.get(TAG_CST) or t.get(TAG_CSOSN, ''),
+        'base_icms': _valor(t, TAG_VBC),
+        'aliquota_icms': _valor(t, TAG_PICMS),
+        'valor_icms': _valor(t, TAG_VICMS),
+        'base_icms_st': _valor(t, TAG_VBCST),
+        'aliquota_icms_st': _valor(t, TAG_PICMSST),
+        'valor_icms_st': _valor(t, TAG_VICMSST),
+    })
+
+def _imposto_ipi(ipi, item: Dict[str, Any]) -> None:
+    """IPI tributado (IPITrib) ou não tributado (IPINT)"""
+    for grupo in ipi:
+        if grupo.tag == TAG_IPI_TRIB or grupo.tag == TAG_IPI_NT:
+            t = _textos_filhos(grupo)
+            item.update({
+                'cst_ipi': t.get(TAG_CST, ''),
+                'aliquota_ipi': _valor(t, TAG_PIPI),
+                'valor_ipi': _valor(t, TAG_VIPI),
+            })
+            return
+
+def _imposto_pis(pis, item: Dict[str, Any]) -> None:
+    """PIS (PISAliq, PISQtde, PISNT ou PISOutr)"""
+    if len(pis) == 0:
+        return
+    t = _textos_filhos(pis[0])
+    item.update({
+        'cst_pis': t.get(TAG_CST, ''),
+        'base_pis': _valor(t, TAG_VBC),
+        'aliquota_pis': _valor(t, TAG_PPIS),
+        'valor_pis': _valor(t, TAG_VPIS),
+    })
+
+def _imposto_cofins(cofins, item: Dict[str, Any]) -> None:
+    """COFINS (COFINSAliq, COFINSQtde, COFINSNT ou COFINSOutr)"""
+    if len(cofins) == 0:
+        return
+    t = _textos_filhos(cofins[0])
+    item.update({
+        'cst_cofins': t.get(TAG_CST, ''),
+        'base_cofins': _valor(t, TAG_VBC),
+        'aliquota_cofins': _valor(t, TAG_PCOFINS),
+        'valor_cofins': _valor(t, TAG_VCOFINS),
+    })
+
+def _imposto_ibscbs(ibscbs, item: Dict[str, Any]) -> None:
+    """IBS/CBS da Reforma Tributária (grupo IBSCBS da NT 2025.002)"""
+    t = _textos_filhos(ibscbs)
+    item['cst_ibscbs'] = t.get(TAG_CST, '')
+    item['cclass_trib'] = t.get(TAG_CCLASS_TRIB, '')
+    g_ibscbs = ibscbs.find(TAG_G_IBSCBS)
+    if g_ibscbs is None:
+        return
+    g = _textos_filhos(g_ibscbs)
+    subgrupos = {sub.tag: _textos_filhos(sub) for sub in g_ibscbs if len(sub)}
+    uf = subgrupos.get(TAG_G_IBS_UF, {})
+    mun = subgrupos.get(TAG_G_IBS_MUN, {})
+    cbs = subgrupos.get(TAG_G_CBS, {})
+    item.update({
+        'base_ibscbs': _valor(g, TAG_VBC),
+        'aliquota_ibs_uf': _valor(uf, TAG_PIBS_UF),
+        'valor_ibs_uf': _valor(uf, TAG_VIBS_UF),
+        'aliquota_ibs_mun': _valor(mun, TAG_PIBS_MUN),
+        'valor_ibs_mun': _valor(mun, TAG_VIBS_MUN),
+        'valor_ibs': _valor(g, TAG_VIBS),
+        'aliquota_cbs': _valor(cbs, TAG_PCBS),
+        'valor_cbs': _valor(cbs, TAG_VCBS),
+    })
+
+# Despacho por tag dos filhos de <imposto> (uma única passagem por item)
+EXTRATORES_IMPOSTO = {
+    TAG_ICMS: _imposto_icms,
+    TAG_IPI: _imposto_ipi,
+    TAG_PIS: _imposto_pis,
+    TAG_COFINS: _imposto_cofins,
+    TAG_IBSCBS: _imposto_ibscbs,
+}
+
+# Colunas de imposto que os extratores podem preencher em ItemNotaFiscal
+CAMPOS_IMPOSTO_ITEM = (
+    'cst_icms', 'base_icms', 'aliquota_icms', 'valor_icms',
+    'base_icms_st', 'aliquota_icms_st', 'valor_icms_st',
+    'cst_ipi', 'aliquota_ipi', 'valor_ipi',
+    'cst_pis', 'base_pis', 'aliquota_pis', 'valor_pis',
+    'cst_cofins', 'base_cofins', 'aliquota_cofins', 'valor_cofins',
+    'cst_ibscbs', 'cclass_trib', 'base_ibscbs',
+    'aliquota_ibs_uf', 'valor_ibs_uf', 'aliquota_ibs_mun', 'valor_ibs_mun', 'valor_ibs',
+    'aliquota_cbs', 'valor_cbs',
+)
+
+# Entradas do manifesto acumuladas antes de cada gravação em lote
+LOTE_MANIFESTO = 500
+
+# Arquivos tratados entre dois checkpoints da execução
+INTERVALO_CHECKPOINT = 1000
+
 class NFeProcessorBI:
     """Processador NFe integrado com Business Intelligence"""
     
-    def __init__(self, pasta_xml: str, pasta_saida: str, db_path: str = "nfe_data.db"):
+    def __init__(self, pasta_xml: str, pasta_saida: str, db_path: str = "nfe_data.db",
+                 num_processos: Optional[int] = 1, capacidade_fila: int = CAPACIDADE_FILA_PADRAO,
+                 callback_progresso: Optional[Callable[[Dict[str, Dict[str, Any]]], None]] = None,
+                 algoritmo_hash: str = ALGORITMO_HASH_PADRAO, intervalo_checkpoint: int = INTERVALO_CHECKPOINT,
+                 controle: Optional[ControleProcessamento] = None,
+                 escalonador: Optional[EscalonadorAdaptativo] = None):
         self.pasta_xml = pasta_xml
         self.pasta_saida = pasta_saida
         
-
+        # Hash do conteúdo para deduplicação ("md5", "blake2b" ou "xxhash" — ver core.hashing).
+        # Os hashes já gravados no banco são md5: trocar o algoritmo refaz a deduplicação por conteúdo.
+        criar_hasher(algoritmo_hash)
+        self.algoritmo_hash = algoritmo_hash
+        
+        # Processos de trabalho para parse e análises (1 = sequencial, None = um por CPU)
+        self.num_processos = num_processos
+        
+        # Pipeline: itens por fila entre etapas e callback com a situação de cada etapa
+        # (processados, fila, por_segundo), chamado periodicamente durante o processamento
+        self.capacidade_fila = capacidade_fila
+        self.callback_progresso = callback_progresso
+        
+        # Pausa/retomada/cancelamento/ritmo, verificados entre um arquivo e outro (ver core.controle)
+        self.controle = controle
+        
+        # Ajuste do número de processos ativos por meta de vazão/teto de CPU (ver core.escalonador);
+        # só tem efeito no modo multiprocesso, com num_processos como limite
+        self.escalonador = escalonador
+        self.situacao_etapas: Dict[str, Dict[str, Any]] = {}
+        
+        # Estado de deduplicação (manifesto e chaves cadastradas), carregado sob demanda
+        self._manifesto: Optional[Dict[str, Any]] = None
+        
+        # Checkpoint a cada intervalo_checkpoint arquivos gravados (só em processar_pasta)
+        self.intervalo_checkpoint = intervalo_checkpoint
+        self._checkpoint: Optional[Dict[str, Any]] = None
         
         # Inicializa banco de dados
         self.db_manager = DatabaseManager(db_path)
         
-        # Inicializa módulos de IA (se disponíveis)
-        self.analisador_riscos = AnalisadorRiscos() if AnalisadorRiscos else None
-        self.detector_fraudes = DetectorFraudes() if DetectorFraudes else None
-        self.sugestor_tributario = SugestorTributario() if SugestorTributario else None
-        
-        # Inicializa Reforma Tributária (se disponível)
-        if CalculadoraReformaTributaria:
-            config_rt = ConfigReformaTributaria.get_config_por_ano(datetime.now().year)
-            self.calculadora_rt = CalculadoraReformaTributaria(config_rt)
-        else:
-            self.calculadora_rt = None
+        self._inicializar_modulos()
         
+        # As notas ficam no banco; nada é acumulado em memória durante o processamento
         self.dados_processados = []
 
         # Estatísticas do processamento
-        self.estatisticas = {
+        self.estatisticas = self._estatisticas_iniciais()
+        
+        logging.info("✅ NFeProcessorBI inicializado")
+    
+    @classmethod
+    def criar_trabalhador(cls) -> "NFeProcessorBI":
+        """Instância sem banco de dados, usada nos processos de trabalho (parse e análises)"""
+        processador = cls.__new__(cls)
+        processador.db_manager = None
+        processador._inicializar_modulos()
+        processador.estatisticas = cls._estatisticas_iniciais()
+        return processador
+    
+    @staticmethod
+    def _estatisticas_iniciais() -> Dict[str, Any]:
+        return {
             "arquivos_processados": 0,
             "nfes_inseridas": 0,
             "empresas_cadastradas": 0,
             "erros_processamento": 0,
             "tempo_processamento": 0,
-            "analises_ia_realizadas": 0
+            "analises_ia_realizadas": 0,
+            "arquivos_inalterados": 0,
+            "notas_duplicadas": 0
         }
+    
+    def _inicializar_modulos(self):
+        """Inicializa os módulos de IA e da Reforma Tributária"""
+        # Inicializa módulos de IA (se disponíveis)
+        self.analisador_riscos = AnalisadorRiscos() if AnalisadorRiscos else None
+        self.detector_fraudes = DetectorFraudes() if DetectorFraudes else None
+        self.sugestor_tributario = SugestorTributario() if SugestorTributario else None
         
-        logging.info("✅ NFeProcessorBI inicializado")
+        # Inicializa Reforma Tributária (se disponível)
+        if CalculadoraReformaTributaria:
+            config_rt = ConfigReformaTributaria.get_config_por_ano(datetime.now().year)
+            self.calculadora_rt = CalculadoraReformaTributaria(config_rt)
+        else:
+            self.calculadora_rt = None
     
-    def processar_pasta(self) -> Dict[str, Any]:
-        """Processa todos os XMLs da pasta e salva no banco"""
+    def processar_pasta(self, retomar: bool = False) -> Dict[str, Any]:
+        """
+        Processa todos os XMLs da pasta (soltos ou em .zip/.tar.gz/.gz) e salva no banco.
+        Os documentos passam pelo pipeline leitura → parse → análise → gravação, com filas
+        limitadas entre as etapas: a memória não cresce com o tamanho da pasta.
+        Com retomar=True, uma execução interrompida continua do último checkpoint.
+        """
         
-        inicio = datetime.now()
         logging.info(f"🚀 Iniciando processamento da pasta: {self.pasta_xml}")
         
         if not os.path.exists(self.pasta_xml):
             raise FileNotFoundError(f"Pasta não encontrada: {self.pasta_xml}")
         
-        # Lista todos os arquivos XML
-        arquivos_xml = [f for f in os.listdir(self.pasta_xml) if f.endswith('.xml')]
+        self._carregar_estado_deduplicacao()
+        tempo_anterior = self._iniciar_checkpoint(retomar)
         
-        if not arquivos_xml:
-            logging.warning("❌ Nenhum arquivo XML encontrado")
-            return self.estatisticas
+        # Documentos descobertos sob demanda, inclusive os de dentro de contêineres
+        try:
+            self.processar_documentos(iterar_documentos(self.pasta_xml, recursivo=False))
+            self.estatisticas["tempo_processamento"] += tempo_anterior
+            # Uma execução cancelada fica pendente no checkpoint, pronta para ser retomada
+            self._salvar_checkpoint(concluido=not self.cancelado)
+        finally:
+            self._checkpoint = None
+        return self.estatisticas
+    
+    @property
+    def cancelado(self) -> bool:
+        """Indica se o processamento foi cancelado pelo controle"""
+        return self.controle is not None and self.controle.cancelado
+    
+    def _notificar_progresso(self, situacao: Dict[str, Dict[str, Any]]):
+        """Repassa o instantâneo do pipeline ao callback do processador e aos do controle"""
+        if self.callback_progresso:
+            self.callback_progresso(situacao)
+        if self.controle is not None:
+            self.controle.notificar(situacao)
+    
+    # === CHECKPOINTS ===
+    # As notas são confirmadas uma a uma (nota, itens e manifesto na mesma transação); o
+    # checkpoint guarda periodicamente as estatísticas da execução. Ao retomar, os arquivos
+    # confirmados até o checkpoint são pulados pelo manifesto sem serem contados de novo.
+    
+    def _iniciar_checkpoint(self, retomar: bool) -> float:
+        """Prepara o checkpoint da execução; retorna o tempo já gasto pela execução retomada"""
+        pasta = os.path.abspath(self.pasta_xml)
+        anterior = self.db_manager.carregar_checkpoint(pasta) if retomar else None
+        self._checkpoint = {'pasta': pasta, 'pendentes': 0, 'contabilizados': set()}
         
-        logging.info(f"📄 Encontrados {len(arquivos_xml)} arquivo(s) XML")
-
-        # Lista para guardar os dados processados
-        dados_temp = []  # ← ADICIONE ESTA LINHA
+        if anterior and not anterior['concluido']:
+            self.estatisticas.update(anterior['estatisticas'])
+            self._checkpoint['iniciado_em'] = anterior['iniciado_em']
+            self._checkpoint['contabilizados'] = self.db_manager.caminhos_do_manifesto_entre(
+                pasta + os.sep, anterior['iniciado_em'], anterior['atualizado_em'])
+            logging.info(f"♻️ Retomando do checkpoint de {anterior['atualizado_em']}: "
+                         f"{len(self._checkpoint['contabilizados'])} arquivo(s) já confirmados")
+            return float(anterior['estatisticas'].get('tempo_processamento', 0))
         
-        # Processa cada arquivo
-        for i, arquivo in enumerate(arquivos_xml, 1):
-            try:
-                caminho_arquivo = os.path.join(self.pasta_xml, arquivo)
-                logging.info(f"📤 Processando [{i}/{len(arquivos_xml)}]: {arquivo}")
-                
-                # Processa o arquivo individual
-                resultado = self._processar_arquivo_xml(caminho_arquivo)
-                
-                if resultado:
-                    dados_temp.append(resultado)
-                    self.estatisticas["arquivos_processados"] += 1
-                    self.estatisticas["nfes_inseridas"] += 1
-                    logging.info(f"✅ {arquivo} processado com sucesso")
-                else:
-                    self.estatisticas["erros_processamento"] += 1
-                    logging.error(f"❌ Erro ao processar {arquivo}")
-                    
-            except Exception as e:
-                self.estatisticas["erros_processamento"] += 1
-                logging.error(f"❌ Erro crítico ao processar {arquivo}: {e}")
-                continue
+        if retomar:
+            logging.info("♻️ Nenhuma execução interrompida para retomar; iniciando do zero")
+        self._checkpoint['iniciado_em'] = datetime.now().isoformat()
+        self._salvar_checkpoint()
+        return 0.0
+    
+    def _salvar_checkpoint(self, concluido: bool = False):
+        """Grava o manifesto pendente e, em seguida, as estatísticas da execução"""
+        self._gravar_manifesto()
+        self.db_manager.salvar_checkpoint(self._checkpoint['pasta'], self._checkpoint['iniciado_em'],
+                                          self.estatisticas, concluido)
+        self._checkpoint['pendentes'] = 0
+    
+    def _carregar_estado_deduplicacao(self):
+        """Carrega do banco o manifesto da pasta e as chaves já cadastradas"""
+        # Hashes das notas gravadas por este processador
+        self._hashes_da_execucao = set()
+        
+        # Manifesto dos arquivos desta pasta já ingeridos: {caminho: (tamanho, mtime)}
+        self._manifesto = self.db_manager.carregar_manifesto(os.path.abspath(self.pasta_xml) + os.sep)
+        self._manifesto_pendente = []
+        
+        # Chaves de acesso já cadastradas, para descartar notas repetidas antes do parse
+        self._chaves_cadastradas = self.db_manager.carregar_chaves_acesso()
+    
+    def processar_documentos(self, documentos: Iterable[DocumentoXML]) -> Dict[str, Any]:
+        """
+        Processa os documentos informados pelo pipeline e salva no banco.
+        O estado de deduplicação é carregado na primeira chamada e mantido entre as
+        seguintes (ex.: lotes do monitor de pasta), sem reler o banco a cada lote.
+        """
+        inicio = datetime.now()
+        if self._manifesto is None:
+            self._carregar_estado_deduplicacao()
+        
+        num_processos = self.num_processos or os.cpu_count() or 1
+        modo_processos = num_processos > 1
+        if modo_processos:
+            logging.info(f"⚙️ Modo multiprocesso: {num_processos} processo(s) de trabalho")
+        
+        # Parse, IA e Reforma Tributária vão para os processos de trabalho; a gravação fica
+        # numa única thread deste processo, a única que escreve no SQLite
+        if modo_processos and self.escalonador is not None:
+            self.escalonador.iniciar(num_processos)
+        with criar_executor("processo", num_processos, _inicializar_trabalhador) if modo_processos else nullcontext() as executor:
+            workers = num_processos if modo_processos else 1
+            pipeline = PipelineLimitado([
+                ("leitura", self._etapa_leitura, 1),
+                ("parse", partial(self._etapa_parse, executor), workers),
+                ("analise", partial(self._etapa_analise, executor), workers),
+                ("gravacao", partial(self._etapa_gravacao, modo_processos), 1),
+            ], capacidade_fila=self.capacidade_fila, controle=self.controle,
+               callback_progresso=self._notificar_progresso if self.callback_progresso or self.controle else None)
+            self.situacao_etapas = pipeline.executar(documentos)
+        self._gravar_manifesto()
+        
+        # Falhas inesperadas em qualquer etapa descartam o documento
+        self.estatisticas["erros_processamento"] += sum(etapa["erros"] for etapa in self.situacao_etapas.values())
+        if modo_processos and self.escalonador is not None:
+            self.estatisticas["escalonamento"] = self.escalonador.resumo()
+        
+        if not self.situacao_etapas[NOME_ORIGEM]["processados"]:
+            logging.warning("❌ Nenhum arquivo XML encontrado")
         
         # Finaliza processamento
         fim = datetime.now()
         self.estatisticas["tempo_processamento"] = (fim - inicio).total_seconds()
         
-        logging.info(f"🎯 Processamento concluído em {self.estatisticas['tempo_processamento']:.1f}s")
+        if self.cancelado:
+            logging.info(f"🛑 Processamento cancelado após {self.estatisticas['tempo_processamento']:.1f}s")
+        else:
+            logging.info(f"🎯 Processamento concluído em {self.estatisticas['tempo_processamento']:.1f}s")
         logging.info(f"📊 Estatísticas: {self.estatisticas}")
-
-        self.dados_processados = dados_temp
+        logging.info(f"🧵 Etapas: {self.situacao_etapas}")
         
         return self.estatisticas
+    
+    # === ETAPAS DO PIPELINE ===
+    # Cada etapa recebe e devolve a "tarefa" (dicionário) do documento.
+    
+    def _etapa_leitura(self, documento: DocumentoXML) -> Dict[str, Any]:
+        """
+        Marca os documentos já processados: pelo manifesto (mesmo tamanho e mtime, sem leitura),
+        pela chave de acesso lida do início do XML ou, por fim, pelo hash do conteúdo.
+        Chaves e hashes só passam a contar como processados depois que a nota é gravada.
+        """
+        caminho = os.path.abspath(documento.nome)
+        if self._manifesto.get(caminho) == (documento.tamanho, documento.mtime):
+            contabilizado = self._checkpoint is not None and caminho in self._checkpoint['contabilizados']
+            return {'caminho': documento.nome, 'ja_processado': True, 'inalterado': True,
+                    'contabilizado': contabilizado}
         
-    def _processar_arquivo_xml(self, caminho_arquivo: str) -> bool:
-        """Processa um arquivo XML individual"""
+        # Documentos pequenos são lidos inteiros de uma vez; nos demais, só o início
+        conteudo = documento.ler() if documento.tamanho <= LIMITE_VARREDURA_CHAVE else None
+        inicio = conteudo if conteudo is not None else documento.ler_inicio(LIMITE_VARREDURA_CHAVE)
+        chave = chave_de_acesso_em(inicio)
+        # Num lote a chave do início é só a da primeira nota: o lote segue para o parse
+        if chave in self._chaves_cadastradas and raiz_do_documento(inicio) in RAIZES_NOTA_UNICA:
+            return {'caminho': documento.nome, 'ja_processado': True, 'duplicada': True,
+                    'manifesto': (caminho, documento.tamanho, documento.mtime, None)}
+        
+        if conteudo is None:
+            conteudo = documento.ler()
+        hash_arquivo = self._hash_conteudo(documento, conteudo)
+        tarefa = {'caminho': documento.nome, 'hash': hash_arquivo, 'chave': chave,
+                  'manifesto': (caminho, documento.tamanho, documento.mtime, hash_arquivo)}
+        if hash_arquivo in self._hashes_da_execucao or self._arquivo_ja_processado(hash_arquivo):
+            tarefa['ja_processado'] = True
+        else:
+            # Uma cópia que chega enquanto a original ainda não foi gravada segue adiante
+            # e é decidida na gravação (ver _copia_ja_gravada)
+            tarefa['em_andamento'] = True
+            tarefa['conteudo'] = conteudo
+        return tarefa
+    
+    def _concluir_andamento(self, tarefa: Dict[str, Any], gravada: bool):
+        """Tira a tarefa de andamento; só uma nota gravada registra a chave e o hash"""
+        tarefa.pop('em_andamento', None)
+        if gravada:
+            self._hashes_da_execucao.add(tarefa['hash'])
+            if tarefa.get('chave'):
+                self._chaves_cadastradas.add(tarefa['chave'])
+            self._chaves_cadastradas.update(p['dados_nfe']['chave_acesso'] for p in tarefa['preparados'])
+    
+    def _copia_ja_gravada(self, tarefa: Dict[str, Any]) -> Optional[str]:
+        """Indica se outra cópia do documento foi gravada enquanto este estava em andamento"""
+        chaves = [p['dados_nfe'].get('chave_acesso') for p in tarefa.get('preparados') or ()]
+        if not chaves and tarefa.get('chave'):
+            chaves = [tarefa['chave']]
+        if chaves and all(chave in self._chaves_cadastradas for chave in chaves):
+            return 'duplicada'
+        if tarefa['hash'] in self._hashes_da_execucao:
+            return 'ja_processado'
+        return None
+    
+    def _gravar_manifesto(self):
+        """Grava no banco as entradas pendentes do manifesto (e as mantém no manifesto em memória)"""
+        if self._manifesto_pendente:
+            self.db_manager.registrar_manifesto(self._manifesto_pendente)
+            for caminho, tamanho, mtime, _ in self._manifesto_pendente:
+                self._manifesto[caminho] = (tamanho, mtime)
+            self._manifesto_pendente = []
+    
+    def _etapa_parse(self, executor: Optional[Executor], tarefa: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse do XML, com todas as notas do documento (no processo de trabalho, se houver)"""
+        conteudo = tarefa.pop('conteudo', None)
+        if conteudo is not None:
+            if executor is not None:
+                with self._vaga("parse"):
+                    tarefa['notas_nfe'] = executor.submit(_parse_em_trabalhador, conteudo).result()
+            else:
+                tarefa['notas_nfe'] = self._parse_xml_nfes(conteudo)
+        return tarefa
+    
+    def _etapa_analise(self, executor: Optional[Executor], tarefa: Dict[str, Any]) -> Dict[str, Any]:
+        """IA Fiscal, Reforma Tributária e sugestões por item (no processo de trabalho, se houver)"""
+        notas_nfe = tarefa.pop('notas_nfe', None)
+        if notas_nfe:
+            if executor is not None:
+                with self._vaga("analise"):
+                    tarefa['preparados'] = executor.submit(_analisar_em_trabalhador, notas_nfe).result()
+            else:
+                tarefa['preparados'] = [self._analisar_nfe(dados_nfe) for dados_nfe in notas_nfe]
+        return tarefa
+    
+    def _vaga(self, etapa: str):
+        """Vaga entre os processos ativos definidos pelo escalonador (sem escalonador, sem limite)"""
+        return self.escalonador.vaga(etapa) if self.escalonador is not None else nullcontext()
+    
+    def _etapa_gravacao(self, modo_processos: bool, tarefa: Dict[str, Any]) -> bool:
+        """Grava a nota e atualiza as estatísticas (única etapa que escreve no banco)"""
+        arquivo = os.path.basename(tarefa['caminho'])
+        if tarefa.get('contabilizado'):
+            # Confirmado pela execução retomada e já contado nas estatísticas do checkpoint
+            return True
+        if tarefa.get('em_andamento'):
+            # A cópia gravada antes desta decide: a repetida é pulada e vai para o manifesto
+            repetida = self._copia_ja_gravada(tarefa)
+            if repetida:
+                self._concluir_andamento(tarefa, False)
+                tarefa[repetida] = True
+        if tarefa.get('inalterado'):
+            self.estatisticas["arquivos_inalterados"] += 1
+            logging.debug(f"⏭️ Arquivo inalterado: {arquivo}")
+            resultado = True
+        elif tarefa.get('duplicada'):
+            self.estatisticas["notas_duplicadas"] += 1
+            logging.info(f"⏭️ NFe já cadastrada: {arquivo}")
+            resultado = True
+        elif tarefa.get('ja_processado'):
+            logging.info(f"⏭️ Arquivo já processado: {arquivo}")
+            resultado = True
+        else:
+            preparados = tarefa.get('preparados')
+            if preparados and modo_processos:
+                # No modo sequencial as análises já foram contadas neste processo
+                self.estatisticas["analises_ia_realizadas"] += sum(p['analises_ia'] for p in preparados)
+            # Notas do lote já cadastradas (ex.: gravadas a partir de outro arquivo) não são regravadas
+            repetidas = sum(1 for p in preparados or () if p['dados_nfe'].get('chave_acesso') in self._chaves_cadastradas)
+            if repetidas:
+                preparados = [p for p in preparados if p['dados_nfe'].get('chave_acesso') not in self._chaves_cadastradas]
+            # A entrada do manifesto é gravada na mesma transação das notas e dos itens
+            resultado = bool(preparados) and self._gravar_nfe(preparados, tarefa['hash'], tarefa['caminho'],
+                                                              tarefa.get('manifesto'))
+            self._concluir_andamento(tarefa, resultado)
+            if resultado:
+                # Só as notas efetivamente gravadas contam como inseridas
+                self.estatisticas["nfes_inseridas"] += len(preparados)
+                self.estatisticas["notas_duplicadas"] += repetidas
+                if 'manifesto' in tarefa:
+                    caminho, tamanho, mtime, _ = tarefa.pop('manifesto')
+                    self._manifesto[caminho] = (tamanho, mtime)
+        
+        if resultado:
+            self.estatisticas["arquivos_processados"] += 1
+            if 'manifesto' in tarefa:
+                self._manifesto_pendente.append(tarefa['manifesto'])
+                if len(self._manifesto_pendente) >= LOTE_MANIFESTO:
+                    self._gravar_manifesto()
+            if not tarefa.get('inalterado'):
+                logging.info(f"✅ {arquivo} processado com sucesso")
+        else:
+            self.estatisticas["erros_processamento"] += 1
+            logging.error(f"❌ Erro ao processar {arquivo}")
+        
+        if self._checkpoint is not None:
+            self._checkpoint['pendentes'] += 1
+            if self._checkpoint['pendentes'] >= self.intervalo_checkpoint:
+                self._salvar_checkpoint()
+        return resultado
+        
+    def _processar_arquivo_xml(self, caminho_arquivo: Union[str, DocumentoXML]) -> bool:
+        """Processa um arquivo XML individual (ou membro de contêiner)"""
         
         try:
-            # 1. Calcula hash do arquivo
-            hash_arquivo = self._calcular_hash_arquivo(caminho_arquivo)
+            documento = caminho_arquivo if isinstance(caminho_arquivo, DocumentoXML) else documento_de_arquivo(caminho_arquivo)
+            caminho_arquivo = documento.nome
+            conteudo = documento.ler()
+
+            # 1. Calcula hash do conteúdo (o mesmo de _calcular_hash_arquivo para arquivos soltos)
+            hash_arquivo = self._hash_conteudo(documento, conteudo)
             
             # 2. Verifica se já foi processado
             if self._arquivo_ja_processado(hash_arquivo):
                 logging.info(f"⏭️ Arquivo já processado: {os.path.basename(caminho_arquivo)}")
                 return True
             
-            # 3. Parse do XML
-            dados_nfe = self._parse_xml_nfe(caminho_arquivo)
-            if not dados_nfe:
+            # 3. Parse, IA e Reforma Tributária
+            preparados = self._preparar_nfe(conteudo)
+            if not preparados:
                 return False
             
-            # 4. Cadastra/busca empresa
+            # 4. Gravação no banco
+            return self._gravar_nfe(preparados, hash_arquivo, caminho_arquivo)
+            
+        except Exception as e:
+            logging.error(f"Erro ao processar XML: {e}")
+            return False
+    
+    def _preparar_nfe(self, conteudo: bytes) -> Optional[List[Dict[str, Any]]]:
+        """Etapas sem banco de dados: parse do XML (reaproveita os bytes já lidos) e análises de cada nota"""
+        notas_nfe = self._parse_xml_nfes(conteudo)
+        if not notas_nfe:
+            return None
+        return [self._analisar_nfe(dados_nfe) for dados_nfe in notas_nfe]
+    
+    def _analisar_nfe(self, dados_nfe: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        IA Fiscal, Reforma Tributária e sugestões por item.
+        Pode rodar em um processo de trabalho; o resultado é um registro compacto para o escritor.
+        """
+        analises_antes = self.estatisticas["analises_ia_realizadas"]
+        
+        # Análise de IA Fiscal
+        analise_ia = self._executar_analise_ia(dados_nfe)
+        
+        # Cálculos da Reforma Tributária
+        calculos_rt = self._executar_calculos_reforma(dados_nfe)
+        
+        return {
+            'dados_nfe': dados_nfe,
+            'analise_ia': analise_ia,
+            'calculos_rt': calculos_rt,
+            'sugestoes': [self._sugerir_item(item) for item in dados_nfe.get('itens', [])],
+            'analises_ia': self.estatisticas["analises_ia_realizadas"] - analises_antes,
+        }
+    
+    def _gravar_nfe(self, preparados: List[Dict[str, Any]], hash_arquivo: str, caminho_arquivo: str,
+                    manifesto: Optional[tuple] = None) -> bool:
+        """Etapa de escrita: cadastra as empresas e insere as notas do documento e os itens numa única transação"""
+        notas = []
+        for preparado in preparados:
+            dados_nfe = preparado['dados_nfe']
+            analise_ia = preparado['analise_ia']
+            
+            # Cadastra/busca empresa
             empresa_id = self._processar_empresa(dados_nfe['empresa_dados'])
             if not empresa_id:
                 logging.error("Erro ao processar empresa")
                 return False
             
-            # 5. Análise de IA Fiscal
-            analise_ia = self._executar_analise_ia(dados_nfe)
-            
-            # 6. Cálculos da Reforma Tributária
-            calculos_rt = self._executar_calculos_reforma(dados_nfe)
-            
-            # 7. Monta objeto NotaFiscal
+            # Monta objeto NotaFiscal
             nota_fiscal = self._montar_nota_fiscal(
                 dados_nfe, empresa_id, hash_arquivo, 
-                caminho_arquivo, analise_ia, calculos_rt
+                caminho_arquivo, analise_ia, preparado['calculos_rt']
             )
             
-            # 8. Insere no banco
-            nota_id = self.db_manager.inserir_nota_fiscal(nota_fiscal)
-            if not nota_id:
-                return False
-            
-            # 9. Insere itens da nota
-            for item_dados in dados_nfe.get('itens', []):
-                item = self._montar_item_nota(item_dados, nota_id, analise_ia)
-                self.db_manager.inserir_item_nota_fiscal(item)
-            
-            logging.info(f"💾 NFe salva no banco: ID={nota_id}")
-            return True
-            
-        except Exception as e:
-            logging.error(f"Erro ao processar XML: {e}")
+            # Itens da nota (o ID da nota é preenchido na transação)
+            itens = [
+                self._montar_item_nota(item_dados, 0, analise_ia, sugestoes)
+                for item_dados, sugestoes in zip(dados_nfe.get('itens', []), preparado['sugestoes'])
+            ]
+            notas.append((nota_fiscal, itens))
+        
+        # Notas, itens e manifesto: tudo ou nada
+        notas_ids = self.db_manager.inserir_notas_com_itens(notas, manifesto)
+        if not notas_ids:
             return False
-    
-    def _parse_xml_nfe(self, caminho_arquivo: str) -> Optional[Dict[str, Any]]:
-        """Faz parse do XML da NFe - VERSÃO CORRIGIDA"""
         
+        logging.info(f"💾 NFe salva no banco: ID={', '.join(map(str, notas_ids))}")
+        return True
+    
+    def _parse_xml_nfe(self, caminho_arquivo: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+        """Faz parse de um XML com uma única NFe; documentos com várias notas são rejeitados"""
+        notas = self._parse_xml_nfes(caminho_arquivo)
+        if notas and len(notas) > 1:
+            logging.error(f"Documento com {len(notas)} NFe; esperada uma única nota")
+            return None
+        return notas[0] if notas else None
+    
+    def _parse_xml_nfes(self, caminho_arquivo: Union[str, bytes]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Faz parse do XML (caminho ou bytes) e extrai todas as NFe do documento (NFe, nfeProc
+        ou lote), usando tags em notação Clark (sem reescrever namespaces).
+        Uma nota sem emissor invalida o documento inteiro.
+        """
         try:
-            tree = ET.parse(caminho_arquivo)
-            root = tree.getroot()
+            root = carregar_xml(caminho_arquivo)
             
-            # Remove namespaces para facilitar navegação
-            for elem in root.iter():
-                if '}' in elem.tag:
-                    elem.tag = elem.tag.split('}')[1]
-            
-            # Extrai dados principais
-            inf_nfe = root.find('.//infNFe')
-            if inf_nfe is None:
+            notas = []
+            for inf_nfe in root.iter(TAG_INF_NFE):
+                dados = self._extrair_nfe(inf_nfe)
+                if dados is None:
+                    return None
+                notas.append(dados)
+            if not notas:
                 logging.error("Elemento infNFe não encontrado")
                 return None
+            return notas
             
-            # Dados da NFe
-            ide = inf_nfe.find('ide')
-            emit = inf_nfe.find('emit')
-            dest = inf_nfe.find('dest')
-            total = inf_nfe.find('total')
-            
-            if not emit:
-                logging.error("Dados do emissor não encontrados")
-                return None
-            
-            # Extração melhorada dos dados do emissor
-            cnpj_emit = emit.find('CNPJ')
-            nome_emit = emit.find('xNome')
-            fantasia_emit = emit.find('xFant')
-            endereco_emit = emit.find('enderEmit')
-            
-            empresa_dados = {
-                'cnpj': cnpj_emit.text.strip() if cnpj_emit is not None else '',
-                'razao_social': nome_emit.text.strip() if nome_emit is not None else 'Nome não informado',
-                'nome_fantasia': fantasia_emit.text.strip() if fantasia_emit is not None else '',
-                'uf': endereco_emit.find('UF').text.strip() if endereco_emit and endereco_emit.find('UF') is not None else ''
-            }
-            
-            # Dados da NFe completos
-            dados = {
-                'chave_acesso': inf_nfe.get('Id', '').replace('NFe', ''),
-                'numero': ide.find('nNF').text if ide and ide.find('nNF') is not None else '',
-                'serie': ide.find('serie').text if ide and ide.find('serie') is not None else '',
-                'data_emissao': self._converter_data_nfe(ide.find('dhEmi').text if ide and ide.find('dhEmi') is not None else ''),
-                
-                # Emissor
-                'cnpj_emissor': empresa_dados['cnpj'],
-                'nome_emissor': empresa_dados['razao_social'],
-                'uf_emissor': empresa_dados['uf'],
-                
-                # Destinatário (corrigido)
-                'cnpj_destinatario': self._extrair_documento_destinatario(dest),
-                'nome_destinatario': dest.find('xNome').text if dest and dest.find('xNome') is not None else '',
-                'uf_destinatario': dest.find('enderDest/UF').text if dest and dest.find('enderDest/UF') is not None else '',
-                
-                # Valores (corrigidos)
-                'valor_produtos': float(total.find('ICMSTot/vProd').text) if total and total.find('ICMSTot/vProd') is not None else 0.0,
-                'valor_frete': float(total.find('ICMSTot/vFrete').text) if total and total.find('ICMSTot/vFrete') is not None else 0.0,
-                'valor_seguro': float(total.find('ICMSTot/vSeg').text) if total and total.find('ICMSTot/vSeg') is not None else 0.0,
-                'valor_desconto': float(total.find('ICMSTot/vDesc').text) if total and total.find('ICMSTot/vDesc') is not None else 0.0,
-                'valor_total': float(total.find('ICMSTot/vNF').text) if total and total.find('ICMSTot/vNF') is not None else 0.0,
-                'valor_icms': float(total.find('ICMSTot/vICMS').text) if total and total.find('ICMSTot/vICMS') is not None else 0.0,
-                'valor_ipi': float(total.find('ICMSTot/vIPI').text) if total and total.find('ICMSTot/vIPI') is not None else 0.0,
-                'valor_pis': float(total.find('ICMSTot/vPIS').text) if total and total.find('ICMSTot/vPIS') is not None else 0.0,
-                'valor_cofins': float(total.find('ICMSTot/vCOFINS').text) if total and total.find('ICMSTot/vCOFINS') is not None else 0.0,
-                
-                # Status e pagamento
-                'status_sefaz': 'autorizada',  # Assume autorizada se chegou até aqui
-                'forma_pagamento': self._extrair_forma_pagamento(inf_nfe) or 'Não informado',
-                
-                # Dados da empresa para cadastro
-                'empresa_dados': empresa_dados,
-                
-                # Itens
-                'itens': self._extrair_itens(inf_nfe)
-            }
-            
-            return dados
-            
-        except ET.ParseError as e:
+        except ERROS_XML as e:
             logging.error(f"Erro ao fazer parse do XML: {e}")
             return None
         except Exception as e:
             logging.error(f"Erro inesperado ao processar XML: {e}")
             return None
-
-    def _extrair_documento_destinatario(self, dest) -> str:
-        """Extrai documento do destinatário (CNPJ ou CPF)"""
-        if not dest:
-            return ''
+    
+    def _extrair_nfe(self, inf_nfe) -> Optional[Dict[str, Any]]:
+        """Extrai os dados de uma NFe a partir do seu <infNFe>"""
+        # Seções da NFe (uma única passagem pelos filhos de <infNFe>)
+        secoes = {}
+        for secao in inf_nfe:
+            if secao.tag != TAG_DET:
+                secoes.setdefault(secao.tag, secao)
         
-        cnpj = dest.find('CNPJ')
-        if cnpj is not None:
-            return cnpj.text.strip()
+        emit = secoes.get(TAG_EMIT)
+        if emit is None or len(emit) == 0:
+            logging.error("Dados do emissor não encontrados")
+            return None
+        
+        ide = _textos_filhos(secoes.get(TAG_IDE))
+        emit_textos = _textos_filhos(emit)
+        dest = secoes.get(TAG_DEST)
+        dest_textos = _textos_filhos(dest)
+        total = secoes.get(TAG_TOTAL)
+        icms_tot = _textos_filhos(total.find(TAG_ICMS_TOT) if total is not None else None)
         
-        cpf = dest.find('CPF')
-        if cpf is not None:
-            return cpf.text.strip()
+        # Extração melhorada dos dados do emissor
+        empresa_dados = {
+            'cnpj': emit_textos.get(TAG_CNPJ, ''),
+            'razao_social': emit_textos.get(TAG_XNOME, 'Nome não informado'),
+            'nome_fantasia': emit_textos.get(TAG_XFANT, ''),
+            'uf': _textos_filhos(emit.find(TAG_ENDER_EMIT)).get(TAG_UF, '')
+        }
+        
+        # Dados da NFe completos
+        dados = {
+            'chave_acesso': inf_nfe.get('Id', '').replace('NFe', ''),
+            'numero': ide.get(TAG_NNF, ''),
+            'serie': ide.get(TAG_SERIE, ''),
+            'data_emissao': self._converter_data_nfe(ide.get(TAG_DHEMI, '')),
+            
+            # Emissor
+            'cnpj_emissor': empresa_dados['cnpj'],
+            'nome_emissor': empresa_dados['razao_social'],
+            'uf_emissor': empresa_dados['uf'],
+            
+            # Destinatário (corrigido)
+            'cnpj_destinatario': dest_textos.get(TAG_CNPJ) or dest_textos.get(TAG_CPF, ''),
+            'nome_destinatario': dest_textos.get(TAG_XNOME, ''),
+            'uf_destinatario': _textos_filhos(dest.find(TAG_ENDER_DEST)).get(TAG_UF, '') if dest is not None else '',
+            
+            # Valores (corrigidos)
+            'valor_produtos': _valor(icms_tot, TAG_VPROD),
+            'valor_frete': _valor(icms_tot, TAG_VFRETE),
+            'valor_seguro': _valor(icms_tot, TAG_VSEG),
+            'valor_desconto': _valor(icms_tot, TAG_VDESC),
+            'valor_total': _valor(icms_tot, TAG_VNF),
+            'valor_icms': _valor(icms_tot, TAG_VICMS),
+            'valor_ipi': _valor(icms_tot, TAG_VIPI),
+            'valor_pis': _valor(icms_tot, TAG_VPIS),
+            'valor_cofins': _valor(icms_tot, TAG_VCOFINS),
+            
+            # Status e pagamento
+            'status_sefaz': 'autorizada',  # Assume autorizada se chegou até aqui
+            'forma_pagamento': self._extrair_forma_pagamento(inf_nfe) or 'Não informado',
+            
+            # Dados da empresa para cadastro
+            'empresa_dados': empresa_dados,
+            
+            # Itens
+            'itens': self._extrair_itens(inf_nfe)
+        }
         
-        return ''
+        return dados
     
     def _extrair_itens(self, inf_nfe) -> List[Dict[str, Any]]:
         """Extrai itens da NFe"""
         itens = []
         
-        for i, det in enumerate(inf_nfe.findall('det'), 1):
-            prod = det.find('prod')
-            imposto = det.find('imposto')
+        for i, det in enumerate((filho for filho in inf_nfe if filho.tag == TAG_DET), 1):
+            prod = det.find(TAG_PROD)
+            imposto = det.find(TAG_IMPOSTO)
             
             if prod is None:
                 continue
             
+            p = _textos_filhos(prod)
             item = {
                 'numero_item': i,
-                'codigo_produto': prod.find('cProd').text if prod.find('cProd') is not None else '',
-                'descricao': prod.find('xProd').text if prod.find('xProd') is not None else '',
-                'ncm': prod.find('NCM').text if prod.find('NCM') is not None else '',
-                'cest': prod.find('CEST').text if prod.find('CEST') is not None else '',
-                'unidade': prod.find('uCom').text if prod.find('uCom') is not None else '',
-                'quantidade': float(prod.find('qCom').text) if prod.find('qCom') is not None else 0.0,
-                'valor_unitario': float(prod.find('vUnCom').text) if prod.find('vUnCom') is not None else 0.0,
-                'valor_total': float(prod.find('vProd').text) if prod.find('vProd') is not None else 0.0,
-                'cfop': prod.find('CFOP').text if prod.find('CFOP') is not None else '',
+                'codigo_produto': p.get(TAG_CPROD, ''),
+                'descricao': p.get(TAG_XPROD, ''),
+                'ncm': p.get(TAG_NCM, ''),
+                'cest': p.get(TAG_CEST, ''),
+                'unidade': p.get(TAG_UCOM, ''),
+                'quantidade': _valor(p, TAG_QCOM),
+                'valor_unitario': _valor(p, TAG_VUNCOM),
+                'valor_total': _valor(p, TAG_VPROD),
+                'cfop': p.get(TAG_CFOP, ''),
             }
             
-            # Impostos (simplificado - ICMS)
-            if imposto:
-                icms = imposto.find('.//ICMS')
-                if icms:
-                    for icms_tipo in icms:
-                        item.update({
-                            'cst_icms': icms_tipo.find('CST').text if icms_tipo.find('CST') is not None else (icms_tipo.find('CSOSN').text if icms_tipo.find('CSOSN') is not None else ''),
-                            'aliquota_icms': float(icms_tipo.find('pICMS').text) if icms_tipo.find('pICMS') is not None else 0.0,
-                            'valor_icms': float(icms_tipo.find('vICMS').text) if icms_tipo.find('vICMS') is not None else 0.0,
-                        })
-                        break
+            # Impostos: cada grupo de <imposto> vai para o seu extrator
+            if imposto is not None:
+                for grupo in imposto:
+                    extrator = EXTRATORES_IMPOSTO.get(grupo.tag)
+                    if extrator is not None:
+                        extrator(grupo, item)
             
             itens.append(item)
         
@@ -465,10 +982,8 @@ class NFeProcessorBI:
             hash_arquivo=hash_arquivo
         )
     
-    def _montar_item_nota(self, item_dados: Dict, nota_fiscal_id: int, analise_ia: Dict) -> ItemNotaFiscal:
-        """Monta objeto ItemNotaFiscal"""
-        
-        # Sugestões da IA (se disponível)
+    def _sugerir_item(self, item_dados: Dict) -> Dict[str, Any]:
+        """Sugestões da IA para um item (se disponível)"""
         sugestoes = {}
         if self.sugestor_tributario:
             try:
@@ -481,6 +996,14 @@ class NFeProcessorBI:
                     }
             except:
                 pass
+        return sugestoes
+    
+    def _montar_item_nota(self, item_dados: Dict, nota_fiscal_id: int, analise_ia: Dict,
+                          sugestoes: Optional[Dict[str, Any]] = None) -> ItemNotaFiscal:
+        """Monta objeto ItemNotaFiscal"""
+        
+        if sugestoes is None:
+            sugestoes = self._sugerir_item(item_dados)
         
         return ItemNotaFiscal(
             nota_fiscal_id=nota_fiscal_id,
@@ -496,11 +1019,9 @@ class NFeProcessorBI:
             valor_unitario=item_dados['valor_unitario'],
             valor_total=item_dados['valor_total'],
             
-            # Impostos
+            # Impostos (grupos ausentes no XML ficam com o padrão do dataclass)
             cfop=item_dados['cfop'],
-            cst_icms=item_dados.get('cst_icms', ''),
-            aliquota_icms=item_dados.get('aliquota_icms', 0.0),
-            valor_icms=item_dados.get('valor_icms', 0.0),
+            **{campo: item_dados[campo] for campo in CAMPOS_IMPOSTO_ITEM if campo in item_dados},
             
             # Sugestões IA
             ncm_sugerido=sugestoes.get('ncm_sugerido', ''),
@@ -510,23 +1031,18 @@ class NFeProcessorBI:
     # === MÉTODOS AUXILIARES ===
     
     def _calcular_hash_arquivo(self, caminho_arquivo: str) -> str:
-        """Calcula hash MD5 do arquivo"""
-        hash_md5 = hashlib.md5()
-        with open(caminho_arquivo, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        """Calcula o hash do arquivo (leitura única ou mmap, conforme o tamanho)"""
+        return hash_de_arquivo(caminho_arquivo, self.algoritmo_hash)
+    
+    def _hash_conteudo(self, documento: DocumentoXML, conteudo: bytes) -> str:
+        """Hash dos bytes já lidos, calculado uma única vez e guardado no documento"""
+        if documento.digest is None:
+            documento.digest = hash_de_bytes(conteudo, self.algoritmo_hash)
+        return documento.digest
     
     def _arquivo_ja_processado(self, hash_arquivo: str) -> bool:
-        """Verifica se arquivo já foi processado"""
-        # Consulta simples no banco para verificar se hash existe
-        try:
-            with self.db_manager.db_manager.connect(self.db_manager.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT 1 FROM notas_fiscais WHERE hash_arquivo = ?", (hash_arquivo,))
-                return cursor.fetchone() is not None
-        except:
-            return False
+        """Verifica se arquivo já foi processado (existe nota com o mesmo hash)"""
+        return self.db_manager.hash_ja_processado(hash_arquivo)
     
     def _converter_data_nfe(self, data_str: str) -> str:
         """Converte data da NFe para formato padrão"""
@@ -546,16 +1062,16 @@ class NFeProcessorBI:
         """Extrai forma de pagamento, cobrindo <pag> e <pgtos>."""
         try:
             # Tenta tag singular
-            pag = inf_nfe.find('.//pag')
+            pag = next(inf_nfe.iter(TAG_PAG), None)
             if pag is None:
                 # Tenta tag plural (alguns layouts usam pgtos/pagto)
-                pag = inf_nfe.find('.//pgtos')
+                pag = next(inf_nfe.iter(TAG_PGTOS), None)
             if pag is None:
                 return 'Não informado'
             
             # Dentro de <pgtos> ou <pag> pode ter múltiplos <pagto> ou <detPag>
-            # Procuramos primeiro tPag em todos os descendentes
-            tPag_elem = pag.find('.//tPag') or pag.find('.//detPag/tPag')
+            # Procuramos o primeiro tPag entre os descendentes
+            tPag_elem = next(pag.iter(TAG_TPAG), None)
             if tPag_elem is None or not tPag_elem.text:
                 return 'Não informado'
             
@@ -636,3 +1152,18 @@ class NFeProcessorBI:
         """Método específico para GUI - processa e armazena estatísticas"""
         self.estatisticas = self.processar_pasta()
         return self.estatisticas
+
+# --- Processos de trabalho do modo multiprocesso ---
+# Cada processo cria o seu NFeProcessorBI sem banco de dados uma única vez (initializer).
+_processador_trabalhador: Optional[NFeProcessorBI] = None
+
+def _inicializar_trabalhador():
+    global _processador_trabalhador
+    _processador_trabalhador = NFeProcessorBI.criar_trabalhador()
+
+def _parse_em_trabalhador(conteudo: bytes) -> Optional[List[Dict[str, Any]]]:
+    return _processador_trabalhador._parse_xml_nfes(conteudo)
+
+def _analisar_em_trabalhador(notas_nfe: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Devolve o registro de _analisar_nfe de cada nota do documento"""
+    return [_processador_trabalhador._analisar_nfe(dados_nfe) for dados_nfe in notas_nfe]
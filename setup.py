@@ -5,5 +5,6 @@ setup(
     packages=find_packages(),
     install_requires=[
         # suas dependências aqui
+        "lxml",
     ]
 )
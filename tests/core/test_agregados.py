@@ -0,0 +1,61 @@
+from core.agregados import AgregadosIncrementais, EsbocoTopK, agrupar_por_nota
+
+def _nota(numero, cnpj="111", data="2025-01-10T10:00:00-03:00", status="Autorizada", itens=(("Café", 10.0),)):
+    comuns = {"chave_acesso": str(numero) * 44, "emit_cnpj": cnpj, "data_emissao": data, "status": status,
+              "valor_total_nf": sum(valor for _, valor in itens), "pagamentos": "Dinheiro=5.0; PIX=5.0"}
+    return [dict(comuns, item_descricao=descricao, item_valor_total=valor) for descricao, valor in itens]
+
+def test_agregados_por_empresa_e_mes():
+    agregados = AgregadosIncrementais()
+    agregados.adicionar_notas([
+        _nota(1, itens=(("Café", 10.0), ("Pão", 2.0))),
+        _nota(2, data="2025-02-01T08:00:00-03:00"),
+        _nota(3, cnpj="222"),
+        _nota(4, status="Cancelada"),
+    ])
+    agregados.adicionar_nota(_nota(1))  # mesma chave: só os itens somam de novo
+    agregados.adicionar_nota(_nota(4, status="Cancelada"))
+
+    resumo = agregados.resumo()
+    assert resumo["total_vendas"] == 32.0
+    assert resumo["total_itens_vendidos"] == 5
+    assert resumo["total_notas_autorizadas"] == 3
+    assert resumo["total_notas_canceladas"] == 1
+    assert resumo["formas_pagamento"] == {"Dinheiro": 15.0, "PIX": 15.0}
+    assert resumo["top_produtos"] == {"Café": 40.0, "Pão": 2.0}
+    assert resumo["top_produtos_exato"]
+    assert agregados.notas_ingeridas == 6
+    assert resumo["vendas_por_mes"] == {"2025-01": 22.0, "2025-02": 10.0}
+
+    assert agregados.resumo(empresa="222")["total_vendas"] == 10.0
+    assert agregados.resumo(empresa="111", meses=["2025-02"])["total_itens_vendidos"] == 1
+
+def test_agrupar_por_nota_separa_as_notas_do_lote():
+    linhas = _nota(1, itens=(("Café", 10.0), ("Pão", 2.0))) + _nota(2)
+    assert [len(nota) for nota in agrupar_por_nota(linhas)] == [2, 1]
+    assert agrupar_por_nota([]) == []
+
+def test_esboco_top_k_com_memoria_fixa():
+    esboco = EsbocoTopK(capacidade=3)
+    for produto, peso in [("a", 100), ("b", 50), ("c", 1), ("d", 2), ("e", 1), ("a", 10)]:
+        esboco.adicionar(produto, peso)
+    assert len(esboco.pesos) == 3
+    assert esboco.maiores(2) == [("a", 110), ("b", 50)]
+    assert not esboco.exato
+
+    outro = EsbocoTopK(capacidade=3)
+    outro.adicionar("b", 100)
+    esboco.combinar(outro)
+    assert esboco.maiores(1) == [("b", 150)]
+    assert len(esboco.pesos) == 3
+
+def test_esboco_exato_ate_a_capacidade():
+    esboco = EsbocoTopK(capacidade=2)
+    esboco.adicionar("a", 1)
+    outro = EsbocoTopK(capacidade=2)
+    outro.adicionar("b", 2)
+    esboco.combinar(outro)
+    assert esboco.exato
+    outro.adicionar("c", 3)
+    esboco.combinar(outro)
+    assert not esboco.exato
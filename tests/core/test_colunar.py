@@ -0,0 +1,22 @@
+from core.colunar import AcumuladorColunar
+
+def test_linhas_guardadas_por_coluna():
+    dados = AcumuladorColunar([{"chave": "1", "valor": 10.0}])
+    dados.extend([{"chave": "2", "valor": 5.5, "cfop": "5102"}, {"chave": "3"}])
+    assert len(dados) == 3
+    assert dados.colunas == ["chave", "valor", "cfop"]
+    assert dados.coluna("cfop") == [None, "5102", None]
+    assert dados[1] == {"chave": "2", "valor": 5.5, "cfop": "5102"}
+    assert dados[-1]["valor"] is None
+    assert [linha["chave"] for linha in dados[0:2]] == ["1", "2"]
+
+def test_por_coluna_sem_copiar_e_limpeza():
+    dados = AcumuladorColunar()
+    assert not dados
+    dados.append({"chave": "1", "valor": 10.0})
+    dados.append({"chave": "2", "valor": 2.5})
+    colunas = dados.por_coluna()
+    assert colunas == {"chave": ["1", "2"], "valor": [10.0, 2.5]}
+    assert colunas["valor"] is dados.coluna("valor")
+    dados.clear()
+    assert len(dados) == 0 and dados.colunas == []
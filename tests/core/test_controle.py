@@ -0,0 +1,56 @@
+import threading
+import time
+
+from core.controle import ControleProcessamento
+from core.pipeline import NOME_ORIGEM, PipelineLimitado
+
+def test_pausa_segura_a_origem_ate_retomar():
+    controle = ControleProcessamento()
+    controle.pausar()
+    processados = []
+    pipeline = PipelineLimitado([("coleta", processados.append, 1)], controle=controle)
+    execucao = threading.Thread(target=pipeline.executar, args=(range(10),))
+    execucao.start()
+    time.sleep(0.1)
+    assert controle.pausado
+    assert processados == []
+    controle.retomar()
+    execucao.join(timeout=5)
+    assert sorted(processados) == list(range(10))
+
+def test_cancelamento_descarta_itens_nas_filas():
+    controle = ControleProcessamento()
+    liberar = threading.Event()
+
+    def lenta(numero):
+        if numero == 0:
+            controle.cancelar()
+            liberar.set()
+        return numero
+
+    def itens():
+        yield 0
+        liberar.wait()
+        yield from range(1, 100)
+
+    situacao = PipelineLimitado([("lenta", lenta, 1)], controle=controle).executar(itens())
+    assert controle.cancelado
+    assert situacao["lenta"]["processados"] == 1
+    assert situacao[NOME_ORIGEM]["processados"] == 1
+    assert not controle.aguardar()
+
+def test_limitacao_de_ritmo():
+    controle = ControleProcessamento(segundos_entre_itens=0.02)
+    inicio = time.perf_counter()
+    PipelineLimitado([("eco", lambda n: n, 1)], controle=controle).executar(range(5))
+    assert time.perf_counter() - inicio >= 0.1
+    controle.limitar(-1)
+    assert controle.segundos_entre_itens == 0
+
+def test_callbacks_de_progresso_isolam_falhas():
+    controle = ControleProcessamento()
+    recebidos = []
+    controle.adicionar_callback(lambda situacao: 1 / 0)
+    controle.adicionar_callback(recebidos.append)
+    controle.notificar({"eco": {"processados": 1}})
+    assert recebidos == [{"eco": {"processados": 1}}]
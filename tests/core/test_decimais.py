@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+import pytest
+
+from core.decimais import decodificar_centavos, decodificar_decimal
+from core.parser import parse_nfe_nfce_xml
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("38.06", 3806), ("0.00", 0), ("170", 17000), ("1.5", 150),
+    ("2,35", 235), (" 7.10 ", 710), ("0.005", 1), ("1.004", 100),
+    ("", 0), (None, 0), ("abc", 0),
+])
+def test_decodificar_centavos(texto, esperado):
+    assert decodificar_centavos(texto) == esperado
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("78.0000000000", Decimal("78.0000000000")), ("0.4879", Decimal("0.4879")),
+    ("2,35", Decimal("2.35")), ("", Decimal(0)), (None, Decimal(0)), ("x", Decimal(0)),
+])
+def test_decodificar_decimal(texto, esperado):
+    assert decodificar_decimal(texto) == esperado
+
+def test_soma_exata_em_centavos():
+    valores = ["0.10"] * 3
+    assert sum(decodificar_centavos(v) for v in valores) == 30
+    assert sum(decodificar_decimal(v) for v in valores) == Decimal("0.30")
+
+def test_parse_nfe_modos_numericos(tmp_path):
+    file = tmp_path / "nota.xml"
+    file.write_text('''<?xml version="1.0"?>
+    <NFe xmlns="http://www.portalfiscal.inf.br/nfe">
+      <infNFe Id="NFe1"><ide><nNF>1</nNF></ide><emit><CNPJ>1</CNPJ></emit>
+      <det nItem="1"><prod><qCom>0.4879</qCom><vUnCom>78.0000000000</vUnCom><vProd>38.06</vProd></prod></det>
+      <total><ICMSTot><vNF>38.06</vNF></ICMSTot></total>
+    </infNFe></NFe>''')
+    centavos = parse_nfe_nfce_xml(str(file), set(), modo_numerico="centavos")[0]
+    assert centavos["valor_total_nf"] == 3806
+    assert centavos["item_valor_total"] == 3806
+    assert centavos["item_quantidade"] == Decimal("0.4879")
+    decimal = parse_nfe_nfce_xml(str(file), set(), streaming=True, modo_numerico="decimal")[0]
+    assert decimal["valor_total_nf"] == Decimal("38.06")
+    with pytest.raises(ValueError):
+        parse_nfe_nfce_xml(str(file), set(), modo_numerico="binario")
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from core.escalonador import EscalonadorAdaptativo
+
+def _executar_tarefas(escalonador, quantidade, duracao=0.01, threads=4):
+    simultaneas, maximo = [0], [0]
+    trava = threading.Lock()
+
+    def trabalhar():
+        for _ in range(quantidade // threads):
+            with escalonador.vaga("analise"):
+                with trava:
+                    simultaneas[0] += 1
+                    maximo[0] = max(maximo[0], simultaneas[0])
+                time.sleep(duracao)
+                with trava:
+                    simultaneas[0] -= 1
+
+    trabalhadores = [threading.Thread(target=trabalhar) for _ in range(threads)]
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+    for trabalhador in trabalhadores:
+        trabalhador.join(timeout=10)
+    return maximo[0]
+
+def test_vaga_limita_tarefas_simultaneas():
+    escalonador = EscalonadorAdaptativo(intervalo=60, medir_carga=lambda: None)
+    escalonador.iniciar(4)
+    assert escalonador.atual == 2
+    assert _executar_tarefas(escalonador, 20) <= 2
+    assert escalonador.resumo()["tempo_medio_ms"]["analise"] >= 10
+
+def test_carga_acima_do_teto_reduz_workers():
+    escalonador = EscalonadorAdaptativo(teto_cpu=0.5, intervalo=0, medir_carga=lambda: 1.0)
+    escalonador.iniciar(4)
+    _executar_tarefas(escalonador, 8)
+    assert escalonador.atual == 1
+    decisoes = escalonador.resumo()["decisoes"]
+    assert decisoes[0]["motivo"] == "carga acima do teto de CPU"
+    assert [(d["de"], d["para"]) for d in decisoes] == [(2, 1)]
+
+def test_meta_de_vazao_usa_custo_por_arquivo():
+    # 10 ms por arquivo e meta de 300 arquivos/s: são necessários 3 workers
+    escalonador = EscalonadorAdaptativo(meta_vazao=300, intervalo=0, medir_carga=lambda: None)
+    escalonador.atual = 1
+    escalonador.iniciar(8)
+    _executar_tarefas(escalonador, 16)
+    assert escalonador.atual >= 3
+    assert escalonador.decisoes[0]["motivo"] == "vazão abaixo da meta"
+
+    # Meta baixa: volta ao mínimo necessário
+    escalonador.meta_vazao = 1
+    _executar_tarefas(escalonador, 16)
+    assert escalonador.atual == 1
+
+def test_teto_de_cpu_invalido():
+    with pytest.raises(ValueError):
+        EscalonadorAdaptativo(teto_cpu=0)
@@ -0,0 +1,92 @@
+import base64
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+from pathlib import Path
+
+from core.fontes import SEPARADOR_MEMBRO, documento_de_arquivo, iterar_doczip, iterar_documentos
+from core.parser import extrair_linhas, carregar_xml
+from core.utils import CacheManager
+from core.validator import validar_e_extrair
+
+AMOSTRA = Path(__file__).parents[2] / "33250807336543000123650010001615609541051086-nfe.xml"
+
+def test_iterar_documentos_zip_tar_gz(tmp_path):
+    conteudo = AMOSTRA.read_bytes()
+    (tmp_path / "solta.xml").write_bytes(conteudo)
+    with zipfile.ZipFile(tmp_path / "lote.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("2025/a.xml", conteudo)
+        zf.writestr("leiame.txt", "ignorado")
+    with tarfile.open(tmp_path / "lote.tar.gz", "w:gz") as tar:
+        info = tarfile.TarInfo("b.xml")
+        info.size = len(conteudo)
+        tar.addfile(info, io.BytesIO(conteudo))
+    (tmp_path / "c.xml.gz").write_bytes(gzip.compress(conteudo))
+
+    documentos = list(iterar_documentos(str(tmp_path)))
+    nomes = sorted(Path(doc.nome.split(SEPARADOR_MEMBRO)[-1]).name for doc in documentos)
+    assert nomes == ["a.xml", "b.xml", "c.xml.gz", "solta.xml"]
+    assert all(doc.ler() == conteudo for doc in documentos)
+
+def test_zip_corrompido_e_ignorado(tmp_path):
+    (tmp_path / "quebrado.zip").write_bytes(b"nao e zip")
+    assert list(iterar_documentos(str(tmp_path))) == []
+
+def test_identidade_igual_a_chave_de_arquivo_solto(tmp_path):
+    cache = CacheManager(str(tmp_path / "cache"))
+    documento = documento_de_arquivo(str(AMOSTRA))
+    assert cache._get_cache_key(documento) == cache._get_cache_key(str(AMOSTRA))
+
+def test_cache_de_membro_de_zip(tmp_path):
+    with zipfile.ZipFile(tmp_path / "lote.zip", "w") as zf:
+        zf.writestr("a.xml", AMOSTRA.read_bytes())
+    documento = next(iterar_documentos(str(tmp_path)))
+    cache = CacheManager(str(tmp_path / "cache"))
+    cache.set(documento, [{"ok": 1}])
+    assert cache.get(next(iterar_documentos(str(tmp_path)))) == [{"ok": 1}]
+
+def test_iterar_doczip():
+    doc_zip = base64.b64encode(gzip.compress(AMOSTRA.read_bytes())).decode()
+    resposta = (f'<retDistDFeInt xmlns="http://www.portalfiscal.inf.br/nfe"><loteDistDFeInt>'
+                f'<docZip NSU="000000000000042" schema="procNFe_v4.00.xsd">{doc_zip}</docZip>'
+                f'</loteDistDFeInt></retDistDFeInt>').encode()
+    documentos = list(iterar_doczip(resposta, "dist"))
+    assert [doc.nome for doc in documentos] == [f"dist{SEPARADOR_MEMBRO}NSU000000000000042-procNFe.xml"]
+    valido, _, linhas = validar_e_extrair(documentos[0].nome, set(), conteudo=documentos[0].ler())
+    assert valido and len(linhas) == 8
+
+def test_resposta_de_distribuicao_na_pasta(tmp_path):
+    def doc_zip(nsu, schema, xml):
+        return f'<docZip NSU="{nsu}" schema="{schema}">{base64.b64encode(gzip.compress(xml)).decode()}</docZip>'
+    resposta = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<retDistDFeInt xmlns="http://www.portalfiscal.inf.br/nfe" versao="1.01"><loteDistDFeInt>'
+                + doc_zip("1", "resNFe_v1.01.xsd", b"<resNFe/>")
+                + doc_zip("2", "procNFe_v4.00.xsd", AMOSTRA.read_bytes())
+                + '</loteDistDFeInt></retDistDFeInt>').encode()
+    (tmp_path / "dist.xml").write_bytes(resposta)
+    (tmp_path / "quebrada.xml").write_bytes(b"<retDistDFeInt><docZip>@@</docZip></retDistDFeInt>")
+    (tmp_path / "nota.xml").write_bytes(AMOSTRA.read_bytes())
+    documentos = list(iterar_documentos(str(tmp_path)))
+    assert [os.path.basename(doc.nome) for doc in documentos] == [f"dist.xml{SEPARADOR_MEMBRO}NSU2-procNFe.xml", "nota.xml"]
+    assert documentos[0].ler() == AMOSTRA.read_bytes()
+    assert documentos[0].mtime == os.stat(tmp_path / "dist.xml").st_mtime
+
+def test_lote_com_varias_notas():
+    nfe = AMOSTRA.read_bytes().split(b"?>", 1)[-1]
+    segunda = nfe.replace(b"NFe33250807336543000123650010001615609541051086", b"NFe33250807336543000123650010001615609541051087")
+    lote = b'<lote xmlns="http://www.portalfiscal.inf.br/nfe">' + nfe + segunda + b"</lote>"
+    linhas = extrair_linhas(carregar_xml(lote), "lote.xml", set())
+    assert len(linhas) == 16
+    assert {linha["chave_acesso"][-1] for linha in linhas} == {"6", "7"}
+
+def test_ler_inicio(tmp_path):
+    conteudo = AMOSTRA.read_bytes()
+    with zipfile.ZipFile(tmp_path / "lote.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("a.xml", conteudo)
+    (tmp_path / "b.xml.gz").write_bytes(gzip.compress(conteudo))
+    (tmp_path / "c.xml").write_bytes(conteudo)
+    documentos = list(iterar_documentos(str(tmp_path)))
+    assert len(documentos) == 3
+    assert all(doc.ler_inicio(100) == conteudo[:100] for doc in documentos)
@@ -0,0 +1,42 @@
+import hashlib
+
+import pytest
+
+from core.fontes import documento_de_arquivo
+from core.hashing import criar_hasher, hash_de_arquivo, hash_de_bytes, xxhash
+from core.utils import CacheManager
+
+def test_leitura_unica_e_mmap_dao_o_mesmo_digest(tmp_path):
+    arquivo = tmp_path / "nota.xml"
+    conteudo = b"<NFe>" + b"x" * 10_000 + b"</NFe>"
+    arquivo.write_bytes(conteudo)
+    esperado = hashlib.md5(conteudo).hexdigest()
+    assert hash_de_arquivo(str(arquivo)) == esperado
+    assert hash_de_arquivo(str(arquivo), limite_mmap=1) == esperado
+    assert hash_de_bytes(conteudo) == esperado
+
+def test_arquivo_vazio_com_mmap(tmp_path):
+    arquivo = tmp_path / "vazio.xml"
+    arquivo.write_bytes(b"")
+    assert hash_de_arquivo(str(arquivo), limite_mmap=0) == hashlib.md5(b"").hexdigest()
+
+def test_blake2b():
+    assert hash_de_bytes(b"abc", "blake2b") == hashlib.blake2b(b"abc", digest_size=16).hexdigest()
+
+@pytest.mark.skipif(xxhash is not None, reason="xxhash instalado")
+def test_xxhash_indisponivel():
+    with pytest.raises(ValueError):
+        criar_hasher("xxhash")
+
+def test_algoritmo_desconhecido():
+    with pytest.raises(ValueError):
+        criar_hasher("crc32")
+
+def test_digest_do_documento_e_a_chave_do_cache(tmp_path):
+    arquivo = tmp_path / "nota.xml"
+    arquivo.write_bytes(b"<NFe/>")
+    documento = documento_de_arquivo(str(arquivo))
+    documento.digest = hash_de_bytes(documento.ler())
+    cache = CacheManager(str(tmp_path / "cache"))
+    assert cache._get_cache_key(documento) == documento.digest
+    assert cache._get_cache_key(documento, "centavos") == f"{documento.digest}-centavos"
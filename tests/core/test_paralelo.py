@@ -0,0 +1,63 @@
+import pickle
+import threading
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.fontes import iterar_documentos
+from core.paralelo import criar_executor, executar_limitado, mapear_com_contadores
+
+def _dobro(numero):
+    return numero * 2, Counter(tarefas=1, pares=int(numero % 2 == 0))
+
+def test_executor_desconhecido():
+    with pytest.raises(ValueError):
+        criar_executor("fibra")
+
+def test_submissao_limitada():
+    em_andamento = 0
+    maximo = 0
+    trava = threading.Lock()
+    consumidos = []
+
+    def itens():
+        for numero in range(50):
+            consumidos.append(numero)
+            yield numero
+
+    def tarefa(numero):
+        nonlocal em_andamento, maximo
+        with trava:
+            em_andamento += 1
+            maximo = max(maximo, em_andamento)
+        with trava:
+            em_andamento -= 1
+        return numero
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        gerador = executar_limitado(executor, tarefa, itens(), max_pendentes=3)
+        next(gerador)
+        # Só o necessário para preencher a janela foi consumido do gerador
+        assert len(consumidos) <= 4
+        resultados = [futuro.result() for _, futuro in gerador]
+    assert len(resultados) == 49
+    assert maximo <= 3
+
+@pytest.mark.parametrize("tipo", ["thread", "processo"])
+def test_contadores_somados_pelo_consumidor(tipo):
+    total = Counter()
+    resultados = []
+    for item, resultado, contadores in mapear_com_contadores(tipo, _dobro, range(20), max_workers=2):
+        assert resultado == item * 2
+        resultados.append(resultado)
+        total.update(contadores)
+    assert sorted(resultados) == list(range(0, 40, 2))
+    assert total == Counter(tarefas=20, pares=10)
+
+def test_membro_de_zip_serializavel(tmp_path):
+    with zipfile.ZipFile(tmp_path / "lote.zip", "w") as zf:
+        zf.writestr("a.xml", b"<NFe/>")
+    documento = next(iterar_documentos(str(tmp_path)))
+    assert pickle.loads(pickle.dumps(documento)).ler() == b"<NFe/>"
@@ -1,5 +1,6 @@
 import pytest
-from core.parser import parse_nfe_nfce_xml
+import core.parser as parser
+from core.parser import ERROS_XML, parse_nfe_nfce_xml, iterar_nfe_nfce_xml
 
 @pytest.fixture
 def xml_autorizada(tmp_path):
@@ -29,3 +30,105 @@ def test_parse_nfe_invalid(tmp_path):
     file = tmp_path / "inválido.xml"
     file.write_text("<xml errado")
     assert parse_nfe_nfce_xml(str(file), set()) is None
+
+def test_parse_nfe_streaming_igual_ao_dom(xml_autorizada):
+    assert parse_nfe_nfce_xml(xml_autorizada, {"123"}, streaming=True) == parse_nfe_nfce_xml(xml_autorizada, {"123"})
+
+def test_iterar_nfe_muitos_itens(tmp_path):
+    dets = "".join(
+        f'<det nItem="{i}"><prod><cProd>{i}</cProd><xProd>Item {i}</xProd>'
+        f'<qCom>1</qCom><vUnCom>1.50</vUnCom><vProd>1.50</vProd></prod></det>'
+        for i in range(1, 501)
+    )
+    file = tmp_path / "grande.xml"
+    file.write_text(f'''<?xml version="1.0"?>
+    <nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe>
+      <infNFe Id="NFe999"><ide><nNF>7</nNF></ide><emit><CNPJ>1</CNPJ></emit>{dets}
+      <total><ICMSTot><vNF>750.00</vNF></ICMSTot></total>
+    </infNFe></NFe></nfeProc>''')
+    linhas = list(iterar_nfe_nfce_xml(str(file), set()))
+    assert len(linhas) == 500
+    assert linhas[-1]["item_numero"] == "500"
+    assert all(linha["valor_total_nf"] == 750.0 for linha in linhas)
+
+def test_iterar_nfe_invalido(tmp_path):
+    file = tmp_path / "quebrado.xml"
+    file.write_text("<NFe><infNFe>")
+    with pytest.raises(ERROS_XML):
+        list(iterar_nfe_nfce_xml(str(file), set()))
+    assert parse_nfe_nfce_xml(str(file), set(), streaming=True) is None
+
+def test_iterar_nfe_truncado_apos_notas_nao_parece_completo(tmp_path, caplog):
+    nota = (
+        '<NFe xmlns="http://www.portalfiscal.inf.br/nfe"><infNFe Id="NFe1">'
+        '<ide><nNF>1</nNF></ide><emit><CNPJ>1</CNPJ></emit>'
+        '<det nItem="1"><prod><cProd>A</cProd></prod></det></infNFe></NFe>'
+    )
+    file = tmp_path / "truncado.xml"
+    file.write_text(f"<lote>{nota}<NFe><infNFe>")
+    linhas = []
+    with pytest.raises(ERROS_XML):
+        for linha in iterar_nfe_nfce_xml(str(file), set()):
+            linhas.append(linha)
+    assert len(linhas) == 1
+    assert "truncado.xml" in caplog.text
+
+def test_parse_nfe_impostos_pelo_plano(tmp_path):
+    file = tmp_path / "impostos.xml"
+    file.write_text('''<?xml version="1.0"?>
+    <NFe xmlns="http://www.portalfiscal.inf.br/nfe">
+      <infNFe Id="NFe456"><ide><mod>55</mod><nNF>2</nNF></ide>
+      <emit><CNPJ>123</CNPJ></emit><dest><CNPJ>456</CNPJ></dest>
+      <det nItem="1"><prod><cProd>A</cProd><CFOP>5102</CFOP><vProd>100.00</vProd></prod>
+        <imposto>
+          <ICMS><ICMS00><CST>00</CST><vBC>100.00</vBC><pICMS>18.00</pICMS><vICMS>18.00</vICMS></ICMS00></ICMS>
+          <IPI><cEnq>999</cEnq><IPITrib><CST>50</CST><vIPI>5.00</vIPI></IPITrib></IPI>
+          <PIS><PISAliq><CST>01</CST><vBC>100.00</vBC><pPIS>1.65</pPIS><vPIS>1.65</vPIS></PISAliq></PIS>
+          <ICMSUFDest><vBCUFDest>100.00</vBCUFDest></ICMSUFDest>
+        </imposto>
+      </det>
+      <pag><detPag><tPag>17</tPag><vPag>100.00</vPag></detPag><detPag><tPag>01</tPag><vPag>5.00</vPag></detPag></pag>
+    </infNFe>
+    </NFe>''')
+    linha = parse_nfe_nfce_xml(str(file), set())[0]
+    assert linha["dest_cnpj_cpf"] == "456"
+    assert linha["icms_cst"] == "00"
+    assert linha["icms_vicms"] == 18.0
+    assert linha["icms_vicmsst"] == 0.0
+    assert linha["ipi_vipi"] == 5.0
+    assert linha["pis_ppis"] == 1.65
+    assert "cofins_cst" not in linha
+    assert linha["pagamentos"] == "PIX=100.00; Dinheiro=5.00"
+
+@pytest.mark.skipif(not parser.LXML_OK, reason="lxml não instalado")
+@pytest.mark.parametrize("streaming", [False, True])
+def test_backends_produzem_as_mesmas_linhas(xml_autorizada, streaming):
+    anterior = parser.backend_atual()
+    try:
+        parser.definir_backend("etree")
+        linhas_etree = parse_nfe_nfce_xml(xml_autorizada, set(), streaming=streaming)
+        parser.definir_backend("lxml")
+        linhas_lxml = parse_nfe_nfce_xml(xml_autorizada, set(), streaming=streaming)
+    finally:
+        parser.definir_backend(anterior)
+    assert linhas_lxml == linhas_etree
+
+def test_definir_backend_desconhecido():
+    with pytest.raises(ValueError):
+        parser.definir_backend("sax")
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("ARROZ TIPO 1", "ARROZ TIPO 1"),
+    ("  ARROZ\n\tTIPO  1 ", "ARROZ TIPO 1"),
+    ("FEI\x00JAO\x7f", "FEIJAO"),
+    ("CAFÉ​  MOÍDO", "CAFÉ MOÍDO"),
+    (None, ""),
+])
+def test_sanitizar(texto, esperado):
+    assert parser._sanitizar(texto) == esperado
+
+def test_campos_de_codigo_nao_sao_sanitizados():
+    _, plano_item = parser._planos("float")
+    prod = plano_item.filhos[f"{{{parser._NS_NFE}}}prod"]
+    assert prod.campos[f"{{{parser._NS_NFE}}}CFOP"][1] is parser._codigo
+    assert prod.campos[f"{{{parser._NS_NFE}}}xProd"][1] is parser._sanitizar
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from core.pipeline import NOME_ORIGEM, PipelineLimitado
+
+def test_etapas_descartes_e_erros():
+    gravados = []
+
+    def dividir(numero):
+        return 100 // numero
+
+    def filtrar_pares(numero):
+        return numero if numero % 2 == 0 else None
+
+    pipeline = PipelineLimitado([
+        ("divisao", dividir, 3),
+        ("filtro", filtrar_pares, 2),
+        ("gravacao", gravados.append, 1),
+    ], capacidade_fila=2)
+    situacao = pipeline.executar(range(0, 11))
+
+    esperados = sorted(100 // n for n in range(1, 11) if (100 // n) % 2 == 0)
+    assert sorted(gravados) == esperados
+    assert situacao[NOME_ORIGEM]["processados"] == 11
+    assert situacao["divisao"]["erros"] == 1  # divisão por zero
+    assert situacao["filtro"]["descartados"] == 10 - len(esperados)
+    # list.append devolve None: a última etapa conta como descarte, sem efeito no resultado
+    assert situacao["gravacao"]["descartados"] == len(esperados)
+    assert all(etapa["fila"] == 0 for etapa in situacao.values())
+
+def test_contrapressao_limita_a_descoberta():
+    liberar = threading.Event()
+    descobertos = []
+
+    def itens():
+        for numero in range(100):
+            descobertos.append(numero)
+            yield numero
+
+    def lenta(numero):
+        liberar.wait()
+        return numero
+
+    pipeline = PipelineLimitado([("lenta", lenta, 1)], capacidade_fila=5)
+    execucao = threading.Thread(target=pipeline.executar, args=(itens(),))
+    execucao.start()
+    time.sleep(0.2)
+    # Um item em andamento, cinco na fila e, no máximo, um aguardando o put
+    assert len(descobertos) <= 7
+    assert pipeline.instantaneo()["lenta"]["fila"] == 5
+    liberar.set()
+    execucao.join(timeout=5)
+    assert len(descobertos) == 100
+
+def test_callback_de_progresso():
+    situacoes = []
+    pipeline = PipelineLimitado([("dobro", lambda n: n * 2, 1)],
+                                callback_progresso=situacoes.append, intervalo_progresso=0.01)
+    pipeline.executar(range(50))
+    assert situacoes[-1]["dobro"]["processados"] == 50
+    assert set(situacoes[-1]) == {NOME_ORIGEM, "dobro"}
+
+def test_pipeline_sem_etapas():
+    with pytest.raises(ValueError):
+        PipelineLimitado([])
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from core.colunar import AcumuladorColunar
+from core.resumos import (QuadroResumos, aliquotas_esperadas, classificar_cfops, intervalos_faltantes,
+                          lacunas_na_sequencia)
+
+def _linhas():
+    for numero, status in (("1", "Autorizada"), ("2", "Cancelada"), ("3", "Autorizada")):
+        for item in ("A", "B"):
+            yield {"chave_acesso": numero * 44, "status": status, "numero_nf": numero, "serie": "1",
+                   "data_emissao": f"2025-01-0{numero}T10:00:00-03:00", "valor_total_nf": "100.50",
+                   "item_descricao": item, "item_valor_total": None if item == "B" else 50.25}
+
+def test_quadro_tipado_com_visoes_de_notas_e_itens():
+    quadro = QuadroResumos(AcumuladorColunar(_linhas()).por_coluna())
+    assert len(quadro) == 6
+    assert str(quadro.itens["status"].dtype) == "category"
+    assert str(quadro.itens["item_valor_total"].dtype) == "float64"
+    assert quadro.itens["item_valor_total"].sum() == 150.75  # ausentes contam como 0
+    assert quadro.itens["data_emissao"].dt.day.tolist() == [1, 1, 2, 2, 3, 3]
+
+    assert len(quadro.notas) == 3
+    assert quadro.notas["numero"].tolist() == [1.0, 2.0, 3.0]
+    assert quadro.notas_autorizadas["valor_total_nf"].sum() == 201.0
+    assert len(quadro.itens_autorizados) == 4
+    assert "item_descricao" not in quadro.notas.columns
+
+def test_quadro_vazio():
+    quadro = QuadroResumos({})
+    assert len(quadro) == 0
+    assert quadro.notas_autorizadas.empty
+
+def test_intervalos_faltantes_sem_expandir_a_sequencia():
+    assert intervalos_faltantes([5, 1, 2, 2, 9, 10]) == [(3, 4), (6, 8)]
+    assert intervalos_faltantes([1, 900_000_000]) == [(2, 899_999_999)]
+    assert intervalos_faltantes([7]) == []
+
+def test_lacunas_por_emitente_e_serie():
+    notas = pd.DataFrame({
+        "emit_cnpj": pd.Categorical(["A", "A", "A", "B", "B", "A", None]),
+        "serie": pd.Categorical(["1", "1", "1", "1", "1", "2", "1"]),
+        "numero": [1.0, 4.0, 900_000_000.0, 10.0, 12.0, 3.0, 2.0],
+    })
+    assert lacunas_na_sequencia(notas, ["emit_cnpj", "serie"]) == {
+        ("A", "1"): [(2, 3), (5, 899_999_999)],
+        ("B", "1"): [(11, 11)],
+    }
+
+def test_classificar_cfops_pelo_primeiro_digito():
+    cfops = pd.Series(["5102", "1102", None, "9999", "3101", "6108"], dtype="category")
+    assert classificar_cfops(cfops).tolist() == ["Saída", "Entrada", "Indefinido", "Indefinido", "Entrada", "Saída"]
+
+def test_aliquotas_esperadas_pelo_ncm():
+    ncms = pd.Series(["22021000", "84713012", None, "22021000"])
+    regras = {"22021000": 25, "84713012": 12.5}
+    assert aliquotas_esperadas(ncms, regras, padrao=18).tolist() == [25.0, 12.5, 18.0, 25.0]
+    assert aliquotas_esperadas(ncms, {}, padrao=18).tolist() == [18.0] * 4
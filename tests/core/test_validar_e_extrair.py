@@ -0,0 +1,32 @@
+from pathlib import Path
+
+import core.validator as validator
+
+AMOSTRA = Path(__file__).parents[2] / "33250807336543000123650010001615609541051086-nfe.xml"
+
+def test_validar_e_extrair_amostra_real():
+    valido, mensagem, linhas = validator.validar_e_extrair(str(AMOSTRA), set())
+    assert valido is True
+    assert mensagem == "Válido"
+    assert len(linhas) == 8
+    assert linhas[0]["chave_acesso"] == "33250807336543000123650010001615609541051086"
+
+def test_validar_e_extrair_reaproveita_conteudo(tmp_path):
+    conteudo = AMOSTRA.read_bytes()
+    # O caminho não existe: o conteúdo já lido deve bastar
+    valido, _, linhas = validator.validar_e_extrair(str(tmp_path / "nota.xml"), set(), conteudo=conteudo)
+    assert valido is True
+    assert linhas[0]["arquivo"] == "nota.xml"
+
+def test_validar_e_extrair_documento_invalido():
+    conteudo = AMOSTRA.read_bytes().replace(b"<mod>65</mod>", b"<mod>99</mod>")
+    valido, mensagem, linhas = validator.validar_e_extrair("nota.xml", set(), conteudo=conteudo)
+    assert valido is False
+    assert "Documento inválido" in mensagem
+    assert linhas is None
+
+def test_validar_e_extrair_sintaxe():
+    valido, mensagem, linhas = validator.validar_e_extrair("nota.xml", set(), conteudo=b"<NFe><infNFe>")
+    assert valido is False
+    assert "Erro de sintaxe" in mensagem
+    assert linhas is None
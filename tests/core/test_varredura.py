@@ -0,0 +1,69 @@
+import os
+
+from core.fontes import iterar_documentos
+from core.varredura import (chave_de_acesso_em, chaves_canceladas_em, coletar_chaves_canceladas, documentos_de_evento,
+                            e_xml_de_evento, raiz_do_documento)
+
+CHAVE = "33250807336543000123650010001615609541051086"
+
+def _proc_evento(chave: str, tp_evento: str = "110111", cstat: str = "135") -> bytes:
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<procEventoNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="1.00">
+  <evento versao="1.00"><infEvento Id="ID{tp_evento}{chave}01">
+    <cOrgao>33</cOrgao><tpAmb>1</tpAmb><CNPJ>07336543000123</CNPJ>
+    <chNFe>{chave}</chNFe><dhEvento>2025-08-30T16:00:00-03:00</dhEvento>
+    <tpEvento>{tp_evento}</tpEvento><nSeqEvento>1</nSeqEvento>
+    <detEvento versao="1.00"><descEvento>Cancelamento</descEvento></detEvento>
+  </infEvento></evento>
+  <retEvento versao="1.00"><infEvento>
+    <tpAmb>1</tpAmb><cStat>{cstat}</cStat><chNFe>{chave}</chNFe><tpEvento>{tp_evento}</tpEvento>
+  </infEvento></retEvento>
+</procEventoNFe>'''.encode()
+
+def test_cancelamento_registrado():
+    assert chaves_canceladas_em(_proc_evento(CHAVE)) == {CHAVE}
+
+def test_cancelamento_por_substituicao():
+    assert chaves_canceladas_em(_proc_evento(CHAVE, tp_evento="110112")) == {CHAVE}
+
+def test_outros_eventos_e_rejeicoes_ignorados():
+    assert chaves_canceladas_em(_proc_evento(CHAVE, tp_evento="210200")) == set()
+    assert chaves_canceladas_em(_proc_evento(CHAVE, cstat="573")) == set()
+
+def test_prefixo_de_namespace():
+    conteudo = _proc_evento(CHAVE).replace(b"<", b"<nfe:").replace(b"<nfe:/", b"</nfe:").replace(b"<nfe:?", b"<?")
+    assert chaves_canceladas_em(conteudo) == {CHAVE}
+
+def test_e_xml_de_evento():
+    assert e_xml_de_evento("lote.zip!2025/110111-evt.xml")
+    assert e_xml_de_evento("procEventoNFe.xml")
+    assert not e_xml_de_evento(f"{CHAVE}-nfe.xml")
+
+def test_coletar_chaves_canceladas(tmp_path):
+    (tmp_path / "canc1-evt.xml").write_bytes(_proc_evento(CHAVE))
+    (tmp_path / "nota.xml").write_bytes(b"<NFe/>")
+    chaves, lidos = coletar_chaves_canceladas(iterar_documentos(str(tmp_path), filtro=e_xml_de_evento))
+    assert chaves == {CHAVE}
+    assert lidos == 1
+
+def test_documentos_de_evento_classificados_pelo_conteudo(tmp_path):
+    nota = f'<?xml version="1.0"?><nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe><infNFe Id="NFe{CHAVE}"/></NFe></nfeProc>'
+    (tmp_path / "nfe_cancelada_123.xml").write_text(nota)
+    (tmp_path / "retorno.xml").write_bytes(_proc_evento(CHAVE))
+    (tmp_path / "canc-evt.xml").write_bytes(_proc_evento(CHAVE).replace(b"procEventoNFe", b"envEvento"))
+    eventos = documentos_de_evento(iterar_documentos(str(tmp_path)))
+    assert [os.path.basename(doc.nome) for doc in eventos] == ["canc-evt.xml", "retorno.xml"]
+    assert coletar_chaves_canceladas(eventos) == ({CHAVE}, 2)
+
+def test_chave_de_acesso_no_inicio_do_documento():
+    inicio = (f'<?xml version="1.0"?><nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">'
+              f'<NFe><infNFe versao="4.00" Id="NFe{CHAVE}"><ide>').encode()
+    assert chave_de_acesso_em(inicio) == CHAVE
+    assert chave_de_acesso_em(inicio.replace(b"<infNFe", b"<nfe:infNFe")) == CHAVE
+    assert chave_de_acesso_em(b'<NFe><infNFe versao="4.00" Id="NFe123">') is None
+    assert chave_de_acesso_em(_proc_evento(CHAVE)) is None
+
+def test_raiz_do_documento():
+    assert raiz_do_documento(_proc_evento(CHAVE)) == "procEventoNFe"
+    assert raiz_do_documento(b'<?xml version="1.0"?><!-- <NFe> --><nfe:enviNFe xmlns:nfe="x">') == "enviNFe"
+    assert raiz_do_documento(b"   ") is None
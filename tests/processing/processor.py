@@ -2,30 +2,116 @@
 import os
 import logging
 import json
+import time
 import pandas as pd
 from collections import Counter
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Union
 
-from core.parser import parse_nfe_nfce_xml
-from core.validator import validar_com_xsd
+from core.agregados import AgregadosIncrementais, agrupar_por_nota
+from core.colunar import AcumuladorColunar
+from core.resumos import QuadroResumos, aliquotas_esperadas, classificar_cfops, lacunas_na_sequencia
+from core.fontes import DocumentoXML, documento_de_arquivo, iterar_documentos
+from core.hashing import ALGORITMO_HASH_PADRAO, criar_hasher, hash_de_bytes
+from core.paralelo import mapear_com_contadores
+from core.validator import validar_e_extrair
+from core.varredura import coletar_chaves_canceladas, documentos_de_evento
 from core.utils import error_handler, CacheManager
 
+# Contadores apurados por arquivo nos workers e somados ao final de cada execução
+CONTADORES_POR_ARQUIVO = (
+    "total_arquivos", "notas_processadas_sucesso", "arquivos_com_erro",
+    "arquivos_invalidos_xsd", "carregados_do_cache",
+)
+
+class TrabalhoNFe:
+    """
+    Processamento de um único documento, sem estado mutável compartilhado.
+    Serve tanto a threads quanto a processos de trabalho: os contadores de cada
+    arquivo voltam junto com o resultado, em vez de alterar um dicionário comum.
+    """
+    def __init__(self, chaves_canceladas: set, modo_numerico: str, cache_dir: str,
+                 algoritmo_hash: str = ALGORITMO_HASH_PADRAO):
+        self.chaves_canceladas = chaves_canceladas
+        self.modo_numerico = modo_numerico
+        self.algoritmo_hash = algoritmo_hash
+        self.variante_cache = "" if modo_numerico == "float" else modo_numerico
+        self.cache = CacheManager(cache_dir)
+
+    def processar(self, fp: Union[str, DocumentoXML]) -> Tuple[Optional[List[Dict[str, Any]]], Counter]:
+        """Valida e processa um único arquivo XML (ou membro de contêiner), utilizando o cache."""
+        contadores = Counter(total_arquivos=1)
+        nome = fp.nome if isinstance(fp, DocumentoXML) else fp
+        with error_handler(f"processamento de {os.path.basename(nome)}"):
+            documento = fp if isinstance(fp, DocumentoXML) else documento_de_arquivo(fp)
+            conteudo = documento.ler()
+            # Os bytes são lidos e o hash é calculado uma única vez; o digest é a chave do cache
+            if documento.digest is None:
+                documento.digest = hash_de_bytes(conteudo, self.algoritmo_hash)
+            dados_cacheados = self.cache.get(documento, self.variante_cache)
+            if dados_cacheados is not None:
+                contadores["carregados_do_cache"] += 1
+                # O status depende dos eventos da execução atual, não dos da gravação do cache
+                for linha in dados_cacheados:
+                    linha["status"] = "Cancelada" if linha.get("chave_acesso") in self.chaves_canceladas else "Autorizada"
+                return dados_cacheados, contadores
+
+            # Um único parse serve à validação XSD e à extração
+            is_valido, erro_xsd, dados = validar_e_extrair(documento.nome, self.chaves_canceladas, conteudo=conteudo,
+                                                           modo_numerico=self.modo_numerico)
+            if not is_valido:
+                logging.warning(f"Falha na validação XSD para {os.path.basename(nome)}: {erro_xsd}")
+                contadores["arquivos_invalidos_xsd"] += 1
+                return None, contadores
+            if dados:
+                self.cache.set(documento, dados, self.variante_cache)
+                return dados, contadores
+        contadores["arquivos_com_erro"] += 1
+        return None, contadores
+
+# --- Processos de trabalho (executor "processo") ---
+# O TrabalhoNFe é criado uma única vez por processo, no initializer do pool.
+_trabalho_do_processo: Optional[TrabalhoNFe] = None
+
+def _inicializar_trabalhador(chaves_canceladas: set, modo_numerico: str, cache_dir: str, algoritmo_hash: str):
+    global _trabalho_do_processo
+    _trabalho_do_processo = TrabalhoNFe(chaves_canceladas, modo_numerico, cache_dir, algoritmo_hash)
+
+def _processar_no_trabalhador(fp: Union[str, DocumentoXML]) -> Tuple[Optional[List[Dict[str, Any]]], Counter]:
+    return _trabalho_do_processo.processar(fp)
+
 class NFeProcessor:
     """
     Classe para processar múltiplos XMLs de NFe/NFCe em uma pasta,
     gerar relatórios e calcular resumos, utilizando um sistema de cache.
     """
-    def __init__(self, pasta_xml: str, pasta_saida: str):
+    def __init__(self, pasta_xml: str, pasta_saida: str, modo_numerico: str = "float",
+                 executor: str = "thread", max_workers: Optional[int] = None,
+                 algoritmo_hash: str = ALGORITMO_HASH_PADRAO):
         self.pasta_xml = pasta_xml
         self.pasta_saida = pasta_saida
-        self.dados_processados: List[Dict[str, Any]] = []
+        # "float" (padrão), "decimal" ou "centavos" — ver core.decimais
+        self.modo_numerico = modo_numerico
+        # "thread" ou "processo" (parse sem o limite do GIL) — ver core.paralelo
+        self.executor = executor
+        self.max_workers = max_workers
+        # Hash do conteúdo usado como chave do cache ("md5", "blake2b" ou "xxhash") — ver core.hashing
+        criar_hasher(algoritmo_hash)
+        self.algoritmo_hash = algoritmo_hash
+        # Linhas por coluna; um único DataFrame compartilhado alimenta todos os resumos
+        self.dados_processados = AcumuladorColunar()
+        # Totais por empresa e mês, atualizados a cada nota ingerida (ver atualizar_resumos)
+        self.agregados = AgregadosIncrementais(modo_numerico=modo_numerico)
         self.chaves_canceladas: set = set()
+        # Documentos classificados como evento pelo conteúdo, fora do processamento de notas
+        self._documentos_evento: set = set()
         self.resumos: Dict[str, Any] = {}
+        # Notas já refletidas em self.resumos (atualizar_resumos só age quando há notas novas)
+        self._notas_resumidas = 0
         self.estatisticas = {
             "total_arquivos": 0, "notas_processadas_sucesso": 0,
             "arquivos_com_erro": 0, "arquivos_invalidos_xsd": 0,
             "notas_canceladas": 0, "carregados_do_cache": 0,
+            "arquivos_evento": 0, "tempo_coleta_canceladas": 0.0,
         }
         self.cache = CacheManager()
         self.regras_fiscais = self._carregar_regras_fiscais()
@@ -44,56 +130,56 @@ class NFeProcessor:
         return {}
 
     def _coletar_chaves_canceladas(self) -> set:
-        """Varre XMLs de evento e retorna o conjunto de chaves de NFes canceladas."""
-        logging.info("Coleta de chaves canceladas (simulada).")
-        return set()
+        """
+        Varre XMLs de evento e retorna o conjunto de chaves de NFes canceladas.
+        Os eventos são reconhecidos pelo elemento raiz (core.varredura.documentos_de_evento) e
+        ficam registrados para serem excluídos do processamento de notas.
+        A leitura é uma varredura de bytes (sem parse), feita antes do processamento principal.
+        """
+        inicio = time.perf_counter()
+        eventos = documentos_de_evento(iterar_documentos(self.pasta_xml))
+        self._documentos_evento = {documento.nome for documento in eventos}
+        chaves, lidos = coletar_chaves_canceladas(eventos)
+        self.estatisticas["arquivos_evento"] = lidos
+        self.estatisticas["tempo_coleta_canceladas"] = time.perf_counter() - inicio
+        logging.info(f"{len(chaves)} chave(s) cancelada(s) em {lidos} arquivo(s) de evento "
+                     f"({self.estatisticas['tempo_coleta_canceladas']:.3f}s).")
+        return chaves
 
     def processar_pasta(self):
-        """Processa todos os XMLs na pasta especificada em paralelo, utilizando cache."""
+        """
+        Processa todos os XMLs na pasta especificada em paralelo, utilizando cache.
+        Arquivos .zip, .tar.gz e .gz são lidos diretamente, sem extração para o disco.
+        """
         logging.info(f"Iniciando processamento da pasta: {self.pasta_xml}")
         
         self.chaves_canceladas = self._coletar_chaves_canceladas()
         self.estatisticas["notas_canceladas"] = len(self.chaves_canceladas)
 
-        lista_arquivos_xml = [os.path.join(root, f) for root, _, files in os.walk(self.pasta_xml) for f in files if f.lower().endswith(".xml") and "evt" not in f.lower()]
-        self.estatisticas["total_arquivos"] = len(lista_arquivos_xml)
-        
-        logging.info(f"Encontrados {len(lista_arquivos_xml)} arquivos XML para processar.")
-        
-        processados = 0
-        with ThreadPoolExecutor() as executor:
-            future_to_file = {executor.submit(self._processar_arquivo_individual, fp): fp for fp in lista_arquivos_xml}
-            for future in as_completed(future_to_file):
-                resultado = future.result()
-                if resultado:
-                    self.dados_processados.extend(resultado)
-                    processados += 1
-        
-        self.estatisticas["notas_processadas_sucesso"] = processados
-        logging.info(f"Processamento concluído. {processados} notas processadas com sucesso ({self.estatisticas['carregados_do_cache']} carregadas do cache).")
-
-    def _processar_arquivo_individual(self, fp: str) -> List[Dict[str, Any]] | None:
-        """Valida e processa um único arquivo XML, utilizando o cache."""
-        dados_cacheados = self.cache.get(fp)
-        if dados_cacheados is not None:
-            self.estatisticas["carregados_do_cache"] += 1
-            return dados_cacheados
+        # Os documentos são descobertos sob demanda; a submissão ao executor é limitada
+        documentos = (documento for documento in iterar_documentos(self.pasta_xml)
+                      if documento.nome not in self._documentos_evento)
+        argumentos_trabalho = (self.chaves_canceladas, self.modo_numerico, str(self.cache.cache_dir), self.algoritmo_hash)
+        if self.executor == "processo":
+            funcao, initializer, initargs = _processar_no_trabalhador, _inicializar_trabalhador, argumentos_trabalho
+        else:
+            funcao, initializer, initargs = TrabalhoNFe(*argumentos_trabalho).processar, None, ()
 
-        is_valido, erro_xsd = validar_com_xsd(fp)
-        if not is_valido:
-            logging.warning(f"Falha na validação XSD para {os.path.basename(fp)}: {erro_xsd}")
-            self.estatisticas["arquivos_invalidos_xsd"] += 1
-            return None
+        contadores = Counter()
+        for _, resultado, contadores_arquivo in mapear_com_contadores(self.executor, funcao, documentos,
+                                                                      self.max_workers, initializer, initargs):
+            contadores.update(contadores_arquivo)
+            if resultado:
+                self.dados_processados.extend(resultado)
+                # Um lote (enviNFe/nfeProc) pode trazer várias notas no mesmo documento
+                self.agregados.adicionar_notas(agrupar_por_nota(resultado))
+                contadores["notas_processadas_sucesso"] += 1
 
-        with error_handler(f"processamento de {os.path.basename(fp)}"):
-            dados = parse_nfe_nfce_xml(fp, self.chaves_canceladas)
-            if dados:
-                self.cache.set(fp, dados)
-                return dados
-            else:
-                self.estatisticas["arquivos_com_erro"] += 1
-                return None
-        return None
+        for chave in CONTADORES_POR_ARQUIVO:
+            self.estatisticas[chave] = contadores[chave]
+        logging.info(f"Processamento concluído. {self.estatisticas['total_arquivos']} arquivos XML, "
+                     f"{self.estatisticas['notas_processadas_sucesso']} notas processadas com sucesso "
+                     f"({self.estatisticas['carregados_do_cache']} carregadas do cache).")
 
     def calcular_resumos(self):
         """Calcula todos os resumos e análises após o processamento dos dados."""
@@ -103,115 +189,111 @@ class NFeProcessor:
 
         logging.info("Calculando resumos e análises...")
         self._calcular_resumos_pandas()
+        self._notas_resumidas = self.agregados.notas_ingeridas
+
+    def atualizar_resumos(self) -> bool:
+        """
+        Atualiza totais, formas de pagamento, top produtos e vendas por mês a partir dos
+        agregados incrementais, sem reprocessar o histórico. Os livros fiscais, a apuração,
+        a auditoria e a sequência de notas continuam sendo calculados por calcular_resumos.
+        Sem notas novas desde o último resumo, nada muda (retorna False). O top de produtos
+        só substitui o exato quando o esboço também é exato; senão fica em top_produtos_estimado.
+        """
+        if self.agregados.notas_ingeridas == self._notas_resumidas:
+            return False
+        incremental = self.agregados.resumo()
+        top_produtos = incremental.pop("top_produtos")
+        if incremental.pop("top_produtos_exato"):
+            incremental["top_produtos"] = top_produtos
+            self.resumos.pop("top_produtos_estimado", None)
+        else:
+            incremental["top_produtos_estimado"] = top_produtos
+        self.resumos.update(incremental)
+        self._notas_resumidas = self.agregados.notas_ingeridas
+        return True
 
     def _calcular_resumos_pandas(self):
         """Calcula resumos usando a biblioteca pandas para alta performance."""
-        df = pd.DataFrame(self.dados_processados)
-        df_autorizadas = df[df['status'] == 'Autorizada'].copy()
+        # Um único quadro tipado (ver core.resumos) alimenta todos os resumos
+        quadro = QuadroResumos(self.dados_processados.por_coluna(), self.modo_numerico)
+        notas_autorizadas, itens_autorizados = quadro.notas_autorizadas, quadro.itens_autorizados
 
-        df_autorizadas['valor_total_nf'] = pd.to_numeric(df_autorizadas['valor_total_nf'], errors='coerce').fillna(0)
-        df_autorizadas['item_valor_total'] = pd.to_numeric(df_autorizadas['item_valor_total'], errors='coerce').fillna(0)
-
-        self.resumos['total_vendas'] = df_autorizadas.drop_duplicates(subset=['chave_acesso'])['valor_total_nf'].sum()
-        self.resumos['total_itens_vendidos'] = len(df_autorizadas)
+        self.resumos['total_vendas'] = notas_autorizadas['valor_total_nf'].sum()
+        self.resumos['total_itens_vendidos'] = len(itens_autorizados)
         
-        pagamentos_soma = {}
-        pagamentos_flat = df_autorizadas.drop_duplicates(subset=['chave_acesso'])['pagamentos'].str.split('; ').explode()
-        for pag in pagamentos_flat.dropna():
-            if '=' in pag:
-                tipo, valor_str = pag.split('=', 1)
-                try:
-                    valor = float(valor_str)
-                    pagamentos_soma[tipo] = pagamentos_soma.get(tipo, 0.0) + valor
-                except (ValueError, TypeError):
-                    continue
-        self.resumos['formas_pagamento'] = pagamentos_soma
+        # "Tipo=valor; Tipo=valor" de cada nota, somado por tipo de pagamento
+        pagamentos = notas_autorizadas['pagamentos'].astype(object).str.split('; ').explode().dropna()
+        partes = pagamentos[pagamentos.str.contains('=', regex=False)].str.split('=', n=1, expand=True)
+        if partes.empty:
+            self.resumos['formas_pagamento'] = {}
+        else:
+            valores = pd.to_numeric(partes[1], errors='coerce')
+            self.resumos['formas_pagamento'] = valores.groupby(partes[0]).sum(min_count=1).dropna().to_dict()
 
-        self.resumos['top_produtos'] = df_autorizadas.groupby('item_descricao')['item_valor_total'].sum().nlargest(10).to_dict()
-        self.resumos['notas_faltantes'] = self._verificar_sequencia_notas(df_autorizadas)
+        self.resumos['top_produtos'] = itens_autorizados.groupby('item_descricao', observed=True)['item_valor_total'].sum().nlargest(10).to_dict()
+        self.resumos['notas_faltantes'] = self._verificar_sequencia_notas(notas_autorizadas)
         
-        self._gerar_analises_avancadas_pandas()
-        self._calcular_apuracao_impostos_pandas()
-        self._gerar_livros_fiscais_pandas()
-        self._auditar_aliquotas_pandas() # <-- Nova chamada
+        self._gerar_analises_avancadas_pandas(quadro)
+        self._calcular_apuracao_impostos_pandas(quadro)
+        self._gerar_livros_fiscais_pandas(quadro)
+        self._auditar_aliquotas_pandas(quadro) # <-- Nova chamada
 
-    def _verificar_sequencia_notas(self, df: pd.DataFrame) -> Dict[str, List[int]]:
-        """Verifica se há notas faltando na sequência numérica por emitente e série."""
-        faltantes = {}
-        df_notas_unicas = df.drop_duplicates(subset=['chave_acesso'])
-        if 'numero_nf' not in df_notas_unicas.columns: return {}
+    def _verificar_sequencia_notas(self, notas: pd.DataFrame) -> Dict[str, List[Tuple[int, int]]]:
+        """Intervalos (início, fim) de notas faltando na sequência numérica por emitente e série."""
+        if 'numero' not in notas.columns: return {}
         
-        for (emit_cnpj, serie), grupo in df_notas_unicas.groupby(['emit_cnpj', 'serie']):
-            numeros = sorted(pd.to_numeric(grupo['numero_nf'], errors='coerce').dropna().unique())
-            if not numeros: continue
-            
-            primeiro, ultimo = int(numeros[0]), int(numeros[-1])
-            sequencia_completa = set(range(primeiro, ultimo + 1))
-            notas_faltantes = sorted(list(sequencia_completa - set(numeros)))
-            if notas_faltantes:
-                faltantes[f"Emitente {emit_cnpj} - Série {serie}"] = notas_faltantes
-        return faltantes
+        lacunas = lacunas_na_sequencia(notas, ['emit_cnpj', 'serie'], 'numero')
+        return {f"Emitente {emit_cnpj} - Série {serie}": intervalos
+                for (emit_cnpj, serie), intervalos in lacunas.items()}
 
-    def _gerar_analises_avancadas_pandas(self):
-        """Gera análises como sazonalidade e top CFOPs."""
-        df_autorizadas = pd.DataFrame([d for d in self.dados_processados if d.get('status') == 'Autorizada'])
-        if df_autorizadas.empty:
+    def _gerar_analises_avancadas_pandas(self, quadro: QuadroResumos):
+        """
+        Gera análises como sazonalidade e top CFOPs.
+        vendas_por_mes soma o valor_total_nf de cada nota autorizada uma única vez (antes
+        era somado em cada linha de item, multiplicando o total pela quantidade de itens)
+        e traz só os meses com vendas: meses sem notas não aparecem mais com 0, como em
+        AgregadosIncrementais.resumo.
+        """
+        if quadro.itens_autorizados.empty:
             self.resumos.update({'vendas_por_mes': {}, 'top_cfops': {}})
             return
             
-        df_autorizadas['data_emissao'] = pd.to_datetime(df_autorizadas['data_emissao'], errors='coerce')
-        df_autorizadas.dropna(subset=['data_emissao'], inplace=True)
-        
-        df_autorizadas['valor_total_nf'] = pd.to_numeric(df_autorizadas['valor_total_nf'], errors='coerce').fillna(0)
-
-        vendas_por_mes = df_autorizadas.groupby(pd.Grouper(key='data_emissao', freq='M'))['valor_total_nf'].sum()
+        # Sazonalidade pelo valor de cada nota (visão de notas: uma linha por chave de acesso)
+        notas = quadro.notas_autorizadas.dropna(subset=['data_emissao'])
+        vendas_por_mes = notas.groupby(notas['data_emissao'].dt.to_period('M'))['valor_total_nf'].sum()
         self.resumos['vendas_por_mes'] = {f"{idx.year}-{idx.month:02d}": val for idx, val in vendas_por_mes.items()}
         
-        if 'item_cfop' in df_autorizadas.columns:
-            self.resumos['top_cfops'] = df_autorizadas['item_cfop'].value_counts().nlargest(10).to_dict()
+        if 'item_cfop' in quadro.itens_autorizados.columns:
+            contagem = quadro.itens_autorizados['item_cfop'].value_counts()
+            self.resumos['top_cfops'] = contagem[contagem > 0].nlargest(10).to_dict()
         else:
             self.resumos['top_cfops'] = {}
 
-    def _calcular_apuracao_impostos_pandas(self):
+    def _calcular_apuracao_impostos_pandas(self, quadro: QuadroResumos):
         """Agrupa os totais de impostos por CFOP para apuração fiscal."""
-        df = pd.DataFrame(self.dados_processados)
         colunas_impostos = ['icms_vicms', 'icms_vicmsst', 'ipi_vipi', 'pis_vpis', 'cofins_vcofins']
         
-        for col in colunas_impostos:
-            if col not in df.columns:
-                df[col] = 0
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        df[colunas_impostos] = df[colunas_impostos].fillna(0)
-        
-        if 'item_cfop' in df.columns:
-            self.resumos['apuracao_impostos'] = df.groupby('item_cfop')[colunas_impostos].sum().to_dict('index')
+        if 'item_cfop' in quadro.itens.columns:
+            impostos = quadro.itens.reindex(columns=colunas_impostos, fill_value=0.0)
+            self.resumos['apuracao_impostos'] = impostos.groupby(quadro.itens['item_cfop'], observed=True).sum().to_dict('index')
         else:
             self.resumos['apuracao_impostos'] = {}
 
-    def _gerar_livros_fiscais_pandas(self):
+    def _gerar_livros_fiscais_pandas(self, quadro: QuadroResumos):
         """Cria resumos de Entradas e Saídas baseados nos CFOPs (Pré-Livros Fiscais)."""
-        df = pd.DataFrame(self.dados_processados)
+        df = quadro.itens
         if 'item_cfop' not in df.columns or df.empty:
             self.resumos['livro_entradas'] = {}
             self.resumos['livro_saidas'] = {}
             return
 
-        df['item_cfop'] = df['item_cfop'].astype(str)
-        
-        def classificar_cfop(cfop):
-            if cfop.startswith(('1', '2', '3')): return 'Entrada'
-            if cfop.startswith(('5', '6', '7')): return 'Saída'
-            return 'Indefinido'
-            
-        df['tipo_operacao'] = df['item_cfop'].apply(classificar_cfop)
+        # Classificação vetorizada pelo primeiro dígito do CFOP
+        tipo_operacao = classificar_cfops(df['item_cfop'])
 
         colunas_fiscais = ['item_valor_total', 'icms_vbc', 'icms_vicms', 'icms_vicmsst', 'ipi_vipi', 'pis_vpis', 'cofins_vcofins']
-        for col in colunas_fiscais:
-            if col not in df.columns: df[col] = 0
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+        valores = df.reindex(columns=colunas_fiscais, fill_value=0.0)
             
-        resumo_fiscal = df.groupby(['tipo_operacao', 'item_cfop'])[colunas_fiscais].sum()
+        resumo_fiscal = valores.groupby([tipo_operacao, df['item_cfop']], observed=True).sum()
         
         if 'Entrada' in resumo_fiscal.index:
             self.resumos['livro_entradas'] = resumo_fiscal.loc['Entrada'].to_dict('index')
@@ -223,13 +305,13 @@ class NFeProcessor:
         else:
             self.resumos['livro_saidas'] = {}
 
-    def _auditar_aliquotas_pandas(self):
+    def _auditar_aliquotas_pandas(self, quadro: QuadroResumos):
         """Compara as alíquotas de ICMS dos itens com as regras definidas."""
         if not self.regras_fiscais or 'aliquotas_icms_por_ncm' not in self.regras_fiscais:
             self.resumos['auditoria_aliquotas'] = []
             return
             
-        df = pd.DataFrame([d for d in self.dados_processados if d.get('status') == 'Autorizada'])
+        df = quadro.itens_autorizados
         if df.empty or 'item_ncm' not in df.columns or 'icms_picms' not in df.columns:
             self.resumos['auditoria_aliquotas'] = []
             return
@@ -237,20 +319,23 @@ class NFeProcessor:
         regras_ncm = self.regras_fiscais['aliquotas_icms_por_ncm']
         padrao = self.regras_fiscais.get('aliquota_icms_padrao', 0.0)
 
-        df['icms_picms'] = pd.to_numeric(df['icms_picms'], errors='coerce').fillna(0)
-        df['aliquota_esperada'] = df['item_ncm'].apply(lambda ncm: regras_ncm.get(str(ncm), padrao))
+        # Regras alinhadas às categorias de NCM, sem consulta linha a linha
+        aliquota_esperada = aliquotas_esperadas(df['item_ncm'], regras_ncm, padrao)
         
         # Compara alíquotas, considerando uma pequena tolerância para arredondamento
-        divergencias = df[abs(df['icms_picms'] - df['aliquota_esperada']) > 0.01].copy()
+        divergentes = (df['icms_picms'] - aliquota_esperada).abs() > 0.01
         
-        if not divergencias.empty:
-            colunas_relatorio = ['numero_nf', 'item_descricao', 'item_ncm', 'icms_picms', 'aliquota_esperada']
-            self.resumos['auditoria_aliquotas'] = divergencias[colunas_relatorio].to_dict('records')
+        if divergentes.any():
+            colunas_relatorio = ['numero_nf', 'item_descricao', 'item_ncm', 'icms_picms']
+            divergencias = df.loc[divergentes, colunas_relatorio].assign(aliquota_esperada=aliquota_esperada[divergentes])
+            self.resumos['auditoria_aliquotas'] = divergencias.astype({'numero_nf': object, 'item_descricao': object,
+                                                                       'item_ncm': object}).to_dict('records')
         else:
             self.resumos['auditoria_aliquotas'] = []
 
     def gerar_relatorios(self):
         """Chama o módulo gerador para criar todos os ficheiros de relatório."""
         from reports.generator import gerar_todos_relatorios
-        gerar_todos_relatorios(self.pasta_saida, self.dados_processados, self.resumos, self.estatisticas)
+        # Os relatórios detalhados (CSV/JSON/PDF/Excel) trabalham linha a linha
+        gerar_todos_relatorios(self.pasta_saida, list(self.dados_processados), self.resumos, self.estatisticas)
 
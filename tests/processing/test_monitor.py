@@ -0,0 +1,95 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import processing.processor
+from processing.monitor import MonitorPasta, main
+from processing.processor import NFeProcessorBI
+
+AMOSTRA = Path(__file__).parents[2] / "33250807336543000123650010001615609541051086-nfe.xml"
+
+def _monitor(tmp_path, **opcoes):
+    pasta = tmp_path / "entrada"
+    pasta.mkdir()
+    processador = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=str(tmp_path / "nfe.db"))
+    return pasta, MonitorPasta(processador, usar_eventos=False, **opcoes)
+
+def test_arquivo_so_e_processado_depois_de_estavel(tmp_path):
+    pasta, monitor = _monitor(tmp_path, intervalo_estabilidade=0.2)
+    parcial = pasta / "nota.xml"
+    parcial.write_bytes(AMOSTRA.read_bytes()[:100])
+    (pasta / "leiame.txt").write_text("ignorado")
+    monitor.varrer()
+    assert monitor.arquivos_estaveis() == []
+
+    # A escrita termina: o novo tamanho reinicia a espera
+    parcial.write_bytes(AMOSTRA.read_bytes())
+    assert monitor.arquivos_estaveis() == []
+    time.sleep(0.25)
+    assert monitor.arquivos_estaveis() == [str(parcial)]
+
+    # Sem alteração, o arquivo não volta a ser candidato
+    monitor.varrer()
+    assert monitor.arquivos_estaveis() == []
+
+def test_varredura_esquece_arquivos_enviados_que_sairam_da_pasta(tmp_path):
+    pasta, monitor = _monitor(tmp_path, intervalo_estabilidade=0)
+    for nome in ("a.xml", "b.xml"):
+        (pasta / nome).write_bytes(AMOSTRA.read_bytes())
+    monitor.varrer()
+    assert len(monitor.arquivos_estaveis()) == 2
+
+    (pasta / "a.xml").unlink()
+    monitor.varrer()
+    assert list(monitor._enviados) == [str(pasta / "b.xml")]
+
+    monitor.esquecer(str(pasta / "b.xml"))
+    assert monitor._enviados == {}
+
+def test_ciclos_processam_apenas_arquivos_novos(tmp_path):
+    pasta, monitor = _monitor(tmp_path, intervalo_estabilidade=0)
+    (pasta / "a.xml").write_bytes(AMOSTRA.read_bytes())
+    monitor.varrer()
+    monitor.executar_ciclo()
+    assert monitor.processador.estatisticas["nfes_inseridas"] == 1
+
+    conteudo = AMOSTRA.read_bytes().replace(b"NFe33250807336543000123650010001615609541051086",
+                                            b"NFe33250807336543000123650010001615609541051087")
+    (pasta / "b.xml").write_bytes(conteudo)
+    monitor.varrer()
+    monitor.executar_ciclo()
+    assert monitor.estatisticas["lotes_processados"] == 2
+    assert monitor.estatisticas["arquivos_enviados"] == 2
+    assert monitor.processador.estatisticas["nfes_inseridas"] == 2
+
+def test_iniciar_e_parar_em_thread(tmp_path):
+    pasta, monitor = _monitor(tmp_path, intervalo_estabilidade=0, intervalo_varredura=0.05, espera_lote=0.05)
+    monitor.iniciar()
+    (pasta / "a.xml").write_bytes(AMOSTRA.read_bytes())
+    limite = time.monotonic() + 5
+    while monitor.estatisticas["arquivos_enviados"] == 0 and time.monotonic() < limite:
+        time.sleep(0.05)
+    monitor.parar(timeout=5)
+    assert not monitor._thread.is_alive()
+    assert monitor.processador.estatisticas["nfes_inseridas"] == 1
+
+def test_main_escalonamento_usa_processos_de_trabalho(tmp_path, monkeypatch):
+    criados = []
+    monkeypatch.setattr(processing.processor, "NFeProcessorBI",
+                        lambda *args, **opcoes: criados.append(opcoes) or NFeProcessorBI(*args, **opcoes))
+    monkeypatch.setattr(MonitorPasta, "executar", lambda self: None)
+
+    monkeypatch.setattr(sys, "argv", ["monitor", str(tmp_path), "--db", str(tmp_path / "nfe.db"), "--meta-vazao", "50"])
+    main()
+    assert criados[-1]["num_processos"] is None  # um por CPU
+    assert criados[-1]["escalonador"] is not None
+
+    monkeypatch.setattr(sys, "argv", ["monitor", str(tmp_path), "--db", str(tmp_path / "nfe.db")])
+    main()
+    assert criados[-1]["num_processos"] == 1
+
+    monkeypatch.setattr(sys, "argv", ["monitor", str(tmp_path), "--teto-cpu", "0.5", "--processos", "1"])
+    with pytest.raises(SystemExit):
+        main()
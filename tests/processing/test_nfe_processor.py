@@ -0,0 +1,67 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from tests.processing.processor import NFeProcessor
+
+AMOSTRA = Path(__file__).parents[2] / "33250807336543000123650010001615609541051086-nfe.xml"
+
+@pytest.fixture
+def pasta(tmp_path, monkeypatch):
+    # O cache padrão (.nfe_cache) é criado no diretório corrente
+    monkeypatch.chdir(tmp_path)
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    return pasta
+
+@pytest.mark.parametrize("modo_numerico", ["float", "decimal", "centavos"])
+def test_resumos_em_reais_em_todos_os_modos(pasta, modo_numerico):
+    shutil.copy(AMOSTRA, pasta)
+    processador = NFeProcessor(str(pasta), str(pasta.parent / "saida"), modo_numerico=modo_numerico)
+    processador.processar_pasta()
+    processador.calcular_resumos()
+
+    resumos = processador.resumos
+    assert resumos["total_vendas"] == pytest.approx(170.91)
+    assert resumos["formas_pagamento"] == {"Cartão de Crédito": pytest.approx(170.91)}
+    assert resumos["vendas_por_mes"] == {"2025-08": pytest.approx(170.91)}
+    assert resumos["top_produtos"]["KG SAB E FERIADO"] == pytest.approx(154.11)
+
+    incremental = processador.agregados.resumo()
+    assert incremental["total_vendas"] == pytest.approx(170.91)
+    assert incremental["vendas_por_mes"] == {"2025-08": pytest.approx(170.91)}
+    assert incremental["top_produtos"]["KG SAB E FERIADO"] == pytest.approx(154.11)
+
+def _lote_com_duas_notas() -> bytes:
+    nfe = AMOSTRA.read_bytes().split(b"?>", 1)[-1]
+    segunda = nfe.replace(b"NFe33250807336543000123650010001615609541051086",
+                          b"NFe33250807336543000123650010001615609541051087")
+    return b'<enviNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">' + nfe + segunda + b"</enviNFe>"
+
+def test_resumo_incremental_igual_ao_pandas_com_lote_e_nota_repetida(pasta):
+    (pasta / "lote.xml").write_bytes(_lote_com_duas_notas())
+    shutil.copy(AMOSTRA, pasta)  # a primeira nota do lote, repetida em outro arquivo
+    processador = NFeProcessor(str(pasta), str(pasta.parent / "saida"))
+    processador.processar_pasta()
+    processador.calcular_resumos()
+
+    incremental = processador.agregados.resumo()
+    assert incremental["total_notas_autorizadas"] == 2
+    assert incremental["total_vendas"] == pytest.approx(2 * 170.91)
+    for chave in ("total_vendas", "total_itens_vendidos", "formas_pagamento", "top_produtos", "vendas_por_mes"):
+        assert incremental[chave] == pytest.approx(processador.resumos[chave]), chave
+
+def test_vendas_por_mes_conta_cada_nota_uma_vez_e_omite_meses_sem_vendas(pasta):
+    conteudo = AMOSTRA.read_bytes()
+    (pasta / "agosto.xml").write_bytes(conteudo)
+    (pasta / "outubro.xml").write_bytes(conteudo.replace(b"1051086", b"1051087")
+                                        .replace(b"<dhEmi>2025-08-30", b"<dhEmi>2025-10-02"))
+    processador = NFeProcessor(str(pasta), str(pasta.parent / "saida"))
+    processador.processar_pasta()
+    processador.calcular_resumos()
+
+    # Oito itens por nota, mas o valor da nota entra uma vez; setembro fica de fora
+    esperado = {"2025-08": pytest.approx(170.91), "2025-10": pytest.approx(170.91)}
+    assert processador.resumos["vendas_por_mes"] == esperado
+    assert processador.agregados.resumo()["vendas_por_mes"] == esperado
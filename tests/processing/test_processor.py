@@ -0,0 +1,324 @@
+import hashlib
+import os
+import sqlite3
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from core.controle import ControleProcessamento
+from core.escalonador import EscalonadorAdaptativo
+from core.fontes import DocumentoXML, documento_de_arquivo
+from core.parser import carregar_xml
+from database.models import COLUNAS_MIGRADAS, DatabaseManager, ItemNotaFiscal, NotaFiscal
+from processing.processor import NFeProcessorBI
+
+AMOSTRA = Path(__file__).parents[2] / "33250807336543000123650010001615609541051086-nfe.xml"
+
+@pytest.fixture
+def processador(tmp_path):
+    return NFeProcessorBI(str(tmp_path), str(tmp_path / "saida"), db_path=str(tmp_path / "nfe.db"))
+
+def test_parse_xml_nfe_amostra(processador):
+    dados = processador._parse_xml_nfe(str(AMOSTRA))
+    assert dados["chave_acesso"] == "33250807336543000123650010001615609541051086"
+    assert dados["numero"] == "161560"
+    assert dados["data_emissao"] == "2025-08-30"
+    assert dados["uf_emissor"] == "RJ"
+    assert dados["valor_total"] == 170.91
+    assert dados["forma_pagamento"] == "Cartão de Crédito"
+    assert len(dados["itens"]) == 8
+    assert dados["itens"][0]["cst_icms"] == "300"
+
+def test_parse_xml_nfe_sem_infnfe(processador, tmp_path):
+    arquivo = tmp_path / "outro.xml"
+    arquivo.write_text('<raiz xmlns="http://www.portalfiscal.inf.br/nfe"><x/></raiz>')
+    assert processador._parse_xml_nfe(str(arquivo)) is None
+
+def _lote_com_duas_notas() -> bytes:
+    nfe = AMOSTRA.read_bytes().split(b"?>", 1)[-1]
+    segunda = nfe.replace(b"NFe33250807336543000123650010001615609541051086",
+                          b"NFe33250807336543000123650010001615609541051087")
+    return b'<enviNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">' + nfe + segunda + b"</enviNFe>"
+
+def test_parse_xml_nfe_rejeita_documento_com_varias_notas(processador):
+    lote = _lote_com_duas_notas()
+    assert processador._parse_xml_nfe(lote) is None
+    assert [nota["chave_acesso"][-1] for nota in processador._parse_xml_nfes(lote)] == ["6", "7"]
+
+@pytest.mark.parametrize("num_processos", [1, 2])
+def test_processar_pasta_grava_todas_as_notas_do_lote(tmp_path, num_processos):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    (pasta / "lote.xml").write_bytes(_lote_com_duas_notas())
+    db_path = str(tmp_path / "nfe.db")
+    estatisticas = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path,
+                                  num_processos=num_processos).processar_pasta()
+    assert estatisticas["arquivos_processados"] == 1
+    assert estatisticas["nfes_inseridas"] == 2
+    assert estatisticas["erros_processamento"] == 0
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM notas_fiscais").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM itens_notas_fiscais").fetchone()[0] == 16
+        assert conn.execute("SELECT COUNT(*) FROM manifesto_arquivos").fetchone()[0] == 1
+
+def test_lote_com_primeira_nota_ja_cadastrada_grava_as_demais(tmp_path):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    (pasta / "a.xml").write_bytes(AMOSTRA.read_bytes())
+    (pasta / "b_lote.xml").write_bytes(_lote_com_duas_notas())
+    db_path = str(tmp_path / "nfe.db")
+    estatisticas = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path).processar_pasta()
+    assert estatisticas["nfes_inseridas"] == 2
+    assert estatisticas["notas_duplicadas"] == 1
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM notas_fiscais").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM itens_notas_fiscais").fetchone()[0] == 16
+
+def test_processar_pasta_com_zip(processador, tmp_path):
+    with zipfile.ZipFile(tmp_path / "lote.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("nota.xml", AMOSTRA.read_bytes())
+    estatisticas = processador.processar_pasta()
+    assert estatisticas["nfes_inseridas"] == 1
+    assert estatisticas["erros_processamento"] == 0
+
+def test_extrair_itens_grupos_de_imposto(processador):
+    xml = b'''<infNFe xmlns="http://www.portalfiscal.inf.br/nfe"><det nItem="1">
+      <prod><cProd>1</cProd><xProd>Item</xProd><NCM>22030000</NCM><CFOP>5405</CFOP>
+        <qCom>1</qCom><vUnCom>100.00</vUnCom><vProd>100.00</vProd></prod>
+      <imposto>
+        <ICMS><ICMS10><orig>0</orig><CST>10</CST><vBC>100.00</vBC><pICMS>18.00</pICMS><vICMS>18.00</vICMS>
+          <vBCST>140.00</vBCST><pICMSST>18.00</pICMSST><vICMSST>7.20</vICMSST></ICMS10></ICMS>
+        <IPI><cEnq>999</cEnq><IPITrib><CST>50</CST><vBC>100.00</vBC><pIPI>5.00</pIPI><vIPI>5.00</vIPI></IPITrib></IPI>
+        <PIS><PISAliq><CST>01</CST><vBC>100.00</vBC><pPIS>1.65</pPIS><vPIS>1.65</vPIS></PISAliq></PIS>
+        <COFINS><COFINSAliq><CST>01</CST><vBC>100.00</vBC><pCOFINS>7.60</pCOFINS><vCOFINS>7.60</vCOFINS></COFINSAliq></COFINS>
+        <IBSCBS><CST>000</CST><cClassTrib>000001</cClassTrib><gIBSCBS><vBC>100.00</vBC>
+          <gIBSUF><pIBSUF>0.10</pIBSUF><vIBSUF>0.10</vIBSUF></gIBSUF>
+          <gIBSMun><pIBSMun>0.00</pIBSMun><vIBSMun>0.00</vIBSMun></gIBSMun><vIBS>0.10</vIBS>
+          <gCBS><pCBS>0.90</pCBS><vCBS>0.90</vCBS></gCBS></gIBSCBS></IBSCBS>
+      </imposto></det></infNFe>'''
+    item = processador._extrair_itens(carregar_xml(xml))[0]
+    assert (item["cst_icms"], item["base_icms_st"], item["valor_icms_st"]) == ("10", 140.0, 7.2)
+    assert (item["cst_ipi"], item["aliquota_ipi"], item["valor_ipi"]) == ("50", 5.0, 5.0)
+    assert (item["cst_pis"], item["base_pis"], item["valor_pis"]) == ("01", 100.0, 1.65)
+    assert (item["cst_cofins"], item["aliquota_cofins"], item["valor_cofins"]) == ("01", 7.6, 7.6)
+    assert (item["cst_ibscbs"], item["cclass_trib"], item["base_ibscbs"]) == ("000", "000001", 100.0)
+    assert (item["valor_ibs_uf"], item["valor_ibs"], item["aliquota_cbs"], item["valor_cbs"]) == (0.1, 0.1, 0.9, 0.9)
+
+def test_migra_colunas_de_banco_antigo(tmp_path):
+    caminho = str(tmp_path / "antigo.db")
+    with sqlite3.connect(caminho) as conn:
+        conn.execute("CREATE TABLE itens_notas_fiscais (id INTEGER PRIMARY KEY, nota_fiscal_id INTEGER, "
+                     "numero_item INTEGER NOT NULL, descricao TEXT NOT NULL, valor_pis REAL DEFAULT 0)")
+        conn.execute("INSERT INTO itens_notas_fiscais (nota_fiscal_id, numero_item, descricao) VALUES (1, 1, 'x')")
+
+    DatabaseManager(caminho)
+    DatabaseManager(caminho)  # a segunda inicialização não deve tentar recriar as colunas
+
+    with sqlite3.connect(caminho) as conn:
+        colunas = {col[1] for col in conn.execute("PRAGMA table_info(itens_notas_fiscais)")}
+        linha = conn.execute("SELECT valor_cbs, cst_ipi FROM itens_notas_fiscais").fetchone()
+    assert {nome for nome, _ in COLUNAS_MIGRADAS["itens_notas_fiscais"]} <= colunas
+    assert linha == (0, None)
+
+def _pasta_com_duas_notas(pasta):
+    conteudo = AMOSTRA.read_bytes()
+    (pasta / "a.xml").write_bytes(conteudo)
+    (pasta / "b.xml").write_bytes(conteudo.replace(b"Id=\"NFe33250807336543000123650010001615609541051086",
+                                                   b"Id=\"NFe33250807336543000123650010001615609541051087"))
+
+@pytest.mark.parametrize("num_processos", [1, 2])
+def test_processar_pasta_modos_sequencial_e_multiprocesso(tmp_path, num_processos):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    _pasta_com_duas_notas(pasta)
+    processador = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=str(tmp_path / "nfe.db"),
+                                 num_processos=num_processos)
+    estatisticas = processador.processar_pasta()
+    assert estatisticas["arquivos_processados"] == 2
+    assert estatisticas["nfes_inseridas"] == 2
+    assert estatisticas["empresas_cadastradas"] == 1
+    assert estatisticas["erros_processamento"] == 0
+    assert estatisticas["analises_ia_realizadas"] == (2 if processador.analisador_riscos else 0)
+    with sqlite3.connect(str(tmp_path / "nfe.db")) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM itens_notas_fiscais").fetchone()[0] == 16
+
+def test_processar_pasta_reporta_etapas_e_ignora_duplicata(tmp_path):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    _pasta_com_duas_notas(pasta)
+    (pasta / "c.xml").write_bytes((pasta / "a.xml").read_bytes())  # mesmo conteúdo de a.xml
+    situacoes = []
+    processador = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=str(tmp_path / "nfe.db"),
+                                 capacidade_fila=1, callback_progresso=situacoes.append)
+    estatisticas = processador.processar_pasta()
+    assert estatisticas["arquivos_processados"] == 3
+    assert estatisticas["nfes_inseridas"] == 2
+    assert estatisticas["erros_processamento"] == 0
+    assert list(situacoes[-1]) == ["descoberta", "leitura", "parse", "analise", "gravacao"]
+    assert situacoes[-1]["gravacao"]["processados"] == 3
+    assert processador.dados_processados == []
+    with sqlite3.connect(str(tmp_path / "nfe.db")) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM notas_fiscais").fetchone()[0] == 2
+
+def test_reprocessamento_pula_arquivos_inalterados(tmp_path, monkeypatch):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    _pasta_com_duas_notas(pasta)
+    db_path = str(tmp_path / "nfe.db")
+    NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path).processar_pasta()
+
+    # Arquivos inalterados são decididos pelo manifesto, sem leitura
+    lidos = []
+    ler_original = DocumentoXML.ler
+    monkeypatch.setattr(DocumentoXML, "ler", lambda doc: lidos.append(doc.nome) or ler_original(doc))
+    estatisticas = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path).processar_pasta()
+    assert estatisticas["arquivos_inalterados"] == 2
+    assert estatisticas["arquivos_processados"] == 2
+    assert estatisticas["nfes_inseridas"] == 0
+    assert lidos == []
+
+    # Metadados alterados: a chave lida do início do XML confirma que a nota já está no banco
+    os.utime(pasta / "a.xml", (1_000_000_000, 1_000_000_000))
+    processador = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path)
+    estatisticas = processador.processar_pasta()
+    assert estatisticas["arquivos_inalterados"] == 1
+    assert estatisticas["notas_duplicadas"] == 1
+    assert lidos == []
+    assert estatisticas["erros_processamento"] == 0
+    assert processador._arquivo_ja_processado(hashlib.md5((pasta / "a.xml").read_bytes()).hexdigest())
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM notas_fiscais").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM manifesto_arquivos").fetchone()[0] == 2
+
+def test_nota_repetida_descartada_pela_chave_antes_do_parse(tmp_path, monkeypatch):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    _pasta_com_duas_notas(pasta)
+    db_path = str(tmp_path / "nfe.db")
+    NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path).processar_pasta()
+
+    # A mesma nota chega de novo com outro nome, dentro de um nfeProc e de um .zip
+    nfe = AMOSTRA.read_bytes().split(b"?>", 1)[-1]
+    (pasta / "copia.xml").write_bytes(b'<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">'
+                                      + nfe + b"</nfeProc>")
+    with zipfile.ZipFile(pasta / "email.zip", "w") as zf:
+        zf.writestr("anexo.xml", AMOSTRA.read_bytes())
+    processador = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path)
+    monkeypatch.setattr(processador, "_parse_xml_nfes", lambda conteudo: pytest.fail("parse inesperado"))
+    estatisticas = processador.processar_pasta()
+    assert estatisticas["notas_duplicadas"] == 2
+    assert estatisticas["erros_processamento"] == 0
+
+def test_copia_corrigida_gravada_apos_falha_da_primeira(tmp_path):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    conteudo = AMOSTRA.read_bytes()
+    (pasta / "a_truncado.xml").write_bytes(conteudo[:len(conteudo) // 2])
+    (pasta / "b_corrigido.xml").write_bytes(conteudo)
+    db_path = str(tmp_path / "nfe.db")
+    processador = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path, capacidade_fila=1)
+    estatisticas = processador.processar_pasta()
+    assert estatisticas["erros_processamento"] == 1
+    assert estatisticas["nfes_inseridas"] == 1
+    assert estatisticas["notas_duplicadas"] == 0
+
+    # No processador de longa duração (lotes do monitor), a cópia corrigida de um lote posterior também entra
+    (pasta / "c_truncado.xml").write_bytes(conteudo.replace(b"1086", b"1087")[:len(conteudo) // 2])
+    processador.processar_documentos([documento_de_arquivo(str(pasta / "c_truncado.xml"))])
+    (pasta / "d_corrigido.xml").write_bytes(conteudo.replace(b"1086", b"1087"))
+    processador.processar_documentos([documento_de_arquivo(str(pasta / "d_corrigido.xml"))])
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM notas_fiscais").fetchone()[0] == 2
+        caminhos = {linha[0] for linha in conn.execute("SELECT caminho FROM manifesto_arquivos")}
+    assert {os.path.basename(c) for c in caminhos} == {"b_corrigido.xml", "d_corrigido.xml"}
+
+def test_nota_e_itens_gravados_atomicamente(tmp_path):
+    db = DatabaseManager(str(tmp_path / "nfe.db"))
+    nota = NotaFiscal(chave_acesso="1" * 44, numero="1", serie="1", data_emissao="2025-01-01", cnpj_emissor="0" * 14)
+    itens = [ItemNotaFiscal(numero_item=1, descricao="ok"), ItemNotaFiscal(numero_item=2, descricao=None)]
+    assert db.inserir_nota_com_itens(nota, itens, ("/x/a.xml", 1, 1.0, "h")) is None
+    with sqlite3.connect(db.db_path) as conn:
+        for tabela in ("notas_fiscais", "itens_notas_fiscais", "manifesto_arquivos"):
+            assert conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0] == 0
+
+def test_mesma_chave_gravada_duas_vezes_nao_deixa_itens_orfaos(tmp_path):
+    db = DatabaseManager(str(tmp_path / "nfe.db"))
+    nota = NotaFiscal(chave_acesso="1" * 44, numero="1", serie="1", data_emissao="2025-01-01", cnpj_emissor="0" * 14)
+    assert db.inserir_nota_com_itens(nota, [ItemNotaFiscal(numero_item=i, descricao="a") for i in (1, 2, 3)])
+    nota_id = db.inserir_nota_com_itens(nota, [ItemNotaFiscal(numero_item=i, descricao="b") for i in (1, 2)])
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM notas_fiscais").fetchone()[0] == 1
+        assert conn.execute("SELECT nota_fiscal_id, COUNT(*) FROM itens_notas_fiscais").fetchone() == (nota_id, 2)
+
+def test_retomar_execucao_interrompida(tmp_path, monkeypatch):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    conteudo = AMOSTRA.read_bytes()
+    (pasta / "a.xml").write_bytes(conteudo)
+    db_path = str(tmp_path / "nfe.db")
+
+    # A execução "cai" depois de confirmar a.xml, antes de ser marcada como concluída
+    processador = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path, intervalo_checkpoint=1)
+    salvar = processador._salvar_checkpoint
+    def salvar_e_cair(concluido=False):
+        if concluido:
+            raise RuntimeError("queda")
+        salvar()
+    monkeypatch.setattr(processador, "_salvar_checkpoint", salvar_e_cair)
+    with pytest.raises(RuntimeError):
+        processador.processar_pasta()
+    checkpoint = processador.db_manager.carregar_checkpoint(str(pasta))
+    assert not checkpoint["concluido"]
+    assert checkpoint["estatisticas"]["nfes_inseridas"] == 1
+
+    (pasta / "b.xml").write_bytes(conteudo.replace(b"NFe33250807336543000123650010001615609541051086",
+                                                   b"NFe33250807336543000123650010001615609541051087"))
+    retomado = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path)
+    estatisticas = retomado.processar_pasta(retomar=True)
+    # a.xml vem do checkpoint (sem contar de novo como inalterado); b.xml é processado agora
+    assert estatisticas["nfes_inseridas"] == 2
+    assert estatisticas["arquivos_inalterados"] == 0
+    assert retomado.db_manager.carregar_checkpoint(str(pasta))["concluido"]
+
+    # Sem execução pendente, retomar equivale a uma execução nova
+    estatisticas = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path).processar_pasta(retomar=True)
+    assert estatisticas["arquivos_inalterados"] == 2
+
+def test_cancelamento_deixa_checkpoint_pendente(tmp_path):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    _pasta_com_duas_notas(pasta)
+    db_path = str(tmp_path / "nfe.db")
+
+    # Cancela assim que a primeira nota é confirmada; a segunda não chega a ser iniciada
+    controle = ControleProcessamento()
+    processador = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path,
+                                 capacidade_fila=1, controle=controle)
+    gravar = processador._gravar_nfe
+    def gravar_e_cancelar(*args, **kwargs):
+        resultado = gravar(*args, **kwargs)
+        controle.cancelar()
+        return resultado
+    processador._gravar_nfe = gravar_e_cancelar
+    estatisticas = processador.processar_pasta()
+    assert processador.cancelado
+    assert estatisticas["nfes_inseridas"] == 1
+    assert not processador.db_manager.carregar_checkpoint(str(pasta))["concluido"]
+
+    estatisticas = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=db_path).processar_pasta(retomar=True)
+    assert estatisticas["nfes_inseridas"] == 2
+    assert estatisticas["erros_processamento"] == 0
+
+def test_escalonamento_registrado_nas_estatisticas(tmp_path):
+    pasta = tmp_path / "xmls"
+    pasta.mkdir()
+    _pasta_com_duas_notas(pasta)
+    escalonador = EscalonadorAdaptativo(teto_cpu=0.5, intervalo=0, medir_carga=lambda: 1.0)
+    processador = NFeProcessorBI(str(pasta), str(tmp_path / "saida"), db_path=str(tmp_path / "nfe.db"),
+                                 num_processos=2, escalonador=escalonador)
+    estatisticas = processador.processar_pasta()
+    assert estatisticas["nfes_inseridas"] == 2
+    escalonamento = estatisticas["escalonamento"]
+    assert escalonamento["workers"] == 1
+    assert set(escalonamento["tempo_medio_ms"]) == {"parse", "analise"}
@@ -54,6 +54,8 @@ def iniciar_dashboard_web(processor):
         proc = app.processor
         if not proc.resumos:
             proc.calcular_resumos() # Garante que os resumos sejam calculados
+        elif hasattr(proc, 'atualizar_resumos'):
+            proc.atualizar_resumos() # Totais incrementais; só muda se houver notas novas
             
         resumo_completo = {
             "estatisticas": proc.estatisticas,
@@ -10,6 +10,11 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 
 # Imports seguros
+try:
+    from core.controle import ControleProcessamento
+except ImportError:
+    ControleProcessamento = None
+
 try:
     from processing.processor import NFeProcessorBI
 except ImportError:
@@ -24,6 +29,7 @@ class JanelaProcessamento:
     def __init__(self, parent):
         self.parent = parent
         self.processing_thread = None
+        self.controle = None
         self.processamento_ativo = False
         self.processamento_pausado = False
         self.deve_parar = False
@@ -31,6 +37,8 @@ class JanelaProcessamento:
         # Variáveis de controle
         self.pasta_xml = tk.StringVar()
         self.pasta_saida = tk.StringVar(value="relatorios")
+        # Continua do checkpoint de uma execução interrompida (processar_pasta(retomar=True))
+        self.retomar = tk.BooleanVar(value=False)
         self.arquivos_total = 0
         self.arquivos_processados = 0
         self.arquivos_com_erro = 0
@@ -251,6 +259,15 @@ class JanelaProcessamento:
                                    cursor="hand2")
         self.btn_fechar.pack(side=tk.RIGHT)
         
+        # Retomar execução interrompida
+        self.chk_retomar = tk.Checkbutton(controls_frame,
+                                          text="♻️ Retomar a execução interrompida (checkpoint)",
+                                          variable=self.retomar,
+                                          font=("Segoe UI", 10),
+                                          bg=self.cores['fundo_secundario'],
+                                          fg=self.cores['texto_principal'])
+        self.chk_retomar.pack(anchor=tk.W, pady=(10, 0))
+        
     def setup_progress_section(self, parent):
         """Seção de progresso visual"""
         progress_frame = tk.LabelFrame(parent,
@@ -295,6 +312,15 @@ class JanelaProcessamento:
                                       fg=self.cores['azul_primario'])
         self.progress_label.pack()
         
+        # Situação de cada etapa do pipeline (vazão e fila)
+        self.etapas_label = tk.Label(progress_frame,
+                                    text="",
+                                    font=("Consolas", 9),
+                                    justify=tk.LEFT,
+                                    bg=self.cores['fundo_secundario'],
+                                    fg=self.cores['texto_secundario'])
+        self.etapas_label.pack(anchor=tk.W, pady=(5, 0))
+        
     def criar_info_card(self, parent, titulo, valor, var_name, col):
         """Cria card de informação"""
         card_frame = tk.Frame(parent,
@@ -435,9 +461,11 @@ class JanelaProcessamento:
         self.btn_parar.config(state="normal")
         self.btn_selecionar_xml.config(state="disabled")
         self.btn_selecionar_saida.config(state="disabled")
+        self.chk_retomar.config(state="disabled")
         
         # Iniciar thread de processamento
-        self.processing_thread = threading.Thread(target=self.executar_processamento, daemon=True)
+        self.processing_thread = threading.Thread(target=self.executar_processamento, args=(self.retomar.get(),),
+                                                  daemon=True)
         self.processing_thread.start()
         
         # Iniciar timer de atualização
@@ -446,16 +474,20 @@ class JanelaProcessamento:
         self.adicionar_log("Processamento iniciado!")
         self.atualizar_status("Processando...")
     
-    def executar_processamento(self):
+    def executar_processamento(self, retomar: bool = False):
         """Executa processamento em thread separada"""
         try:
-            processor = NFeProcessorBI(self.pasta_xml.get(), self.pasta_saida.get())
+            # Os botões pausar/parar agem sobre o processador por este controle. O callback
+            # roda na thread do pipeline; a atualização da tela vai para a thread do Tk.
+            self.controle = ControleProcessamento() if ControleProcessamento else None
+            if self.controle:
+                self.controle.adicionar_callback(lambda situacao: self.window.after(0, self.atualizar_etapas, situacao))
+            processor = NFeProcessorBI(self.pasta_xml.get(), self.pasta_saida.get(), controle=self.controle)
             
-            # Simular processamento com callback de progresso
             self.window.after(0, self.adicionar_log, "Criando instância do processador...")
             
             # Processar arquivos
-            estatisticas = processor.processar_pasta()
+            estatisticas = processor.processar_pasta(retomar=retomar)
             
             # Finalizar processamento
             self.window.after(0, self.processamento_finalizado, True, estatisticas)
@@ -467,11 +499,15 @@ class JanelaProcessamento:
         """Pausa/retoma processamento"""
         if self.processamento_pausado:
             self.processamento_pausado = False
+            if self.controle:
+                self.controle.retomar()
             self.btn_pausar.config(text="⏸️ Pausar")
             self.adicionar_log("Processamento retomado")
             self.atualizar_status("Processando...")
         else:
             self.processamento_pausado = True
+            if self.controle:
+                self.controle.pausar()
             self.btn_pausar.config(text="▶️ Retomar")
             self.adicionar_log("Processamento pausado")
             self.atualizar_status("Processamento pausado")
@@ -487,6 +523,9 @@ class JanelaProcessamento:
         if resposta:
             self.deve_parar = True
             self.processamento_ativo = False
+            if self.controle:
+                # O arquivo em andamento termina; os demais ficam para uma execução retomada
+                self.controle.cancelar()
             self.adicionar_log("Processamento interrompido pelo usuário")
             self.atualizar_status("Processamento interrompido")
             self.resetar_interface()
@@ -495,7 +534,12 @@ class JanelaProcessamento:
         """Callback quando processamento termina"""
         self.processamento_ativo = False
         
-        if sucesso:
+        if sucesso and self.deve_parar:
+            # A próxima execução já vem marcada para continuar do checkpoint
+            self.retomar.set(True)
+            self.adicionar_log("⏹️ Processamento interrompido; processe novamente com "
+                               "'Retomar a execução interrompida' marcado para continuar do checkpoint", "WARNING")
+        elif sucesso:
             self.adicionar_log("✅ Processamento concluído com sucesso!")
             self.atualizar_status("Processamento concluído")
             
@@ -522,6 +566,7 @@ class JanelaProcessamento:
         self.btn_parar.config(state="disabled")
         self.btn_selecionar_xml.config(state="normal")
         self.btn_selecionar_saida.config(state="normal")
+        self.chk_retomar.config(state="normal")
     
     def atualizar_timer(self):
         """Atualiza timer de processamento"""
@@ -531,7 +576,7 @@ class JanelaProcessamento:
             segundos = int(tempo_decorrido % 60)
             self.tempo_label.config(text=f"{minutos:02d}:{segundos:02d}")
             
-            # Simular progresso (substitua pela lógica real)
+            # Total = documentos já descobertos (a descoberta acontece durante o processamento)
             if self.arquivos_total > 0:
                 progresso = (self.arquivos_processados / self.arquivos_total) * 100
                 self.progress_var.set(progresso)
@@ -541,6 +586,22 @@ class JanelaProcessamento:
             if self.processamento_ativo:
                 self.window.after(1000, self.atualizar_timer)
     
+    def atualizar_etapas(self, situacao):
+        """Atualiza contadores e a situação das etapas com o instantâneo do pipeline"""
+        self.arquivos_total = situacao.get("descoberta", {}).get("processados", 0)
+        self.arquivos_processados = situacao.get("gravacao", {}).get("processados", 0)
+        self.arquivos_com_erro = sum(etapa.get("erros", 0) for etapa in situacao.values())
+        
+        self.total_label.config(text=str(self.arquivos_total))
+        self.processados_label.config(text=str(self.arquivos_processados))
+        self.erros_label.config(text=str(self.arquivos_com_erro))
+        
+        linhas = [
+            f"{nome:<11} {etapa['processados']:>7} ({etapa['por_segundo']:>6.1f}/s)  fila: {etapa['fila']}"
+            for nome, etapa in situacao.items()
+        ]
+        self.etapas_label.config(text="\n".join(linhas))
+    
     def adicionar_log(self, mensagem, tipo="INFO"):
         """Adiciona mensagem ao log"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -588,6 +649,8 @@ class JanelaProcessamento:
             if resposta:
                 self.deve_parar = True
                 self.processamento_ativo = False
+                if self.controle:
+                    self.controle.cancelar()
                 self.window.destroy()
         else:
             self.window.destroy()